@@ -0,0 +1,81 @@
+"""
+Check that a batch larger than its Gemini concurrency is not degraded by queueing.
+
+Runs SearchPipeline.run_many in-process against a simulated Gemini (fixed
+latency, never fails) and a simulated Weaviate, with more distinct queries
+than SEARCH_BATCH_GEMINI_CONCURRENCY. Every query must get a Gemini plan: a
+plan_timeout fallback here can only come from time spent waiting for a Gemini
+slot being charged to the query's plan budget. Exits 1 if any query degraded.
+
+    python benchmarks/batch_plans.py --queries 40 --gemini-ms 1000
+"""
+import argparse
+import asyncio
+import collections
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from plan_cache import PlanCache  # noqa: E402
+from query_plan import QueryPlan  # noqa: E402
+from results import RepositoryRecord  # noqa: E402
+from search_pipeline import SearchPipeline  # noqa: E402
+
+
+class SimulatedGemini:
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    async def generate_query_plan(self, query: str) -> QueryPlan:
+        await asyncio.sleep(self.latency)
+        return QueryPlan.from_json('{"mode": "near_vector", "limit": 10}')
+
+
+class SimulatedWeaviate:
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.rng = np.random.default_rng(0)
+
+    async def encode_many(self, query_texts):
+        # Unrelated random vectors, so the semantic plan cache never answers
+        return [self.rng.random(384, dtype=np.float32) for _ in query_texts]
+
+    async def search(self, query, plan, query_vector=None):
+        await asyncio.sleep(self.latency)
+        return {'success': True, 'query': query, 'results': [RepositoryRecord({'name': query})],
+                'results_count': 1, 'plan': plan.to_dict()}
+
+
+async def main(args) -> int:
+    pipeline = SearchPipeline(
+        SimulatedGemini(args.gemini_ms / 1000), SimulatedWeaviate(args.weaviate_ms / 1000),
+        PlanCache(path=""), parser=None
+    )
+    if args.queries <= pipeline.batch_gemini_concurrency:
+        print(f"--queries must exceed SEARCH_BATCH_GEMINI_CONCURRENCY ({pipeline.batch_gemini_concurrency})")
+        return 2
+    queries = [f"distinct batch query {i} {time.time_ns()}" for i in range(args.queries)]
+    results, stats = await pipeline.run_many(queries, 10)
+    sources = collections.Counter(result.get('plan_source') for result in results)
+    reasons = collections.Counter(result.get('degraded_reason') for result in results if result.get('degraded'))
+    print(f"gemini concurrency {pipeline.batch_gemini_concurrency}, budget {pipeline.budget * 1000:.0f} ms")
+    print(f"plan sources: {dict(sources)}")
+    print(f"stats: {stats}")
+    if sources.get("gemini", 0) != len(queries):
+        print(f"FAIL: {len(queries) - sources.get('gemini', 0)} queries not planned by Gemini: {dict(reasons)}")
+        return 1
+    print("OK: every query got a Gemini plan")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=40)
+    parser.add_argument("--gemini-ms", type=float, default=1000.0)
+    parser.add_argument("--weaviate-ms", type=float, default=50.0)
+    sys.exit(asyncio.run(main(parser.parse_args())))
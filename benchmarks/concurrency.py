@@ -0,0 +1,93 @@
+"""
+Check that /search and /allrepos overlap instead of serializing.
+
+Runs against a live server: first times each request type alone, then fires
+them all at once. With a non-blocking request path the concurrent wall-clock
+time approaches the slowest single request rather than the sum of all of them,
+and /health stays fast while searches are in flight.
+
+    uvicorn main:app --port 8000 &
+    python benchmarks/concurrency.py --base-url http://localhost:8000 --searches 8 --listings 8
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+QUERIES = [
+    "Find popular Python machine learning libraries",
+    "JavaScript frameworks with more than 1000 stars",
+    "Docker and Kubernetes repositories with good documentation",
+    "CI/CD pipelines and automation tools",
+    "rust command line tools",
+    "Backend Python frameworks for APIs, only legitimate projects",
+    "I'm a frontend developer, show me open source tools",
+    "data visualization libraries",
+]
+
+
+async def timed(client: httpx.AsyncClient, method: str, url: str, **kwargs) -> float:
+    start = time.perf_counter()
+    response = await client.request(method, url, **kwargs)
+    response.raise_for_status()
+    return time.perf_counter() - start
+
+
+def search(client: httpx.AsyncClient, i: int):
+    # A per-run suffix keeps the plan cache from answering the concurrent phase
+    query = f"{QUERIES[i % len(QUERIES)]} #{i}-{time.time_ns()}"
+    return timed(client, "POST", "/search", json={"query": query, "limit": 10})
+
+
+def listing(client: httpx.AsyncClient, i: int):
+    return timed(client, "GET", "/allrepos", params={"page": i + 1, "limit": 20})
+
+
+async def main(args):
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=120) as client:
+        await timed(client, "GET", "/health")
+
+        sequential = []
+        for i in range(args.searches):
+            sequential.append(await search(client, i))
+        for i in range(args.listings):
+            sequential.append(await listing(client, i))
+        sequential_total = sum(sequential)
+
+        health_latencies = []
+
+        async def probe_health(stop: asyncio.Event):
+            while not stop.is_set():
+                health_latencies.append(await timed(client, "GET", "/health"))
+                await asyncio.sleep(0.05)
+
+        stop = asyncio.Event()
+        prober = asyncio.create_task(probe_health(stop))
+        start = time.perf_counter()
+        concurrent = await asyncio.gather(
+            *[search(client, i) for i in range(args.searches)],
+            *[listing(client, i) for i in range(args.listings)],
+        )
+        wall = time.perf_counter() - start
+        stop.set()
+        await prober
+
+    print(f"requests:                 {args.searches} x /search + {args.listings} x /allrepos")
+    print(f"sequential total:         {sequential_total:8.3f} s")
+    print(f"concurrent wall-clock:    {wall:8.3f} s")
+    print(f"slowest single request:   {max(concurrent):8.3f} s")
+    print(f"overlap factor:           {sum(concurrent) / wall:8.2f}x (1.0 = fully serialized)")
+    print(f"speedup vs sequential:    {sequential_total / wall:8.2f}x")
+    if health_latencies:
+        print(f"/health during load:      p50 {statistics.median(health_latencies) * 1000:.1f} ms, "
+              f"max {max(health_latencies) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--searches", type=int, default=8)
+    parser.add_argument("--listings", type=int, default=8)
+    asyncio.run(main(parser.parse_args()))
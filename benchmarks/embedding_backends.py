@@ -0,0 +1,125 @@
+"""
+Compare embedding backends for latency, throughput, resident memory and parity.
+
+Every backend is loaded in its own subprocess so resident memory is measured
+in isolation. Vectors from each backend are compared with the torch vectors;
+the script exits non-zero if any backend's minimum cosine similarity falls
+below --min-cosine, so it doubles as the parity check for EMBEDDING_BACKEND.
+
+    pip install -r requirements-onnx.txt
+    python benchmarks/embedding_backends.py --backends torch onnx onnx-int8
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+TEXTS = [
+    "Find popular Python machine learning libraries",
+    "JavaScript frameworks with more than 1000 stars",
+    "I'm a frontend developer, show me open source tools",
+    "Docker and Kubernetes repositories with good documentation",
+    "CI/CD pipelines and automation tools",
+    "rust command line tools for managing dotfiles",
+    "Backend Python frameworks for APIs, only legitimate projects",
+    "data visualization dashboards in typescript",
+    "beginner friendly hacktoberfest projects",
+    "vector databases and approximate nearest neighbour search",
+]
+
+
+def rss_mb() -> float:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+
+def child(backend: str, out_path: str, rounds: int, batch_size: int):
+    from embedding import load_embedding_model
+
+    baseline_rss = rss_mb()
+    start = time.perf_counter()
+    model = load_embedding_model(backend)
+    load_s = time.perf_counter() - start
+    model.encode(["warm up"])
+
+    single = []
+    for _ in range(rounds):
+        for text in TEXTS:
+            t = time.perf_counter()
+            model.encode([text])
+            single.append(time.perf_counter() - t)
+
+    batch = (TEXTS * (batch_size // len(TEXTS) + 1))[:batch_size]
+    t = time.perf_counter()
+    for _ in range(rounds):
+        model.encode(batch, batch_size=batch_size)
+    throughput = rounds * batch_size / (time.perf_counter() - t)
+
+    vectors = np.asarray(model.encode(TEXTS), dtype=np.float32)
+    np.save(out_path + ".npy", vectors)
+    with open(out_path + ".json", "w") as f:
+        json.dump({
+            "load_s": load_s,
+            "p50_ms": float(np.percentile(single, 50) * 1000),
+            "p95_ms": float(np.percentile(single, 95) * 1000),
+            "throughput": throughput,
+            "rss_mb": rss_mb(),
+            "model_rss_mb": rss_mb() - baseline_rss,
+        }, f)
+
+
+def main(args):
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for backend in args.backends:
+            out_path = os.path.join(tmp, backend)
+            subprocess.run(
+                [sys.executable, __file__, "--child", backend, "--out", out_path,
+                 "--rounds", str(args.rounds), "--batch-size", str(args.batch_size)],
+                check=True,
+            )
+            with open(out_path + ".json") as f:
+                results[backend] = json.load(f)
+            results[backend]["vectors"] = np.load(out_path + ".npy")
+
+    reference = results.get("torch", {}).get("vectors")
+    failed = False
+    print(f"{'backend':>10} {'load s':>8} {'p50 ms':>8} {'p95 ms':>8} {'texts/s':>9} {'rss MB':>8} {'min cos':>8}")
+    for backend, r in results.items():
+        min_cos = float("nan")
+        if reference is not None:
+            a = r["vectors"] / np.linalg.norm(r["vectors"], axis=1, keepdims=True)
+            b = reference / np.linalg.norm(reference, axis=1, keepdims=True)
+            min_cos = float(np.min(np.sum(a * b, axis=1)))
+            failed = failed or min_cos < args.min_cosine
+        print(f"{backend:>10} {r['load_s']:>8.2f} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} "
+              f"{r['throughput']:>9.1f} {r['rss_mb']:>8.0f} {min_cos:>8.4f}")
+    if failed:
+        print(f"FAIL: a backend's cosine similarity to torch fell below {args.min_cosine}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=["torch", "onnx", "onnx-int8"])
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--min-cosine", type=float, default=float(os.getenv('EMBEDDING_PARITY_MIN_COSINE', '0.99')))
+    parser.add_argument("--child")
+    parser.add_argument("--out")
+    args = parser.parse_args()
+    if args.child:
+        child(args.child, args.out, args.rounds, args.batch_size)
+    else:
+        main(args)
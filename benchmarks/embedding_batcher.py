@@ -0,0 +1,74 @@
+"""
+Throughput and latency of query encoding with and without micro-batching.
+
+Each concurrency level fires that many callers at once, each encoding a
+distinct query, for several rounds. "unbatched" runs one batch-of-one encode
+per caller on the same thread pool WeaviateService uses; "batched" routes the
+callers through EmbeddingBatcher.
+
+    python benchmarks/embedding_batcher.py --levels 1 8 32 128 --rounds 10
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from sentence_transformers import SentenceTransformer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from embedding import EmbeddingBatcher  # noqa: E402
+
+
+def percentile(values, pct):
+    return float(np.percentile(values, pct)) * 1000
+
+
+async def run_level(encode, callers: int, rounds: int):
+    latencies = []
+
+    async def call(text):
+        start = time.perf_counter()
+        await encode(text)
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for r in range(rounds):
+        await asyncio.gather(*[call(f"open source query number {r}-{i}") for i in range(callers)])
+    wall = time.perf_counter() - start
+    return callers * rounds / wall, latencies
+
+
+async def main(args):
+    model = SentenceTransformer('all-MiniLM-L6-v2')
+    executor = ThreadPoolExecutor(max_workers=int(os.getenv('EMBEDDING_WORKERS', '2')))
+    model.encode(["warm up"])
+
+    def encode_batch(texts):
+        return np.asarray(model.encode(texts, batch_size=len(texts)), dtype=np.float32)
+
+    async def unbatched(text):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, encode_batch, [text])
+
+    batcher = EmbeddingBatcher(encode_batch, executor, args.max_batch_size, args.max_wait_ms)
+
+    print(f"{'callers':>8} {'mode':>10} {'req/s':>10} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10}")
+    for callers in args.levels:
+        for name, encode in (("unbatched", unbatched), ("batched", batcher.encode)):
+            throughput, latencies = await run_level(encode, callers, args.rounds)
+            print(f"{callers:>8} {name:>10} {throughput:>10.1f} {percentile(latencies, 50):>10.2f} "
+                  f"{percentile(latencies, 95):>10.2f} {percentile(latencies, 99):>10.2f}")
+    print(f"batcher: {batcher.stats()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 8, 32, 128])
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--max-batch-size", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    asyncio.run(main(parser.parse_args()))
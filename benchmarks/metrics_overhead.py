@@ -0,0 +1,132 @@
+"""
+Per-request cost of the /metrics instrumentation.
+
+asgi: a trivial FastAPI route called directly over ASGI (no network, no
+TestClient), with and without MetricsMiddleware; the difference is what
+every request pays for the request counter, latency histogram and in-flight
+gauge.
+
+updates: the metric updates a /search request makes besides the middleware
+(one histogram observation per pipeline stage, the searches counter and the
+serialization stage).
+
+render: one /metrics scrape with every family populated.
+
+Exits 1 if the middleware overhead or a search's metric updates exceed
+--max-overhead-us / --max-updates-us, so it can gate a change to metrics.py.
+The ASGI timings alternate plain and instrumented rounds and compare the
+fastest round of each, which keeps a noisy machine from failing the check at
+random.
+
+    python benchmarks/metrics_overhead.py --requests 20000 --max-overhead-us 25
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fastapi import FastAPI  # noqa: E402
+
+from metrics import REGISTRY, SEARCHES, MetricsMiddleware, observe_stage  # noqa: E402
+
+# Stages a Gemini-planned /search records
+SEARCH_STAGES = ("plan_cache", "rules", "embedding", "semantic_cache", "gemini", "weaviate", "serialization")
+
+
+def build_app(instrumented: bool):
+    app = FastAPI()
+
+    @app.get("/allrepos")
+    async def listing():
+        return {"success": True}
+
+    if instrumented:
+        app.add_middleware(MetricsMiddleware)
+    return app
+
+
+async def call(app, scope):
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    await app(dict(scope), receive, send)
+
+
+async def measure_asgi(app, requests: int) -> float:
+    """Fastest of several rounds, in microseconds per request"""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": "/allrepos", "raw_path": b"/allrepos", "root_path": "", "query_string": b"", "headers": [],
+        "client": ("127.0.0.1", 1), "server": ("testserver", 80),
+    }
+    for _ in range(1000):
+        await call(app, scope)
+    samples = []
+    for _ in range(5):
+        start = time.perf_counter()
+        for _ in range(requests // 5):
+            await call(app, scope)
+        samples.append((time.perf_counter() - start) / (requests // 5) * 1e6)
+    return min(samples)
+
+
+async def measure_overhead(requests: int, rounds: int):
+    """(plain us, instrumented us) per request, each the fastest of alternating rounds"""
+    plain_app, instrumented_app = build_app(False), build_app(True)
+    plain, instrumented = [], []
+    for _ in range(rounds):
+        plain.append(await measure_asgi(plain_app, requests))
+        instrumented.append(await measure_asgi(instrumented_app, requests))
+    return min(plain), min(instrumented)
+
+
+def measure_updates(requests: int) -> float:
+    start = time.perf_counter()
+    for _ in range(requests):
+        for stage in SEARCH_STAGES:
+            observe_stage(stage, 0.0123)
+        SEARCHES.labels("gemini", "false").inc()
+    return (time.perf_counter() - start) / requests * 1e6
+
+
+def measure_render(repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        REGISTRY.render()
+    return (time.perf_counter() - start) / repeat * 1e3
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--max-overhead-us", type=float, default=25.0, help="fail above this middleware cost")
+    parser.add_argument("--max-updates-us", type=float, default=15.0, help="fail above this per-search update cost")
+    args = parser.parse_args()
+
+    loop = asyncio.new_event_loop()
+    plain, instrumented = loop.run_until_complete(measure_overhead(args.requests, args.rounds))
+    loop.close()
+    overhead = instrumented - plain
+    updates = measure_updates(args.requests)
+    print(f"   asgi: plain {plain:6.2f} us  instrumented {instrumented:6.2f} us  "
+          f"overhead {overhead:5.2f} us/request (limit {args.max_overhead_us:g})")
+    print(f"updates: {updates:6.2f} us per /search ({len(SEARCH_STAGES)} stages + counter, limit {args.max_updates_us:g})")
+    print(f" render: {measure_render(200):6.2f} ms per scrape")
+
+    failures = []
+    if overhead > args.max_overhead_us:
+        failures.append(f"middleware overhead {overhead:.2f} us > {args.max_overhead_us:g} us")
+    if updates > args.max_updates_us:
+        failures.append(f"metric updates {updates:.2f} us > {args.max_updates_us:g} us")
+    if failures:
+        print("FAIL: " + "; ".join(failures))
+        sys.exit(1)
+    print("OK")
@@ -0,0 +1,134 @@
+"""
+Throughput scaling and per-worker memory of the preforking launcher.
+
+For each worker count, starts `python serve.py` with WORKERS=n, waits for
+/ready, drives /search and /allrepos with a fixed number of concurrent
+clients for a fixed duration, and reads PSS/USS of every worker from
+/proc/<pid>/smaps_rollup (Linux). Near-linear scaling shows up as req/s
+growing with n until the core count is reached; shared model weights show
+up as PSS per worker well below RSS.
+
+    python benchmarks/multiworker.py --workers 1 2 4 --concurrency 64 --duration 20
+"""
+import argparse
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SEARCH_QUERIES = [
+    "python repos with more than 1000 stars",
+    "rust cli tools",
+    "Docker and Kubernetes repos with good documentation",
+    "hacktoberfest repos with good first issues",
+]
+
+
+def children_of(pid: int):
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(p) for p in f.read().split()]
+    except OSError:
+        return []
+
+
+def memory_mb(pid: int):
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if parts and parts[0].rstrip(":") in ("Rss", "Pss", "Private_Clean", "Private_Dirty"):
+                    fields[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    except OSError:
+        return None
+    return {
+        "rss": fields.get("Rss", 0.0),
+        "pss": fields.get("Pss", 0.0),
+        "uss": fields.get("Private_Clean", 0.0) + fields.get("Private_Dirty", 0.0),
+    }
+
+
+async def wait_ready(client: httpx.AsyncClient, timeout: float):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if (await client.get("/ready")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.5)
+    raise RuntimeError("server did not become ready")
+
+
+async def drive(client: httpx.AsyncClient, endpoint: str, concurrency: int, duration: float) -> int:
+    done = 0
+    deadline = time.perf_counter() + duration
+
+    async def worker(i: int):
+        nonlocal done
+        n = 0
+        while time.perf_counter() < deadline:
+            if endpoint == "search":
+                query = SEARCH_QUERIES[(i + n) % len(SEARCH_QUERIES)]
+                response = await client.post("/search", json={"query": query, "limit": 10})
+            else:
+                response = await client.get("/allrepos", params={"page": 1 + (i + n) % 5, "limit": 20})
+            if response.status_code == 200:
+                done += 1
+            n += 1
+
+    await asyncio.gather(*[worker(i) for i in range(concurrency)])
+    return done
+
+
+async def measure(n: int, args) -> dict:
+    env = dict(os.environ, WORKERS=str(n), PORT=str(args.port))
+    launcher = subprocess.Popen([sys.executable, os.path.join(ROOT, "serve.py")], env=env, cwd=ROOT)
+    try:
+        limits = httpx.Limits(max_connections=args.concurrency * 2)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", timeout=60, limits=limits) as client:
+            await wait_ready(client, args.startup_timeout)
+            result = {"workers": n}
+            for endpoint in ("search", "allrepos"):
+                await drive(client, endpoint, args.concurrency, 2)  # warm caches and connections
+                result[endpoint] = await drive(client, endpoint, args.concurrency, args.duration) / args.duration
+        memory = [m for m in (memory_mb(pid) for pid in children_of(launcher.pid)) if m]
+        parent = memory_mb(launcher.pid)
+        result["pss_per_worker"] = sum(m["pss"] for m in memory) / len(memory) if memory else float("nan")
+        result["uss_per_worker"] = sum(m["uss"] for m in memory) / len(memory) if memory else float("nan")
+        result["rss_per_worker"] = sum(m["rss"] for m in memory) / len(memory) if memory else float("nan")
+        result["total_pss"] = sum(m["pss"] for m in memory) + (parent["pss"] if parent else 0.0)
+        return result
+    finally:
+        launcher.send_signal(signal.SIGTERM)
+        launcher.wait(timeout=30)
+
+
+async def main(args):
+    rows = [await measure(n, args) for n in args.workers]
+    base = rows[0]
+    print(f"{'workers':>7} {'search/s':>9} {'scale':>6} {'list/s':>9} {'scale':>6} "
+          f"{'RSS/wkr':>8} {'PSS/wkr':>8} {'USS/wkr':>8} {'total PSS':>9}")
+    for r in rows:
+        print(f"{r['workers']:>7} {r['search']:>9.1f} {r['search'] / base['search']:>6.2f} "
+              f"{r['allrepos']:>9.1f} {r['allrepos'] / base['allrepos']:>6.2f} "
+              f"{r['rss_per_worker']:>8.0f} {r['pss_per_worker']:>8.0f} {r['uss_per_worker']:>8.0f} "
+              f"{r['total_pss']:>9.0f}")
+    print("memory in MB; scale is throughput relative to the first worker count")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--port", type=int, default=18080)
+    parser.add_argument("--startup-timeout", type=float, default=120)
+    asyncio.run(main(parser.parse_args()))
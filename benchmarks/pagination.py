@@ -0,0 +1,92 @@
+"""
+Compare shallow vs deep page latency for offset and cursor pagination.
+
+Runs against a live server. Offset mode requests ?page=N directly. Cursor mode
+walks next_cursor from page 1 to page N once (untimed), then re-requests the
+page-N cursor, which is stateless and can be replayed. With offset paging the
+deep page grows with N because Weaviate scans and discards N x limit objects;
+with a cursor it should stay close to page 1.
+
+    uvicorn main:app --port 8000 &
+    python benchmarks/pagination.py --base-url http://localhost:8000 --deep-page 500 --repeat 10
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+
+
+async def fetch(client: httpx.AsyncClient, path: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    response = await client.get(path, params=params)
+    response.raise_for_status()
+    body = response.json()
+    if not body.get("success"):
+        raise RuntimeError(body.get("error"))
+    return body
+
+
+async def timed(client: httpx.AsyncClient, path: str, params: Dict[str, Any], repeat: int) -> Optional[float]:
+    """Median latency in ms, or None if the page can't be fetched"""
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        try:
+            await fetch(client, path, params)
+        except (httpx.HTTPError, RuntimeError) as e:
+            print(f"  {path} {params.get('page', 'cursor')}: {e}")
+            return None
+        latencies.append((time.perf_counter() - start) * 1000)
+    return statistics.median(latencies)
+
+
+async def cursor_for_page(client: httpx.AsyncClient, path: str, base: Dict[str, Any], page: int) -> Optional[str]:
+    """Walk next_cursor until the cursor that yields the requested page"""
+    body = await fetch(client, path, base)
+    cursor = body["pagination"].get("next_cursor")
+    for _ in range(page - 2):
+        if cursor is None:
+            return None
+        body = await fetch(client, path, {**base, "cursor": cursor})
+        cursor = body["pagination"].get("next_cursor")
+    return cursor
+
+
+def fmt(ms: Optional[float]) -> str:
+    return f"{ms:9.1f} ms" if ms is not None else "     n/a   "
+
+
+async def main(args):
+    base = {"limit": args.limit, "sort_by": args.sort_by, "sort_order": "desc"}
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=300) as client:
+        await fetch(client, args.path, base)  # warm up
+
+        offset_shallow = await timed(client, args.path, {**base, "page": 1}, args.repeat)
+        offset_deep = await timed(client, args.path, {**base, "page": args.deep_page}, args.repeat)
+
+        print(f"walking {args.deep_page - 1} cursor pages...")
+        cursor = await cursor_for_page(client, args.path, base, args.deep_page)
+        cursor_shallow = await timed(client, args.path, base, args.repeat)
+        cursor_deep = None
+        if cursor is None:
+            print(f"  listing has fewer than {args.deep_page} pages")
+        else:
+            cursor_deep = await timed(client, args.path, {**base, "cursor": cursor}, args.repeat)
+
+    print(f"{args.path} sort_by={args.sort_by} limit={args.limit}, median of {args.repeat}")
+    print(f"{'':8}{'page 1':>13}{f'page {args.deep_page}':>13}")
+    print(f"{'offset':8}{fmt(offset_shallow):>13}{fmt(offset_deep):>13}")
+    print(f"{'cursor':8}{fmt(cursor_shallow):>13}{fmt(cursor_deep):>13}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--path", default="/allrepos", choices=["/allrepos", "/hiddengem"])
+    parser.add_argument("--sort-by", default="stars", choices=["stars", "forks"])
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--deep-page", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=10)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,91 @@
+"""
+Measure what limit/projection pushdown saves per search.
+
+Runs the same plans against the live Repos collection twice: as Gemini used to
+write them (limit 20, all 26 properties including readme and combined_text)
+and as the executor now rewrites them (the client's limit, only the
+properties the Repository model serializes). Reports median Weaviate latency
+and the size of the returned properties for each.
+
+    python benchmarks/pushdown.py --client-limit 10 --repeat 5
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from query_plan import REPO_PROPERTIES, QueryPlan  # noqa: E402
+from weaviate_service import WeaviateService  # noqa: E402
+
+PLANS = [
+    ("Find popular Python machine learning libraries",
+     {"mode": "near_vector", "filters": {"and": [
+         {"property": "languages", "op": "contains_any", "value": ["python"]},
+         {"property": "topics", "op": "contains_any", "value": ["machine-learning", "ml", "ai", "deep-learning"]},
+     ]}}),
+    ("Backend Python frameworks for APIs, only legitimate projects",
+     {"mode": "hybrid", "alpha": 0.7, "filters": {"and": [
+         {"property": "languages", "op": "contains_any", "value": ["python"]},
+         {"property": "stars", "op": "greater_or_equal", "value": 10},
+     ]}}),
+    ("rust command line tools", {"mode": "near_vector"}),
+    ("CI/CD pipelines and automation tools", {"mode": "hybrid", "alpha": 0.7}),
+]
+
+
+async def run(service: WeaviateService, query: str, plan: QueryPlan, repeat: int):
+    collection = service.collection()
+    vector = (await service.encode_query(query)).tolist()
+    filters = service.build_filter(plan.filters) if plan.filters is not None else None
+    latencies, size = [], 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        if plan.mode == "hybrid":
+            response = await collection.query.hybrid(
+                query=query, vector=vector, alpha=plan.alpha, filters=filters,
+                limit=plan.limit, return_properties=plan.return_properties,
+            )
+        else:
+            response = await collection.query.near_vector(
+                near_vector=vector, filters=filters, limit=plan.limit, return_properties=plan.return_properties,
+            )
+        latencies.append((time.perf_counter() - start) * 1000)
+        size = len(json.dumps([obj.properties for obj in response.objects], default=str))
+    return statistics.median(latencies), size
+
+
+async def main(args):
+    service = WeaviateService()
+    await service.connect()
+    try:
+        totals = {"before": [0.0, 0], "after": [0.0, 0]}
+        print(f"{'query':<62} {'before ms':>9} {'before KB':>9} {'after ms':>9} {'after KB':>9}")
+        for query, spec in PLANS:
+            before = QueryPlan.model_validate({**spec, "limit": 20, "return_properties": list(REPO_PROPERTIES)})
+            after = before.pushdown(args.client_limit + args.overfetch)
+            b_ms, b_size = await run(service, query, before, args.repeat)
+            a_ms, a_size = await run(service, query, after, args.repeat)
+            for key, ms, size in (("before", b_ms, b_size), ("after", a_ms, a_size)):
+                totals[key][0] += ms
+                totals[key][1] += size
+            print(f"{query[:62]:<62} {b_ms:9.1f} {b_size / 1024:9.1f} {a_ms:9.1f} {a_size / 1024:9.1f}")
+        (b_ms, b_size), (a_ms, a_size) = totals["before"], totals["after"]
+        print(f"{'total':<62} {b_ms:9.1f} {b_size / 1024:9.1f} {a_ms:9.1f} {a_size / 1024:9.1f}")
+        if b_size:
+            print(f"payload -{100 * (1 - a_size / b_size):.0f}%, latency -{100 * (1 - a_ms / b_ms):.0f}%")
+    finally:
+        await service.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--client-limit", type=int, default=10)
+    parser.add_argument("--overfetch", type=int, default=int(os.getenv('SEARCH_OVERFETCH', '0')))
+    parser.add_argument("--repeat", type=int, default=5)
+    asyncio.run(main(parser.parse_args()))
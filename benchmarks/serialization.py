@@ -0,0 +1,104 @@
+"""
+Per-response cost of turning stored properties into JSON bytes.
+
+before: what /search did per result set: format a dict per object, build a
+Repository model from each, build the SearchResponse, then FastAPI validates
+it again against response_model and JSON-encodes it.
+
+after: a RepositoryRecord per object, encoded by results.dumps (orjson when
+installed) inside a RecordResponse, with no model validation.
+
+Both paths produce the same JSON; the script checks that before timing.
+
+    python benchmarks/serialization.py --results 100 --repeat 2000
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fastapi.routing import serialize_response  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+from fastapi.utils import create_model_field  # noqa: E402
+
+from main import Repository, SearchResponse  # noqa: E402
+from query_plan import as_list  # noqa: E402
+from results import RecordResponse, RepositoryRecord, orjson  # noqa: E402
+
+
+def sample_properties(n: int, arrays: bool):
+    topics, languages = ["machine-learning", "deep-learning", "python", "pytorch"], ["python", "c++", "cuda"]
+    return [{
+        "name": f"repo-{i}", "full_name": f"owner/repo-{i}", "description": "A library for things " * 4,
+        "url": f"https://github.com/owner/repo-{i}", "homepage": "", "language": "python",
+        "languages": languages if arrays else ", ".join(languages),
+        "topics": topics if arrays else ", ".join(topics),
+        "stars": 1000 + i, "forks": 100 + i, "open_issues": i, "license": "mit",
+        "has_issues": True, "has_wiki": False,
+        "created_at": "2020-01-01T00:00:00Z", "updated_at": "2024-01-01T00:00:00Z",
+    } for i in range(n)]
+
+
+def format_result(props, distance):
+    # The pre-records WeaviateService._format_result
+    return {
+        'name': props.get('name', ''), 'full_name': props.get('full_name', ''),
+        'description': props.get('description', ''), 'url': props.get('url', ''),
+        'homepage': props.get('homepage', ''), 'language': props.get('language', ''),
+        'languages': as_list(props.get('languages')), 'topics': as_list(props.get('topics')),
+        'stars': props.get('stars', 0), 'forks': props.get('forks', 0), 'open_issues': props.get('open_issues', 0),
+        'license': props.get('license', ''), 'has_issues': props.get('has_issues', False),
+        'has_wiki': props.get('has_wiki', False), 'created_at': props.get('created_at', ''),
+        'updated_at': props.get('updated_at', ''), 'distance': round(distance, 4),
+    }
+
+
+FIELD = create_model_field(name="Response_search", type_=SearchResponse, mode="serialization")
+LOOP = asyncio.new_event_loop()
+ENVELOPE = {"query": "q", "plan": {"mode": "near_vector", "limit": 100}, "plan_source": "gemini", "degraded": False,
+            "timings": {"total_ms": 1.0, "stages": {}}}
+
+
+def before(props_list):
+    results = [format_result(props, 0.123456) for props in props_list]
+    model = SearchResponse(success=True, results_count=len(results),
+                           results=[Repository(**repo) for repo in results], **ENVELOPE)
+    content = LOOP.run_until_complete(serialize_response(field=FIELD, response_content=model, is_coroutine=True))
+    return JSONResponse(content).body
+
+
+def after(props_list):
+    results = [RepositoryRecord.from_search(props, distance=0.123456) for props in props_list]
+    return RecordResponse({"success": True, "query": "q", "results_count": len(results), "results": results,
+                           "error": None, **{k: v for k, v in ENVELOPE.items() if k != "query"}}).body
+
+
+def measure(fn, props_list, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(props_list)
+        samples.append((time.perf_counter() - start) * 1e6)
+    return statistics.median(samples)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--results", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"encoder: {'orjson' if orjson is not None else 'json'}")
+    for arrays in (False, True):
+        props_list = sample_properties(args.results, arrays)
+        assert json.loads(before(props_list)) == json.loads(after(props_list))
+        b, a = measure(before, props_list, args.repeat), measure(after, props_list, args.repeat)
+        label = "TEXT_ARRAY" if arrays else "comma TEXT"
+        print(f"{label:>10}: before {b:8.1f} us  after {a:8.1f} us  per {args.results} results ({b / a:.1f}x)")
+    LOOP.close()
@@ -0,0 +1,186 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a dependency whose breaker is open"""
+
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"{name} circuit is open; retrying in {retry_in:.1f}s")
+        self.name = name
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """
+    Rolling-window circuit breaker for one upstream dependency.
+
+    Outcomes are counted in one-second buckets over the last
+    <NAME>_BREAKER_WINDOW_SECONDS. Once the window holds at least
+    <NAME>_BREAKER_MIN_CALLS calls, the breaker opens when the error rate
+    reaches <NAME>_BREAKER_ERROR_RATE or the share of calls slower than
+    <NAME>_BREAKER_SLOW_MS reaches <NAME>_BREAKER_SLOW_RATE. While open,
+    calls fail immediately with CircuitOpenError. After
+    <NAME>_BREAKER_OPEN_SECONDS it goes half-open and lets
+    <NAME>_BREAKER_PROBES calls through: if they all succeed it closes, and
+    any failure reopens it.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        window_seconds: Optional[float] = None,
+        min_calls: Optional[int] = None,
+        error_rate: Optional[float] = None,
+        slow_ms: Optional[float] = None,
+        slow_rate: Optional[float] = None,
+        open_seconds: Optional[float] = None,
+        probes: Optional[int] = None,
+    ):
+        prefix = f"{name.upper()}_BREAKER_"
+
+        def setting(value, key, default):
+            return value if value is not None else float(os.getenv(prefix + key, default))
+
+        self.name = name
+        self.window_seconds = int(setting(window_seconds, 'WINDOW_SECONDS', '30'))
+        self.min_calls = int(setting(min_calls, 'MIN_CALLS', '20'))
+        self.error_rate = setting(error_rate, 'ERROR_RATE', '0.5')
+        self.slow_seconds = setting(slow_ms, 'SLOW_MS', '3000') / 1000
+        self.slow_rate = setting(slow_rate, 'SLOW_RATE', '0.8')
+        self.open_seconds = setting(open_seconds, 'OPEN_SECONDS', '15')
+        self.probes = int(setting(probes, 'PROBES', '3'))
+        self.state = "closed"
+        self._buckets: deque = deque()  # [second, calls, errors, slow]
+        self._lock = threading.Lock()
+        self._opened_at = 0.0
+        self._probes_started = 0
+        self._probes_passed = 0
+        self.rejected = 0
+        self.times_opened = 0
+
+    def _window(self, now: float):
+        second = int(now)
+        while self._buckets and self._buckets[0][0] <= second - self.window_seconds:
+            self._buckets.popleft()
+        if not self._buckets or self._buckets[-1][0] != second:
+            self._buckets.append([second, 0, 0, 0])
+        return self._buckets[-1]
+
+    def _open(self, now: float, reason: str):
+        self.state = "open"
+        self._opened_at = now
+        self.times_opened += 1
+        self._buckets.clear()
+        logger.warning(f"{self.name} circuit opened: {reason}")
+
+    def allow(self) -> bool:
+        """Whether a call may go through now; counts the call as a probe when half-open"""
+        with self._lock:
+            if self.state == "open":
+                if time.monotonic() - self._opened_at < self.open_seconds:
+                    self.rejected += 1
+                    return False
+                self.state = "half_open"
+                self._probes_started = self._probes_passed = 0
+                logger.info(f"{self.name} circuit half-open; probing")
+            if self.state == "half_open":
+                if self._probes_started >= self.probes:
+                    self.rejected += 1
+                    return False
+                self._probes_started += 1
+            return True
+
+    def retry_in(self) -> float:
+        """Seconds until an open breaker lets a probe through"""
+        return max(0.0, self.open_seconds - (time.monotonic() - self._opened_at)) if self.state == "open" else 0.0
+
+    def record(self, duration: float, ok: bool):
+        """Count one finished call"""
+        slow = duration >= self.slow_seconds
+        now = time.monotonic()
+        with self._lock:
+            if self.state == "half_open":
+                if not ok or slow:
+                    self._open(now, f"probe {'failed' if not ok else 'was slow'}")
+                    return
+                self._probes_passed += 1
+                if self._probes_passed >= self.probes:
+                    self.state = "closed"
+                    logger.info(f"{self.name} circuit closed")
+                return
+            if self.state == "open":
+                return
+            bucket = self._window(now)
+            bucket[1] += 1
+            bucket[2] += 0 if ok else 1
+            bucket[3] += 1 if slow else 0
+            calls = sum(b[1] for b in self._buckets)
+            if calls < self.min_calls:
+                return
+            errors = sum(b[2] for b in self._buckets) / calls
+            slow_share = sum(b[3] for b in self._buckets) / calls
+            if errors >= self.error_rate:
+                self._open(now, f"error rate {errors:.0%} over {calls} calls")
+            elif slow_share >= self.slow_rate:
+                self._open(now, f"{slow_share:.0%} of {calls} calls slower than {self.slow_seconds * 1000:.0f} ms")
+
+    async def call(
+        self,
+        work: Callable[[], Awaitable[T]],
+        is_failure: Callable[[BaseException], bool] = lambda e: True,
+    ) -> T:
+        """
+        Run work() through the breaker.
+
+        Exceptions for which is_failure() is False (e.g. a bad request) count as
+        successes. A cancelled call counts as a failure only if it had already run
+        past the slow threshold, so callers' own timeouts still trip the breaker.
+        """
+        if not self.allow():
+            raise CircuitOpenError(self.name, self.retry_in())
+        start = time.perf_counter()
+        try:
+            result = await work()
+        except asyncio.CancelledError:
+            duration = time.perf_counter() - start
+            if duration >= self.slow_seconds:
+                self.record(duration, ok=False)
+            elif self.state == "half_open":
+                with self._lock:
+                    self._probes_started -= 1  # give the probe slot back
+            raise
+        except Exception as e:
+            self.record(time.perf_counter() - start, ok=not is_failure(e))
+            raise
+        self.record(time.perf_counter() - start, ok=True)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        """State and rolling-window rates"""
+        with self._lock:
+            calls = sum(b[1] for b in self._buckets)
+            errors = sum(b[2] for b in self._buckets)
+            slow = sum(b[3] for b in self._buckets)
+        return {
+            'state': self.state,
+            'window_calls': calls,
+            'error_rate': round(errors / calls, 4) if calls else 0.0,
+            'slow_rate': round(slow / calls, 4) if calls else 0.0,
+            'retry_in_seconds': round(self.retry_in(), 2),
+            'times_opened': self.times_opened,
+            'rejected': self.rejected,
+        }
@@ -0,0 +1,107 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+COUNT_MODES = ("exact", "estimate", "none")
+
+
+class CountCache:
+    """
+    TTL cache of listing total counts keyed by a canonical filter signature.
+
+    Paging through one filtered listing asks for the same total on every page;
+    caching it turns each page view into a single fetch_objects round-trip.
+    Entries past their TTL are still returned to ``estimate`` callers, which
+    refresh them in the background.
+    """
+
+    def __init__(self, ttl_seconds: Optional[float] = None, max_entries: Optional[int] = None):
+        self.ttl_seconds = (
+            ttl_seconds if ttl_seconds is not None
+            else float(os.getenv('COUNT_CACHE_TTL_SECONDS', '300'))
+        )
+        self.max_entries = max_entries if max_entries is not None else int(os.getenv('COUNT_CACHE_MAX_ENTRIES', '1024'))
+        self._entries: "OrderedDict[str, Tuple[int, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._refreshing: Dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, signature: str, allow_stale: bool = False) -> Tuple[Optional[int], bool]:
+        """Return (count, is_fresh); count is None on a miss, or when stale and allow_stale is False"""
+        with self._lock:
+            entry = self._entries.get(signature)
+            if entry is None:
+                self.misses += 1
+                return None, False
+            count, stored_at = entry
+            fresh = time.time() - stored_at < self.ttl_seconds
+            if not fresh and not allow_stale:
+                self.misses += 1
+                return None, False
+            self._entries.move_to_end(signature)
+            if fresh:
+                self.hits += 1
+            else:
+                self.stale_hits += 1
+            return count, fresh
+
+    def put(self, signature: str, count: int):
+        """Store a freshly computed count"""
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[signature] = (count, time.time())
+            self._entries.move_to_end(signature)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, signature: Optional[str] = None):
+        """Drop one signature, or every count when the collection has been re-ingested"""
+        with self._lock:
+            if signature is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(signature, None)
+            self.invalidations += 1
+
+    def refresh_in_background(self, signature: str, fetch_count: Callable[[], Awaitable[int]]):
+        """Recount a signature without making the caller wait; one refresh per signature at a time"""
+        if signature in self._refreshing:
+            return
+
+        async def refresh():
+            try:
+                self.put(signature, await fetch_count())
+            except Exception as e:
+                logger.warning(f"Background count refresh failed: {str(e)}")
+            finally:
+                self._refreshing.pop(signature, None)
+
+        self._refreshing[signature] = asyncio.create_task(refresh())
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters"""
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses,
+            'hit_ratio': round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0.0,
+            'invalidations': self.invalidations,
+            'entries': len(self._entries),
+            'refreshing': len(self._refreshing),
+            'ttl_seconds': self.ttl_seconds,
+        }
@@ -0,0 +1,229 @@
+import asyncio
+import os
+import platform
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Executor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'all-MiniLM-L6-v2')
+
+EMBEDDING_BACKENDS = ("torch", "onnx", "onnx-int8")
+
+# Dynamically int8-quantized exports shipped in the all-MiniLM-L6-v2 hub repo, per CPU instruction set
+ONNX_INT8_FILES = {
+    "arm64": "onnx/model_qint8_arm64.onnx",
+    "avx512": "onnx/model_qint8_avx512.onnx",
+    "avx512_vnni": "onnx/model_qint8_avx512_vnni.onnx",
+    "avx2": "onnx/model_quint8_avx2.onnx",
+}
+
+
+def _cpu_isa() -> str:
+    """Best int8 kernel family for this CPU"""
+    if platform.machine().lower() in ("arm64", "aarch64"):
+        return "arm64"
+    try:
+        with open("/proc/cpuinfo") as f:
+            flags = f.read()
+    except OSError:
+        return "avx2"
+    if "avx512_vnni" in flags:
+        return "avx512_vnni"
+    if "avx512f" in flags:
+        return "avx512"
+    return "avx2"
+
+
+# Model loaded by a preforking parent (serve.py); workers reuse it copy-on-write
+_preloaded: Dict[str, Any] = {}
+
+
+def preload_embedding_model(backend: Optional[str] = None):
+    """Load the encoder once in this process so forked children share its weights"""
+    backend = (backend or os.getenv('EMBEDDING_BACKEND', 'torch')).lower()
+    if backend not in _preloaded:
+        _preloaded[backend] = load_embedding_model(backend)
+    return _preloaded[backend]
+
+
+def load_embedding_model(backend: Optional[str] = None):
+    """
+    Load the query encoder with the backend named by EMBEDDING_BACKEND:
+    "torch" (PyTorch, the default), "onnx" (ONNX Runtime, fp32) or
+    "onnx-int8" (ONNX Runtime with a dynamically int8-quantized export;
+    EMBEDDING_ONNX_FILE overrides the file picked for this CPU). The ONNX
+    backends need the packages in requirements-onnx.txt. A model already
+    preloaded before fork is returned as-is.
+    """
+    backend = (backend or os.getenv('EMBEDDING_BACKEND', 'torch')).lower()
+    if backend in _preloaded:
+        return _preloaded[backend]
+
+    from sentence_transformers import SentenceTransformer
+
+    if backend == "torch":
+        return SentenceTransformer(EMBEDDING_MODEL)
+    if backend == "onnx":
+        return SentenceTransformer(EMBEDDING_MODEL, backend="onnx")
+    if backend == "onnx-int8":
+        file_name = os.getenv('EMBEDDING_ONNX_FILE') or ONNX_INT8_FILES[_cpu_isa()]
+        return SentenceTransformer(EMBEDDING_MODEL, backend="onnx", model_kwargs={"file_name": file_name})
+    raise ValueError(f"Unknown EMBEDDING_BACKEND '{backend}', expected one of {', '.join(EMBEDDING_BACKENDS)}")
+
+
+class EmbeddingCache:
+    """
+    LRU cache of query embeddings keyed on normalized query text.
+
+    Vectors are stored as read-only float32 arrays (1.5 KB each for the
+    384-d MiniLM embeddings) so a hot query is encoded once and the same
+    array is shared by the plan cache, the executor and logging.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None):
+        self.max_entries = max_entries if max_entries is not None else int(os.getenv('EMBEDDING_CACHE_SIZE', '4096'))
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        """Return the cached vector for a normalized query, if any"""
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return vector
+
+    def put(self, key: str, vector: np.ndarray) -> np.ndarray:
+        """Store a vector and return the compact read-only copy that was cached"""
+        vector = np.array(vector, dtype=np.float32)
+        vector.setflags(write=False)
+        if self.max_entries <= 0:
+            return vector
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return vector
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and memory footprint"""
+        with self._lock:
+            entries = len(self._entries)
+            nbytes = sum(v.nbytes for v in self._entries.values())
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+            'entries': entries,
+            'bytes': nbytes,
+        }
+
+
+class EmbeddingBatcher:
+    """
+    Collects concurrent encode requests into batched model calls.
+
+    Callers await ``encode``; the collector waits up to ``max_wait_ms`` after
+    the first pending request (or until ``max_batch_size`` requests are
+    queued), runs one batched encode on the executor and resolves each
+    caller's future with its own row.
+    """
+
+    def __init__(
+        self,
+        encode_batch: Callable[[List[str]], np.ndarray],
+        executor: Optional[Executor] = None,
+        max_batch_size: Optional[int] = None,
+        max_wait_ms: Optional[float] = None,
+    ):
+        self.encode_batch = encode_batch
+        self.executor = executor
+        self.max_batch_size = max_batch_size if max_batch_size is not None else int(os.getenv('EMBEDDING_BATCH_MAX_SIZE', '32'))
+        self.max_wait = (max_wait_ms if max_wait_ms is not None else float(os.getenv('EMBEDDING_BATCH_MAX_WAIT_MS', '5'))) / 1000
+        self._queue: Optional["asyncio.Queue[Tuple[str, asyncio.Future]]"] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._collector: Optional[asyncio.Task] = None
+        self._dispatching: set = set()
+        self.batches = 0
+        self.items = 0
+        self.max_batch_seen = 0
+
+    def _ensure_collector(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._collector is None or self._collector.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._collector = loop.create_task(self._collect())
+
+    async def encode(self, text: str) -> np.ndarray:
+        """Encode one text as part of the next batch"""
+        self._ensure_collector()
+        future = self._loop.create_future()
+        self._queue.put_nowait((text, future))
+        return await future
+
+    async def encode_many(self, texts: Sequence[str]) -> List[np.ndarray]:
+        """Encode several texts; they share batches with any concurrent callers"""
+        return list(await asyncio.gather(*(self.encode(text) for text in texts)))
+
+    async def _collect(self):
+        while True:
+            batch = [await self._queue.get()]
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            # Run the batch without blocking collection of the next one
+            task = self._loop.create_task(self._dispatch(batch))
+            self._dispatching.add(task)
+            task.add_done_callback(self._dispatching.discard)
+
+    async def _dispatch(self, batch: List[Tuple[str, asyncio.Future]]):
+        batch = [(text, future) for text, future in batch if not future.done()]
+        if not batch:
+            return
+        unique = list(dict.fromkeys(text for text, _ in batch))
+        self.batches += 1
+        self.items += len(batch)
+        self.max_batch_seen = max(self.max_batch_seen, len(unique))
+        try:
+            vectors = await self._loop.run_in_executor(self.executor, self.encode_batch, unique)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        rows = {text: np.asarray(vectors[i], dtype=np.float32) for i, text in enumerate(unique)}
+        for text, future in batch:
+            if not future.done():
+                future.set_result(rows[text])
+
+    def stats(self) -> Dict[str, Any]:
+        """Batching counters"""
+        return {
+            'batches': self.batches,
+            'items': self.items,
+            'avg_batch_size': round(self.items / self.batches, 2) if self.batches else 0.0,
+            'max_batch_size_seen': self.max_batch_seen,
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000,
+        }
@@ -1,19 +1,58 @@
 import google.genai as genai
 from google.genai import types
 from dotenv import load_dotenv
+from collections import deque
+from typing import Any, Dict, Optional
+import asyncio
+import json
+import logging
 import os
+import time
+
+from circuit_breaker import CircuitBreaker
+from metrics import GEMINI_IN_FLIGHT, GEMINI_TOKENS
+from query_plan import QueryPlan
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 class GeminiService:
+    """
+    Turns natural language queries into QueryPlans with Gemini.
+    
+    Plan requests are hedged: when the first request hasn't answered after the
+    recent p95 latency (GEMINI_HEDGE_MIN_MS at least; GEMINI_HEDGE_DEFAULT_MS
+    until enough samples exist), a second one is sent to GEMINI_HEDGE_MODEL
+    (the same model by default) and whichever succeeds first wins. Set
+    GEMINI_HEDGE=false to disable.
+    
+    Plan generation goes through a circuit breaker (GEMINI_BREAKER_*): while
+    Gemini is failing or slow, calls raise CircuitOpenError immediately.
+    Plans that fail validation don't count against Gemini.
+    """
+    
     def __init__(self):
         self.client = genai.Client(api_key=os.getenv('GEMINI_API_KEY'))
         self.model = "gemini-2.0-flash"
+        self.hedge_enabled = os.getenv('GEMINI_HEDGE', 'true').lower() in ('1', 'true', 'yes')
+        self.hedge_model = os.getenv('GEMINI_HEDGE_MODEL') or self.model
+        self.hedge_min = float(os.getenv('GEMINI_HEDGE_MIN_MS', '300')) / 1000
+        self.hedge_default = float(os.getenv('GEMINI_HEDGE_DEFAULT_MS', '1500')) / 1000
+        self.latencies: deque = deque(maxlen=int(os.getenv('GEMINI_LATENCY_WINDOW', '200')))
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.breaker = CircuitBreaker("gemini")
+    
+    async def ping(self):
+        """Raise unless the Gemini API answers a model metadata lookup (no tokens are generated)"""
+        await self.client.aio.models.get(model=self.model)
         
-    def generate_weaviate_code(self, user_query: str) -> str:
-        """Convert natural language query to Weaviate Python code"""
+    async def generate_query_plan(self, user_query: str) -> QueryPlan:
+        """Convert natural language query to a validated Weaviate query plan"""
         
-        prompt = """You are a Weaviate query code generator expert. Your job is to convert natural language queries into executable Python code using the Weaviate v4 client.
+        prompt = """You are a Weaviate search planner. Your job is to convert natural language queries into a compact JSON query plan that a Weaviate v4 executor runs against the repository collection.
 
 # Available Schema
 Collection Name: "Repos"
@@ -46,91 +85,53 @@ Properties:
 - sources (TEXT) - Comma-separated list of sources
 - combined_text (TEXT) - Combined searchable text
 
-# Available Query Types
-
-1. **Semantic/Vector Search** - Use for natural language queries about concepts, features, or descriptions
-   ```python
-   collection.query.near_vector(
-       near_vector=query_vector,
-       limit=10,
-       return_properties=[...],
-       filters=...  # optional
-   )
-   ```
-
-2. **Keyword/Metadata Search** - Use ONLY when filtering by exact metadata (stars, forks, dates)
-   ```python
-   collection.query.fetch_objects(
-       filters=...,
-       limit=10,
-       return_properties=[...]
-   )
-   ```
-
-3. **Hybrid Search** - Combine semantic + keyword (BEST for most queries with filters)
-   ```python
-   collection.query.hybrid(
-       query=query_text,
-       vector=query_vector,
-       alpha=0.7,  # 0=keyword only, 1=vector only, 0.7=prefer semantic
-       limit=10,
-       filters=...
-   )
-   ```
-
-# Filter Operations
-
-```python
-from weaviate.classes.query import Filter
-
-# Comparison
-Filter.by_property("stars").greater_than(100)
-Filter.by_property("stars").greater_or_equal(100)
-Filter.by_property("stars").less_than(1000)
-Filter.by_property("stars").less_or_equal(1000)
-Filter.by_property("language").equal("python")
-
-# Array/List operations (for topics, languages fields)
-Filter.by_property("topics").contains_any(["ci-cd", "pipeline"])  # Match ANY of these
-Filter.by_property("topics").contains_all(["ci", "docker"])       # Match ALL of these
-Filter.by_property("topics").contains_none(["deprecated"])        # Match NONE of these
-
-# String pattern matching (case-insensitive by default)
-Filter.by_property("name").like("*jenkins*")
-Filter.by_property("description").like("*continuous integration*")
-
-# Logical operators
-filter1 & filter2  # AND
-filter1 | filter2  # OR
-```
+# Plan Format
+
+{
+  "mode": "near_vector" | "hybrid" | "fetch_objects",
+  "alpha": 0.7,
+  "filters": <filter node, optional>
+}
+
+Search modes:
+1. **near_vector** - Semantic search on the query embedding. Use for natural language queries about concepts, features, or descriptions
+2. **hybrid** - Semantic + keyword search. "alpha" weighs them (0=keyword only, 1=vector only, 0.7=prefer semantic)
+3. **fetch_objects** - Metadata-only search. Use ONLY when filtering by exact metadata (stars, forks, dates); requires filters
+
+The executor embeds the query and sets the result limit and returned properties from the client's request, so the plan never contains code, vectors, limits or property lists.
+
+# Filter Nodes
+
+A filter node is either a condition or a group:
+
+{"property": "stars", "op": "greater_or_equal", "value": 100}
+{"and": [<node>, <node>, ...]}
+{"or": [<node>, <node>, ...]}
+
+Operators:
+- INT properties: "equal", "not_equal", "greater_than", "greater_or_equal", "less_than", "less_or_equal" (integer value)
+- BOOL properties: "equal", "not_equal" (true/false value)
+- TEXT properties: "equal", "not_equal", "like" (string value, "*" wildcards, e.g. "*jenkins*")
+- TEXT list fields (topics, languages): "contains_any" (match ANY of the listed strings), "contains_all" (match ALL of them)
 
 # CRITICAL: Open Source Project Filtering
 
 When users request "open source repos only" or "legitimate projects", you MUST apply these base filters:
 
-```python
-# MANDATORY Open Source Base Filters
-opensource_filters = (
-    Filter.by_property("stars").greater_or_equal(10) &
-    Filter.by_property("forks").greater_or_equal(3) &
-    Filter.by_property("has_issues").equal(True)
-)
-```
+{"property": "stars", "op": "greater_or_equal", "value": 10},
+{"property": "forks", "op": "greater_or_equal", "value": 3},
+{"property": "has_issues", "op": "equal", "value": true}
 
 **Why these filters matter:**
 - `stars >= 10`: Real projects have community interest (filters out personal demos)
 - `forks >= 3`: Active projects get forked (shows reuse and legitimacy)
 - `has_issues = true`: Legitimate open source projects enable issue tracking
 
-**Exclude tutorial/demo patterns in name:**
-Use `contains_none()` or manual exclusions for topics containing:
-- "tutorial", "learning", "demo", "example", "sample", "practice", "homework", "assignment", "boilerplate", "template", "starter"
-
 # CRITICAL: Topic/Keyword Extraction Rules
 
 When the user mentions specific technologies, tools, or concepts, you MUST:
 1. **Extract relevant keywords and topics** from the user's query
-2. **Apply filters using contains_any()** on the "topics" field
+2. **Apply filters using contains_any** on the "topics" field
 3. **Use semantic search** to find conceptually similar repos
 4. **Combine filters intelligently** - don't just do pure vector search
 5. **Add open source filters** when user mentions "open source only" or "legitimate projects"
@@ -148,232 +149,144 @@ Common topic patterns to recognize:
 
 # Important Rules
 
-1. ALWAYS import required classes at the top
-2. Assume these variables exist:
-   - `client` - Weaviate client instance (NOT weaviate_client)
-   - `model` - SentenceTransformer model for embeddings
-   - `query_text` - The user's search query as a string
-3. **ALWAYS generate query_vector** for semantic/vector/hybrid search
-4. **ALWAYS add topic filters** when user mentions specific technologies or domains
-5. **ALWAYS add open source base filters** when user mentions "open source only" or "legitimate"
-6. Return ALL relevant properties: ["name", "full_name", "description", "readme", "topics", "stars", "forks", "open_issues", "license", "has_issues", "has_wiki", "url", "language", "languages"]
-7. Set reasonable limits:
-   - Default: 20 (to allow post-filtering)
-   - If user wants "suggestions" or "many": 30
-   - If user wants "top" or "best": 15
-8. For language filters, convert to lowercase
-9. **Prefer hybrid search over pure vector search** when you have filters
-10. When user asks for "repos about X" or "interested in X", extract topics from X
-11. **ALWAYS filter has_issues=true**
+1. **ALWAYS add topic filters** when user mentions specific technologies or domains
+2. **ALWAYS add open source base filters** when user mentions "open source only" or "legitimate"
+3. For language filters, use lowercase values
+4. **Prefer hybrid search over pure vector search** when you have filters
+5. When user asks for "repos about X" or "interested in X", extract topics from X
+6. **ALWAYS filter has_issues=true**
 
 # Output Format
 
-Provide ONLY the Python code that executes the query. 
-DO NOT include:
-- Explanations or comments
-- Markdown code blocks (no ```python or ```)
-- Extra text before or after the code
-- Any formatting markers
-
-The output must be raw, executable Python code that can be run directly with exec().
-
-The code should:
-1. Import necessary classes (if filters are used)
-2. Get the collection
-3. Generate embeddings (query_vector)
-4. Build filters based on extracted topics/keywords
-5. Add open source filters if requested
-6. Execute the query (prefer hybrid or near_vector with filters)
-7. Store results in a variable called `results`
+Provide ONLY the JSON plan, minified, with no explanations, comments or markdown code blocks.
 
 # Examples
 
 User Query: "Find popular Python machine learning libraries"
 Output:
-from weaviate.classes.query import Filter
-
-collection = client.collections.get("Repos")
-query_vector = model.encode([query_text])[0].tolist()
-
-filters = (
-    Filter.by_property("languages").contains_any(["python"]) &
-    Filter.by_property("topics").contains_any(["machine-learning", "ml", "ai", "deep-learning"]) &
-    Filter.by_property("stars").greater_or_equal(500)
-)
-
-results = collection.query.near_vector(
-    near_vector=query_vector,
-    filters=filters,
-    limit=20,
-    return_properties=["name", "full_name", "owner", "description", "readme", "topics", "stars", "forks", "open_issues", "license", "has_issues", "has_wiki", "url", "language", "languages", "repo_id", "homepage", "created_at", "updated_at", "default_branch", "is_gsoc", "is_hacktoberfest", "is_underrated", "has_good_first_issues", "sources", "combined_text"]
-)
+{"mode":"near_vector","filters":{"and":[{"property":"languages","op":"contains_any","value":["python"]},{"property":"topics","op":"contains_any","value":["machine-learning","ml","ai","deep-learning"]},{"property":"stars","op":"greater_or_equal","value":500}]}}
 
 User Query: "Show me JavaScript repos with more than 1000 stars"
 Output:
-from weaviate.classes.query import Filter
-
-collection = client.collections.get("Repos")
-query_vector = model.encode([query_text])[0].tolist()
-
-filters = (
-    Filter.by_property("languages").contains_any(["javascript"]) &
-    Filter.by_property("stars").greater_than(1000)
-)
-
-results = collection.query.near_vector(
-    near_vector=query_vector,
-    filters=filters,
-    limit=20,
-    return_properties=["name", "full_name", "owner", "description", "readme", "topics", "stars", "forks", "open_issues", "license", "has_issues", "has_wiki", "url", "language", "languages", "repo_id", "homepage", "created_at", "updated_at", "default_branch", "is_gsoc", "is_hacktoberfest", "is_underrated", "has_good_first_issues", "sources", "combined_text"]
-)
+{"mode":"near_vector","filters":{"and":[{"property":"languages","op":"contains_any","value":["javascript"]},{"property":"stars","op":"greater_than","value":1000}]}}
 
 User Query: "Find web frameworks in Python or JavaScript"
 Output:
-from weaviate.classes.query import Filter
-
-collection = client.collections.get("Repos")
-query_vector = model.encode([query_text])[0].tolist()
-
-filters = (
-    (Filter.by_property("languages").contains_any(["python"]) | 
-     Filter.by_property("languages").contains_any(["javascript"])) &
-    Filter.by_property("topics").contains_any(["web", "framework", "webapp", "api"])
-)
-
-results = collection.query.near_vector(
-    near_vector=query_vector,
-    filters=filters,
-    limit=20,
-    return_properties=["name", "full_name", "description", "readme", "topics", "stars", "forks", "open_issues", "license", "has_issues", "has_wiki", "url", "language", "languages"]
-)
+{"mode":"near_vector","filters":{"and":[{"or":[{"property":"languages","op":"contains_any","value":["python"]},{"property":"languages","op":"contains_any","value":["javascript"]}]},{"property":"topics","op":"contains_any","value":["web","framework","webapp","api"]}]}}
 
 User Query: "I'm interested in CI/CD and pipelines, suggest open source repos"
 Output:
-from weaviate.classes.query import Filter
-
-collection = client.collections.get("Repos")
-query_vector = model.encode([query_text])[0].tolist()
-
-filters = (
-    Filter.by_property("topics").contains_any([
-        "ci-cd", "ci", "cd", "continuous-integration", "continuous-deployment",
-        "pipeline", "pipelines", "workflow", "automation", "devops"
-    ]) &
-    Filter.by_property("stars").greater_or_equal(10) &
-    Filter.by_property("forks").greater_or_equal(3) &
-    Filter.by_property("has_issues").equal(True)
-)
-
-results = collection.query.near_vector(
-    near_vector=query_vector,
-    filters=filters,
-    limit=20,
-    return_properties=["name", "full_name", "description", "readme", "topics", "stars", "forks", "open_issues", "license", "has_issues", "has_wiki", "url", "language", "languages"]
-)
+{"mode":"near_vector","filters":{"and":[{"property":"topics","op":"contains_any","value":["ci-cd","ci","cd","continuous-integration","continuous-deployment","pipeline","pipelines","workflow","automation","devops"]},{"property":"stars","op":"greater_or_equal","value":10},{"property":"forks","op":"greater_or_equal","value":3},{"property":"has_issues","op":"equal","value":true}]}}
 
 User Query: "I am a frontend developer, open source repos only"
 Output:
-from weaviate.classes.query import Filter
-
-collection = client.collections.get("Repos")
-query_vector = model.encode([query_text])[0].tolist()
-
-filters = (
-    Filter.by_property("languages").contains_any(["javascript", "typescript", "html", "css"]) &
-    Filter.by_property("topics").contains_any(["frontend", "web", "ui", "react", "vue", "angular", "svelte", "webapp"]) &
-    Filter.by_property("stars").greater_or_equal(10) &
-    Filter.by_property("forks").greater_or_equal(3) &
-    Filter.by_property("has_issues").equal(True)
-)
-
-results = collection.query.near_vector(
-    near_vector=query_vector,
-    filters=filters,
-    limit=20,
-    return_properties=["name", "full_name", "description", "readme", "topics", "stars", "forks", "open_issues", "license", "has_issues", "has_wiki", "url", "language", "languages"]
-)
+{"mode":"near_vector","filters":{"and":[{"property":"languages","op":"contains_any","value":["javascript","typescript","html","css"]},{"property":"topics","op":"contains_any","value":["frontend","web","ui","react","vue","angular","svelte","webapp"]},{"property":"stars","op":"greater_or_equal","value":10},{"property":"forks","op":"greater_or_equal","value":3},{"property":"has_issues","op":"equal","value":true}]}}
 
 User Query: "Backend Python frameworks for APIs, only legitimate projects"
 Output:
-from weaviate.classes.query import Filter
-
-collection = client.collections.get("Repos")
-query_vector = model.encode([query_text])[0].tolist()
-
-filters = (
-    Filter.by_property("languages").contains_any(["python"]) &
-    Filter.by_property("topics").contains_any(["backend", "api", "framework", "web", "rest", "graphql"]) &
-    Filter.by_property("stars").greater_or_equal(10) &
-    Filter.by_property("forks").greater_or_equal(3) &
-    Filter.by_property("has_issues").equal(True)
-)
-
-results = collection.query.near_vector(
-    near_vector=query_vector,
-    filters=filters,
-    limit=20,
-    return_properties=["name", "full_name", "description", "readme", "topics", "stars", "forks", "open_issues", "license", "has_issues", "has_wiki", "url", "language", "languages"]
-)
+{"mode":"hybrid","alpha":0.7,"filters":{"and":[{"property":"languages","op":"contains_any","value":["python"]},{"property":"topics","op":"contains_any","value":["backend","api","framework","web","rest","graphql"]},{"property":"stars","op":"greater_or_equal","value":10},{"property":"forks","op":"greater_or_equal","value":3},{"property":"has_issues","op":"equal","value":true}]}}
 
 User Query: "Docker and Kubernetes repos with good documentation"
 Output:
-from weaviate.classes.query import Filter
-
-collection = client.collections.get("Repos")
-query_vector = model.encode([query_text])[0].tolist()
-
-filters = (
-    Filter.by_property("topics").contains_any([
-        "docker", "kubernetes", "k8s", "container", "orchestration", "containerization"
-    ]) &
-    Filter.by_property("has_wiki").equal(True)
-)
-
-results = collection.query.near_vector(
-    near_vector=query_vector,
-    filters=filters,
-    limit=20,
-    return_properties=["name", "full_name", "description", "readme", "topics", "stars", "forks", "open_issues", "license", "has_issues", "has_wiki", "url", "language", "languages"]
-)
+{"mode":"near_vector","filters":{"and":[{"property":"topics","op":"contains_any","value":["docker","kubernetes","k8s","container","orchestration","containerization"]},{"property":"has_wiki","op":"equal","value":true}]}}
 
 # CRITICAL REMINDERS
 1. When users mention specific domains, technologies, or interests:
    - Extract the key topics/keywords
-   - Add them to a contains_any() filter on "topics"
-   - Use semantic search (near_vector) to find conceptually similar repos
+   - Add them to a contains_any condition on "topics"
+   - Use semantic search (near_vector or hybrid) to find conceptually similar repos
    - DO NOT rely only on vector similarity without filters
 
-2. **MANDATORY: ALWAYS return ALL properties in EVERY query:**
-   return_properties=["name", "full_name", "owner", "description", "readme", "topics", "stars", "forks", "open_issues", "license", "has_issues", "has_wiki", "url", "language", "languages", "repo_id", "homepage", "created_at", "updated_at", "default_branch", "is_gsoc", "is_hacktoberfest", "is_underrated", "has_good_first_issues", "sources", "combined_text"]
-   
-   This is NON-NEGOTIABLE. Every single query must return all properties for downstream processing.
-
-3. When users request "open source only" or "legitimate projects":
+2. When users request "open source only" or "legitimate projects":
    - ALWAYS add: stars >= 10, forks >= 3, has_issues = true
    - These filters ensure quality, community-driven projects
 
-4. Set limit to 20-30 for queries that need post-filtering (open source, legitimate projects)
+Now convert the user's query into a JSON query plan:
 
-Now convert the user's query into executable Weaviate Python code:
-
-User Query: """ + f'"{user_query}"'
+User Query: """ + json.dumps(user_query)
         
-        response = self.client.models.generate_content(
-            model=self.model,
-            contents=prompt,
-            config=types.GenerateContentConfig(temperature=0.2)
-        )
+        return await self.breaker.call(lambda: self._hedged(prompt), is_failure=lambda e: not isinstance(e, ValueError))
+    
+    def _percentile(self, q: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    
+    def hedge_delay(self) -> float:
+        """Seconds to wait on the first request before hedging: the recent p95 latency"""
+        if len(self.latencies) < 20:
+            return self.hedge_default
+        return max(self.hedge_min, self._percentile(0.95))
+    
+    async def _hedged(self, prompt: str) -> QueryPlan:
+        primary = asyncio.create_task(self._request(prompt, self.model))
+        tasks = {primary}
+        try:
+            if self.hedge_enabled:
+                done, _ = await asyncio.wait(tasks, timeout=self.hedge_delay())
+                if not done:
+                    self.hedges += 1
+                    logger.info("Gemini slower than its p95; sending a hedged request")
+                    tasks.add(asyncio.create_task(self._request(prompt, self.hedge_model)))
+            error: Optional[BaseException] = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+    
+    async def _request(self, prompt: str, model: str) -> QueryPlan:
+        self.requests += 1
+        start = time.perf_counter()
+        GEMINI_IN_FLIGHT.inc()
+        try:
+            response = await self.client.aio.models.generate_content(
+                model=model,
+                contents=prompt,
+                config=types.GenerateContentConfig(
+                    temperature=0.2,
+                    response_mime_type="application/json"
+                )
+            )
+        finally:
+            GEMINI_IN_FLIGHT.dec()
+
+        usage = getattr(response, "usage_metadata", None)
+        if usage is not None:
+            GEMINI_TOKENS.labels(model, "prompt").inc(usage.prompt_token_count or 0)
+            GEMINI_TOKENS.labels(model, "completion").inc(usage.candidates_token_count or 0)
         
-        generated_code = response.text.strip()
-
-        if generated_code.startswith("```python"):
-            generated_code = generated_code[9:]
-        elif generated_code.startswith("```"):
-            generated_code = generated_code[3:]
-
-        if generated_code.endswith("```"):
-            generated_code = generated_code[:-3]
-
-        generated_code = generated_code.strip()
-
-        return generated_code
\ No newline at end of file
+        plan_text = response.text.strip()
+
+        if plan_text.startswith("```json"):
+            plan_text = plan_text[7:]
+        elif plan_text.startswith("```"):
+            plan_text = plan_text[3:]
+
+        if plan_text.endswith("```"):
+            plan_text = plan_text[:-3]
+
+        plan = QueryPlan.from_json(plan_text.strip())
+        self.latencies.append(time.perf_counter() - start)
+        return plan
+    
+    def stats(self) -> Dict[str, Any]:
+        """Request, hedge and latency counters"""
+        p50, p95 = self._percentile(0.5), self._percentile(0.95)
+        return {
+            'requests': self.requests,
+            'hedges': self.hedges,
+            'hedge_wins': self.hedge_wins,
+            'hedge_model': self.hedge_model if self.hedge_enabled else None,
+            'latency_p50_ms': round(p50 * 1000, 1) if p50 is not None else None,
+            'latency_p95_ms': round(p95 * 1000, 1) if p95 is not None else None,
+            'hedge_delay_ms': round(self.hedge_delay() * 1000, 1),
+        }
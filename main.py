@@ -1,21 +1,141 @@
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, Header, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from typing import Annotated, List, Optional, Dict, Any, Tuple
+from contextlib import asynccontextmanager
+import asyncio
+import hmac
 import logging
 import math
+import os
+import time
 
 from gemini_service import GeminiService
 from weaviate_service import WeaviateService
+from plan_cache import PlanCache, normalize_query
+from search_pipeline import SearchPipeline, SearchStageError
+from results import RecordResponse, RepositoryRecord, dumps
+from readiness import FirstRequestMiddleware, ReadinessProbe
+from count_cache import COUNT_MODES, CountCache
+from response_cache import ResponseCache
+from singleflight import SingleFlight
+from metrics import METRICS_ENABLED, REGISTRY, MetricsMiddleware, stats_collector
+from tracing import TRACING_ENABLED, TraceStore, TracingMiddleware, annotate, record_cache, traced
+from replica import RepoReplica
+from vector_index import LocalVectorIndex
+from pagination import CursorError, decode_cursor, filter_signature, next_cursor, page_query
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Service instances are built in the lifespan handler so importing this module stays cheap
+gemini_service: Optional[GeminiService] = None
+weaviate_service: Optional[WeaviateService] = None
+plan_cache: Optional[PlanCache] = None
+count_cache: Optional[CountCache] = None
+replica: Optional[RepoReplica] = None
+search_pipeline: Optional[SearchPipeline] = None
+readiness = ReadinessProbe()
+response_cache = ResponseCache()
+# Concurrent identical requests share one computation
+search_flight = SingleFlight("search")
+listing_flight = SingleFlight("listing")
+# Recent and slowest request traces for /debug/traces
+trace_store = TraceStore()
+
+# /metrics reads the components' own stats() at scrape time
+REGISTRY.register_collector(stats_collector(
+    "findmyrepo_cache_hit_ratio", "Hit ratio of each cache",
+    lambda: {
+        "plan_cache": plan_cache.stats() if plan_cache is not None else None,
+        "count_cache": count_cache.stats() if count_cache is not None else None,
+        "response_cache": response_cache.stats(),
+        "embedding_cache": weaviate_service.embedding_cache.stats() if weaviate_service is not None else None,
+    },
+    "hit_ratio"
+))
+REGISTRY.register_collector(stats_collector(
+    "findmyrepo_singleflight_in_flight", "Distinct computations in flight",
+    lambda: {"search": search_flight.stats(), "listing": listing_flight.stats()}, "in_flight"
+))
+REGISTRY.register_collector(stats_collector(
+    "findmyrepo_singleflight_coalescing_ratio", "Fraction of calls that shared another caller's computation",
+    lambda: {"search": search_flight.stats(), "listing": listing_flight.stats()}, "coalescing_ratio"
+))
+REGISTRY.register_collector(stats_collector(
+    "findmyrepo_circuit_breaker_open", "1 while a dependency's circuit breaker is not closed",
+    lambda: {
+        "gemini": {"open": int(gemini_service.breaker.state != "closed")} if gemini_service is not None else None,
+        "weaviate": {"open": int(weaviate_service.breaker.state != "closed")} if weaviate_service is not None else None,
+    },
+    "open"
+))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Build services, warm them up and probe dependencies before serving traffic"""
+    global gemini_service, weaviate_service, plan_cache, count_cache, replica, search_pipeline
+    
+    start = time.perf_counter()
+    weaviate_service = WeaviateService()
+    readiness.record_warmup("embedding_model_load", time.perf_counter() - start)
+    
+    start = time.perf_counter()
+    await weaviate_service.warm_up()
+    readiness.record_warmup("embedding_encode", time.perf_counter() - start)
+    
+    gemini_service = GeminiService()
+    plan_cache = PlanCache()
+    count_cache = CountCache()
+    search_pipeline = SearchPipeline(gemini_service, weaviate_service, plan_cache)
+    
+    # A dependency that is down at boot is retried by the background probe instead of failing startup
+    start = time.perf_counter()
+    try:
+        await weaviate_service.connect()
+        logger.info("Weaviate client connected")
+    except Exception as e:
+        logger.error(f"Weaviate connection failed at startup: {str(e)}")
+    readiness.record_warmup("weaviate_connect", time.perf_counter() - start)
+    
+    # Listings (and local near_vector search) use Weaviate until the replica's first sync completes
+    local_vectors = weaviate_service.vector_index_mode != "off"
+    if local_vectors or os.getenv('LOCAL_REPLICA', 'false').lower() in ('1', 'true', 'yes'):
+        replica = RepoReplica(vector_index=LocalVectorIndex() if local_vectors else None)
+        if local_vectors:
+            weaviate_service.attach_local_index(replica)
+        replica.start(weaviate_service.collection)
+    
+    # Searches fall back to a plain hybrid search without Gemini, and a synced replica serves
+    # listings (and local vector search) without Weaviate, so neither outage should pull the instance
+    readiness.register("embedding", weaviate_service.warm_up)
+    readiness.register("weaviate", weaviate_service.ping, critical=lambda: replica is None or not replica.ready)
+    readiness.register("gemini", gemini_service.ping, critical=False)
+    await readiness.check_all()
+    readiness.start()
+    trace_store.start()
+    readiness.mark_started()
+    
+    yield
+    
+    try:
+        await readiness.stop()
+        if replica is not None:
+            await replica.stop()
+        await weaviate_service.close()
+        plan_cache.close()
+        trace_store.close()
+        logger.info("Application shutdown completed")
+    except Exception as e:
+        logger.error(f"Error during shutdown: {str(e)}")
+
 app = FastAPI(
     title="FindMyRepo API",
     description="Natural language search for GitHub repositories using Gemini AI and Weaviate",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS middleware for frontend integration
@@ -25,8 +145,19 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-Trace-Id"],
 )
 
+app.add_middleware(FirstRequestMiddleware, probe=readiness)
+
+# Server-Timing and X-Trace-Id on every response; traces kept in trace_store
+if TRACING_ENABLED:
+    app.add_middleware(TracingMiddleware, store=trace_store)
+
+# Wraps tracing and CORS, so request latency includes them
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
 # Pydantic models
 class Repository(BaseModel):
     name: str = ""
@@ -59,7 +190,25 @@ class SearchResponse(BaseModel):
     results_count: int
     results: List[Repository]
     error: Optional[str] = None
-    generated_code: Optional[str] = None
+    plan: Optional[Dict[str, Any]] = None
+    plan_source: Optional[str] = None
+    degraded: bool = False
+    degraded_reason: Optional[str] = None
+    timings: Optional[Dict[str, Any]] = None
+
+class SearchBatchRequest(BaseModel):
+    queries: List[Annotated[str, Field(min_length=1, max_length=1000)]] = Field(
+        ..., min_length=1, max_length=int(os.getenv('SEARCH_BATCH_MAX_QUERIES', '500')),
+        description="Natural language search queries"
+    )
+    limit: Optional[int] = Field(10, ge=1, le=50, description="Maximum number of results per query")
+
+class SearchBatchResponse(BaseModel):
+    success: bool
+    results: List[SearchResponse]
+    queries_count: int
+    unique_queries: int
+    timings: Optional[Dict[str, Any]] = None
 
 class PaginationRequest(BaseModel):
     page: int = Field(1, ge=1, description="Page number (starts from 1)")
@@ -72,6 +221,7 @@ class PaginatedResponse(BaseModel):
     data: List[Repository]
     pagination: Dict[str, Any]
     filters_applied: Optional[Dict[str, Any]] = None
+    freshness: Optional[Dict[str, Any]] = None
     error: Optional[str] = None
 
 class RepositoryFilters(BaseModel):
@@ -93,9 +243,150 @@ class RepositoryFilters(BaseModel):
     name_contains: Optional[str] = Field(None, description="Filter repositories where name contains this text")
     description_contains: Optional[str] = Field(None, description="Filter repositories where description contains this text")
 
-# Global service instances (in production, consider using dependency injection)
-gemini_service = GeminiService()
-weaviate_service = WeaviateService()
+async def _weaviate_listing_page(
+    signature: str,
+    combined_filter: Any,
+    sort_by: str,
+    sort_order: str,
+    decoded_cursor: Optional[Dict[str, Any]],
+    offset: int,
+    limit: int,
+    count_mode: str,
+    return_properties: List[str]
+) -> Tuple[List[Any], Optional[int], bool]:
+    """Fetch a listing page from Weaviate, returning (objects, total count, whether the count is an estimate)"""
+    range_filter, query_offset, sort_config = page_query(sort_by, sort_order, decoded_cursor, offset)
+    
+    collection = weaviate_service.collection()
+    
+    async def fetch_count() -> int:
+        total_count_response = await collection.aggregate.over_all(
+            filters=combined_filter,
+            total_count=True
+        )
+        return total_count_response.total_count
+    
+    def refresh_count():
+        # Background recounts outlive the breaker call this page runs under, so they go through
+        # the breaker themselves; while it is open the stale total is served without retrying
+        if weaviate_service.breaker.retry_in() == 0:
+            count_cache.refresh_in_background(signature, lambda: weaviate_service.breaker.call(fetch_count))
+    
+    # Total count (with filters if applied), from the cache when possible
+    total_count = None
+    count_is_estimate = False
+    count_task = None
+    if count_mode != "none":
+        total_count, fresh = count_cache.get(signature, allow_stale=count_mode == "estimate")
+        record_cache("count", "miss" if total_count is None else "hit" if fresh else "stale")
+        if total_count is not None and not fresh:
+            count_is_estimate = True
+            refresh_count()
+        elif total_count is None and count_mode == "exact":
+            # Runs with the fetch, inside the listing's breaker call
+            count_task = traced("count", fetch_count())
+        elif total_count is None:
+            refresh_count()
+    
+    # The cursor's range filter only narrows the fetch, never the count
+    page_filter = combined_filter
+    if range_filter is not None:
+        page_filter = range_filter if combined_filter is None else combined_filter & range_filter
+    
+    fetch = traced("fetch", collection.query.fetch_objects(
+        filters=page_filter,
+        limit=limit,
+        offset=query_offset,
+        sort=sort_config,
+        return_properties=return_properties
+    ))
+    if count_task is not None:
+        total_count, response = await asyncio.gather(count_task, fetch)
+        count_cache.put(signature, total_count)
+    else:
+        response = await fetch
+    return response.objects, total_count, count_is_estimate
+
+async def _fetch_listing_page(
+    listing: str,
+    combined_filter: Any,
+    filters_applied: Optional[Dict[str, Any]],
+    page: int,
+    limit: int,
+    sort_by: str,
+    sort_order: str,
+    cursor: Optional[str],
+    count_mode: str,
+    return_properties: List[str]
+) -> Tuple[List[RepositoryRecord], Dict[str, Any], Optional[Dict[str, Any]]]:
+    """
+    Fetch one page of a listing by offset (page) or keyset (cursor), plus its pagination info.
+    
+    Returns the repositories, the pagination info and, when served from the local replica,
+    its freshness. count_mode: "exact" uses a fresh cached total or counts concurrently with the fetch,
+    "estimate" accepts a stale cached total (refreshed in the background), "none" skips it.
+    """
+    if count_mode not in COUNT_MODES:
+        raise HTTPException(status_code=400, detail=f"count must be one of {', '.join(COUNT_MODES)}")
+    signature = filter_signature(listing, filters_applied)
+    try:
+        decoded_cursor = decode_cursor(cursor, sort_by, sort_order, signature) if cursor else None
+    except CursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    offset = (page - 1) * limit
+    freshness = None
+    if replica is not None and replica.ready:
+        # Answered from the local column store: exact totals are free and Weaviate isn't touched
+        objects, total_count = replica.query(filters_applied or {}, sort_by, sort_order, offset, limit, decoded_cursor)
+        count_is_estimate = False
+        freshness = replica.freshness()
+        annotate(listing_source="replica")
+    else:
+        # Fails fast with CircuitOpenError while Weaviate is unhealthy
+        annotate(listing_source="weaviate")
+        flight_key = (signature, sort_by, sort_order, cursor, offset, limit, count_mode, tuple(return_properties))
+        objects, total_count, count_is_estimate = await listing_flight.do(flight_key, lambda: weaviate_service.breaker.call(
+            lambda: _weaviate_listing_page(
+                signature, combined_filter, sort_by, sort_order, decoded_cursor, offset, limit, count_mode, return_properties
+            )
+        ))
+    repositories = [RepositoryRecord(obj.properties) for obj in objects]
+    
+    # A short offset page pins down the total even without a count
+    if total_count is None and decoded_cursor is None and len(repositories) < limit:
+        total_count = offset + len(repositories)
+    
+    # Calculate pagination info
+    total_pages = None
+    if total_count is not None:
+        total_pages = math.ceil(total_count / limit) if total_count > 0 else 1
+    if decoded_cursor is None:
+        has_next = page < total_pages if total_pages is not None and not count_is_estimate else len(repositories) == limit
+        has_prev = page > 1
+    else:
+        has_next = len(repositories) == limit
+        has_prev = True
+    following = next_cursor(
+        sort_by, sort_order, signature, objects, limit, decoded_cursor, offset
+    ) if has_next else None
+    
+    pagination_info = {
+        "current_page": page if decoded_cursor is None else None,
+        "per_page": limit,
+        "total_items": total_count,
+        "total_pages": total_pages,
+        "total_is_estimate": count_is_estimate,
+        "count_mode": count_mode,
+        "has_next": has_next,
+        "has_previous": has_prev,
+        "next_page": page + 1 if has_next and decoded_cursor is None else None,
+        "previous_page": page - 1 if has_prev and decoded_cursor is None else None,
+        "next_cursor": following,
+        "sort_by": sort_by,
+        "sort_order": sort_order
+    }
+    return repositories, pagination_info, freshness
 
 @app.get("/")
 async def root():
@@ -104,15 +395,91 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    """Detailed health check"""
+    """Liveness check: the process is up and serving; dependencies are reported by /ready, breaker states here"""
+    breakers = {}
+    if gemini_service is not None:
+        breakers["gemini"] = gemini_service.breaker.stats()
+    if weaviate_service is not None:
+        breakers["weaviate"] = weaviate_service.breaker.stats()
     return {
         "status": "healthy",
-        "services": {
-            "gemini": "connected",
-            "weaviate": "connected"
-        }
+        "degraded": any(breaker["state"] != "closed" for breaker in breakers.values()),
+        "breakers": breakers
+    }
+
+@app.get("/ready")
+async def readiness_check():
+    """Readiness check from cached per-dependency status; 503 until every critical dependency is ready"""
+    report = readiness.report()
+    return JSONResponse(status_code=200 if report["ready"] else 503, content=report)
+
+@app.get("/stats")
+async def get_stats():
+    """Cache counters for tuning"""
+    return {
+        "plan_cache": plan_cache.stats(),
+        "count_cache": count_cache.stats(),
+        "response_cache": response_cache.stats(),
+        "replica": replica.stats() if replica is not None else None,
+        "vector_search": weaviate_service.vector_search_stats(),
+        "embedding_cache": weaviate_service.embedding_cache.stats(),
+        "embedding_batcher": weaviate_service.embedding_batcher.stats(),
+        "search_pipeline": search_pipeline.stats(),
+        "gemini": gemini_service.stats(),
+        "singleflight": {"search": search_flight.stats(), "listing": listing_flight.stats()},
+        "traces": trace_store.stats()
     }
 
+@app.get("/metrics")
+async def get_metrics():
+    """Request, stage latency, cache and Gemini token metrics in Prometheus text format"""
+    return Response(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+def _require_admin(x_admin_token: Optional[str]):
+    """403 unless the X-Admin-Token header matches ADMIN_TOKEN"""
+    admin_token = os.getenv('ADMIN_TOKEN')
+    if not admin_token or not x_admin_token or not hmac.compare_digest(x_admin_token, admin_token):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+@app.get("/debug/traces")
+async def get_traces(
+    view: str = Query("recent", pattern="^(recent|slowest)$", description="recent (newest first) or slowest"),
+    limit: int = Query(20, ge=1, le=500, description="Maximum number of traces"),
+    route: Optional[str] = Query(None, description="Only this route template, e.g. /search"),
+    min_ms: float = Query(0.0, ge=0, description="Only traces at least this long (recent view)"),
+    x_admin_token: Optional[str] = Header(None)
+):
+    """
+    Per-request traces for latency investigations; requires ADMIN_TOKEN.
+    
+    Each trace has its stage spans (start/end offsets from the start of the request), the plan
+    and result count for searches, and which caches hit. Responses name their trace in X-Trace-Id.
+    """
+    _require_admin(x_admin_token)
+    if view == "slowest":
+        traces = trace_store.slowest(limit, route)
+    else:
+        traces = trace_store.recent(limit, route, min_ms)
+    return {"view": view, "count": len(traces), "traces": traces, "store": trace_store.stats()}
+
+@app.get("/debug/traces/{trace_id}")
+async def get_trace(trace_id: str, x_admin_token: Optional[str] = Header(None)):
+    """One retained trace by the id from a response's X-Trace-Id header; requires ADMIN_TOKEN"""
+    _require_admin(x_admin_token)
+    trace = trace_store.get(trace_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail="Trace not found or no longer retained")
+    return trace
+
+@app.post("/admin/invalidate")
+async def invalidate_caches(x_admin_token: Optional[str] = Header(None)):
+    """Drop cached listing data after the Repos collection is re-ingested; requires ADMIN_TOKEN"""
+    _require_admin(x_admin_token)
+    count_cache.invalidate()
+    response_cache.invalidate()
+    logger.info("Listing caches invalidated")
+    return {"invalidated": ["counts", "responses"]}
+
 @app.post("/search", response_model=SearchResponse)
 async def search_repositories(request: SearchRequest):
     """
@@ -120,10 +487,13 @@ async def search_repositories(request: SearchRequest):
     
     The process:
     1. Takes a natural language query from the user
-    2. Uses Gemini AI to convert it to Weaviate Python code
-    3. Executes the generated code against the Weaviate database
+    2. Uses Gemini AI to convert it to a JSON query plan
+    3. Executes the validated plan against the Weaviate database
     4. Returns formatted results as JSON
     
+    If Gemini fails or runs past its share of the SEARCH_BUDGET_MS latency budget, a
+    plain hybrid search on the query is served instead, with degraded=true.
+    
     Examples:
     - "Find popular Python machine learning libraries"
     - "JavaScript frameworks with more than 1000 stars"
@@ -133,26 +503,25 @@ async def search_repositories(request: SearchRequest):
     try:
         logger.info(f"Processing search query: {request.query}")
         
-        # Step 1: Generate Weaviate code using Gemini
+        # Steps 1-2: Plan (plan cache or Gemini) and execute, with independent stages overlapped;
+        # identical queries already in flight share that run instead of starting their own
         try:
-            generated_code = gemini_service.generate_weaviate_code(request.query)
-            logger.info(f"Generated code: {generated_code[:200]}...")
-        except Exception as e:
-            logger.error(f"Gemini service error: {str(e)}")
-            raise HTTPException(
-                status_code=500, 
-                detail=f"Failed to generate search code: {str(e)}"
+            limit = request.limit or 10
+            search_results = await search_flight.do(
+                (normalize_query(request.query) or request.query, limit),
+                lambda: search_pipeline.run(request.query, limit)
             )
-        
-        # Step 2: Execute search using Weaviate
-        try:
-            search_results = weaviate_service.search(request.query, generated_code)
             logger.info(f"Search completed. Found {search_results.get('results_count', 0)} results")
-        except Exception as e:
-            logger.error(f"Weaviate service error: {str(e)}")
+            annotate(
+                query=request.query, plan_source=search_results.get('plan_source'), plan=search_results.get('plan'),
+                results_count=search_results.get('results_count', 0), degraded_reason=search_results.get('degraded_reason')
+            )
+        except SearchStageError as e:
+            logger.error(f"{e.stage} stage error: {str(e)}")
+            detail = "Failed to generate search plan" if e.stage == "gemini" else "Failed to execute search"
             raise HTTPException(
                 status_code=500, 
-                detail=f"Failed to execute search: {str(e)}"
+                detail=f"{detail}: {str(e)}"
             )
         
         # Step 3: Format and return response
@@ -163,7 +532,11 @@ async def search_repositories(request: SearchRequest):
                 results_count=0,
                 results=[],
                 error=search_results.get('error', 'Unknown error occurred'),
-                generated_code=search_results.get('generated_code')
+                plan=search_results.get('plan'),
+                plan_source=search_results.get('plan_source'),
+                degraded=search_results.get('degraded', False),
+                degraded_reason=search_results.get('degraded_reason'),
+                timings=search_results.get('timings')
             )
         
         # Apply limit if specified
@@ -171,16 +544,19 @@ async def search_repositories(request: SearchRequest):
         if request.limit and len(results) > request.limit:
             results = results[:request.limit]
         
-        # Convert to Repository models
-        repositories = [Repository(**repo) for repo in results]
-        
-        return SearchResponse(
-            success=True,
-            query=request.query,
-            results_count=len(repositories),
-            results=repositories,
-            generated_code=search_results.get('generated_code')
-        )
+        # Records encode straight to JSON; SearchResponse only documents the shape
+        return RecordResponse({
+            "success": True,
+            "query": request.query,
+            "results_count": len(results),
+            "results": results,
+            "error": None,
+            "plan": search_results.get('plan'),
+            "plan_source": search_results.get('plan_source'),
+            "degraded": search_results.get('degraded', False),
+            "degraded_reason": search_results.get('degraded_reason'),
+            "timings": search_results.get('timings')
+        })
         
     except HTTPException:
         # Re-raise HTTP exceptions
@@ -192,8 +568,137 @@ async def search_repositories(request: SearchRequest):
             detail=f"Internal server error: {str(e)}"
         )
 
+@app.post("/search/batch", response_model=SearchBatchResponse)
+async def search_batch(request: SearchBatchRequest):
+    """
+    Run many natural language searches in one request, for bulk jobs and internal tools.
+    
+    Duplicate queries (after normalization) run once. All query embeddings are computed in
+    a single batched encode, Gemini plan generation runs with bounded concurrency
+    (SEARCH_BATCH_GEMINI_CONCURRENCY) and Weaviate queries run concurrently
+    (SEARCH_BATCH_CONCURRENCY). `results` holds one /search-shaped entry per input query,
+    in input order; a failed query has success=false and does not fail the batch.
+    """
+    limit = request.limit or 10
+    logger.info(f"Processing batch of {len(request.queries)} search queries")
+    search_results, stats = await search_pipeline.run_many(request.queries, limit)
+    annotate(queries_count=stats['queries'], unique_queries=stats['unique_queries'])
+    
+    entries = []
+    for query, result in zip(request.queries, search_results):
+        results = result.get('results', [])[:limit]
+        entries.append({
+            "success": result.get('success', False),
+            "query": query,
+            "results_count": len(results),
+            "results": results,
+            "error": result.get('error'),
+            "plan": result.get('plan'),
+            "plan_source": result.get('plan_source'),
+            "degraded": result.get('degraded', False),
+            "degraded_reason": result.get('degraded_reason'),
+            "timings": result.get('timings')
+        })
+    logger.info(f"Batch completed: {stats['unique_queries']} unique of {stats['queries']} queries in {stats['total_ms']} ms")
+    return RecordResponse({
+        "success": True,
+        "results": entries,
+        "queries_count": stats['queries'],
+        "unique_queries": stats['unique_queries'],
+        "timings": stats
+    })
+
+# How often /search/stream checks for a disconnected client while waiting on the pipeline
+STREAM_DISCONNECT_POLL_SECONDS = float(os.getenv('STREAM_DISCONNECT_POLL_SECONDS', '0.25'))
+
+def _stream_line(event: str, payload: Dict[str, Any], sse: bool) -> bytes:
+    """One NDJSON line, or one Server-Sent Events message"""
+    if sse:
+        return b"event: " + event.encode() + b"\ndata: " + dumps(payload) + b"\n\n"
+    return dumps({"event": event, **payload}) + b"\n"
+
+@app.post("/search/stream")
+async def stream_search(search: SearchRequest, request: Request):
+    """
+    Same search as /search, streamed as newline-delimited JSON events.
+    
+    Events, in order: `plan` (plan_source and plan, as soon as the plan is known),
+    `query` (the plan was sent to Weaviate), one `result` per repository, then `done`
+    (results_count, degraded, degraded_reason, timings) or `error`. Send `Accept: text/event-stream`
+    to get the same events as Server-Sent Events.
+    
+    If the client disconnects, in-flight Gemini and Weaviate work is cancelled.
+    """
+    sse = "text/event-stream" in request.headers.get("accept", "")
+    limit = search.limit or 10
+    events: asyncio.Queue = asyncio.Queue()
+    logger.info(f"Processing streamed search query: {search.query}")
+    
+    async def produce():
+        try:
+            result = await search_pipeline.run(
+                search.query, limit, on_event=lambda event, payload: events.put_nowait((event, payload))
+            )
+            annotate(
+                query=search.query, plan_source=result.get('plan_source'), plan=result.get('plan'),
+                results_count=result.get('results_count', 0), degraded_reason=result.get('degraded_reason')
+            )
+            events.put_nowait(("result_set", result))
+        except SearchStageError as e:
+            logger.error(f"{e.stage} stage error: {str(e)}")
+            events.put_nowait(("error", {"stage": e.stage, "detail": str(e)}))
+        except Exception as e:
+            logger.error(f"Unexpected error in streamed search: {str(e)}")
+            events.put_nowait(("error", {"stage": "internal", "detail": str(e)}))
+    
+    async def stream():
+        task = asyncio.create_task(produce())
+        try:
+            while True:
+                try:
+                    event, payload = await asyncio.wait_for(events.get(), STREAM_DISCONNECT_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        logger.info("Streamed search client disconnected; cancelling")
+                        return
+                    continue
+                if event == "error":
+                    yield _stream_line(event, payload, sse)
+                    return
+                if event != "result_set":
+                    yield _stream_line(event, payload, sse)
+                    continue
+                if not payload.get('success', False):
+                    yield _stream_line("error", {
+                        "stage": "weaviate", "detail": payload.get('error', 'Unknown error occurred')
+                    }, sse)
+                    return
+                results = payload.get('results', [])[:limit]
+                for index, repository in enumerate(results):
+                    yield _stream_line("result", {"index": index, "repository": repository}, sse)
+                yield _stream_line("done", {
+                    "results_count": len(results),
+                    "plan_source": payload.get('plan_source'),
+                    "degraded": payload.get('degraded', False),
+                    "degraded_reason": payload.get('degraded_reason'),
+                    "timings": payload.get('timings')
+                }, sse)
+                return
+        finally:
+            # Client gone or stream finished: nothing may keep running on its behalf
+            if not task.done():
+                task.cancel()
+    
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream" if sse else "application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.get("/allrepos", response_model=PaginatedResponse)
+@response_cache.cached
 async def get_all_repositories(
+    request: Request,
     page: int = Query(1, ge=1, description="Page number (starts from 1)"),
     limit: int = Query(20, ge=1, le=100, description="Number of items per page (max 100)"),
     sort_by: str = Query("stars", description="Sort by field (stars, forks, updated_at, created_at, name)"),
@@ -214,7 +719,9 @@ async def get_all_repositories(
     is_hacktoberfest: Optional[bool] = Query(None, description="Filter Hacktoberfest repositories"),
     has_good_first_issues: Optional[bool] = Query(None, description="Filter repositories with good first issues"),
     name_contains: Optional[str] = Query(None, description="Filter repositories where name contains this text"),
-    description_contains: Optional[str] = Query(None, description="Filter repositories where description contains this text")
+    description_contains: Optional[str] = Query(None, description="Filter repositories where description contains this text"),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from a previous page's pagination.next_cursor (replaces page)"),
+    count: str = Query("exact", description="Total count mode: exact, estimate (may be stale) or none")
 ):
     """
     Get all repositories with comprehensive filtering, pagination and sorting.
@@ -228,6 +735,13 @@ async def get_all_repositories(
     - `/allrepos?topics=machine-learning,ai&has_wiki=true` - ML repos with wikis
     - `/allrepos?languages=python,javascript&is_underrated=true` - Underrated Python/JS repos
     - `/allrepos?name_contains=framework&min_forks=100` - Framework repos with 100+ forks
+    
+    `page` is fine for the first few pages. For deep paging pass `cursor` from the
+    previous response's `pagination.next_cursor` instead: it resumes after the last
+    returned repository with a range filter, so page 500 costs about the same as page 1.
+    
+    Responses are served from an in-memory cache with a strong ETag; send it back in
+    If-None-Match to get a 304.
     """
     try:
         # Validate parameters
@@ -277,12 +791,8 @@ async def get_all_repositories(
         
         logger.info(f"Fetching repositories: page={page}, limit={limit}, sort_by={sort_by}, sort_order={sort_order}, filters={filters_applied}")
         
-        # Calculate offset
-        offset = (page - 1) * limit
-        
-        # Get collection and import Filter
-        collection = weaviate_service.client.collections.get("Repos")
-        from weaviate.classes.query import Filter, Sort
+        # Import Filter
+        from weaviate.classes.query import Filter
         
         # Build filter conditions
         filter_conditions = []
@@ -341,101 +851,29 @@ async def get_all_repositories(
             for condition in filter_conditions[1:]:
                 combined_filter = combined_filter & condition
         
-        # Get total count (with filters if applied)
-        if combined_filter:
-            total_count_response = collection.aggregate.over_all(
-                filters=combined_filter,
-                total_count=True
-            )
-        else:
-            total_count_response = collection.aggregate.over_all(total_count=True)
-        
-        total_count = total_count_response.total_count
-        
-        # Calculate pagination info
-        total_pages = math.ceil(total_count / limit) if total_count > 0 else 1
-        has_next = page < total_pages
-        has_prev = page > 1
-        
-        # Build sort configuration
-        sort_ascending = sort_order == "asc"
-        sort_config = Sort.by_property(sort_by, ascending=sort_ascending)
-        
-        # Query repositories with filters, pagination and sorting
-        query_params = {
-            'limit': limit,
-            'offset': offset,
-            'sort': sort_config,
-            'return_properties': [
+        repositories, pagination_info, freshness = await _fetch_listing_page(
+            "allrepos", combined_filter, filters_applied, page, limit, sort_by, sort_order, cursor, count,
+            return_properties=[
                 "name", "full_name", "description", "url", "homepage",
                 "language", "languages", "topics", "stars", "forks",
                 "open_issues", "license", "has_issues", "has_wiki",
                 "created_at", "updated_at", "is_underrated", "is_gsoc",
                 "is_hacktoberfest", "has_good_first_issues"
             ]
-        }
-        
-        if combined_filter:
-            query_params['filters'] = combined_filter
-        
-        response = collection.query.fetch_objects(**query_params)
-        
-        # Format results
-        repositories = []
-        for obj in response.objects:
-            props = obj.properties
-            
-            # Format topics and languages as lists
-            topics = []
-            if props.get('topics'):
-                topics = [topic.strip() for topic in props['topics'].split(',') if topic.strip()]
-            
-            languages = []
-            if props.get('languages'):
-                languages = [lang.strip() for lang in props['languages'].split(',') if lang.strip()]
-            
-            repo = Repository(
-                name=props.get('name') or '',
-                full_name=props.get('full_name') or '',
-                description=props.get('description') or '',
-                url=props.get('url') or '',
-                homepage=props.get('homepage') or '',
-                language=props.get('language') or '',
-                languages=languages,
-                topics=topics,
-                stars=props.get('stars') or 0,
-                forks=props.get('forks') or 0,
-                open_issues=props.get('open_issues') or 0,
-                license=props.get('license') or '',
-                has_issues=props.get('has_issues') or False,
-                has_wiki=props.get('has_wiki') or False,
-                created_at=props.get('created_at') or '',
-                updated_at=props.get('updated_at') or ''
-            )
-            repositories.append(repo)
-        
-        # Build pagination info
-        pagination_info = {
-            "current_page": page,
-            "per_page": limit,
-            "total_items": total_count,
-            "total_pages": total_pages,
-            "has_next": has_next,
-            "has_previous": has_prev,
-            "next_page": page + 1 if has_next else None,
-            "previous_page": page - 1 if has_prev else None,
-            "sort_by": sort_by,
-            "sort_order": sort_order
-        }
+        )
+        total_pages = pagination_info["total_pages"]
+        total_count = pagination_info["total_items"]
         
         logger.info(f"Successfully retrieved {len(repositories)} repositories (page {page} of {total_pages}, {total_count} total with filters)")
         
-        return PaginatedResponse(
-            success=True,
-            data=repositories,
-            pagination=pagination_info,
-            filters_applied=filters_applied if filters_applied else None
-        )
+        return RecordResponse({
+            "success": True,
+            "data": repositories,
+            "pagination": pagination_info,
+            "filters_applied": filters_applied if filters_applied else None,
+            "freshness": freshness,
+            "error": None
+        })
         
     except HTTPException:
         # Re-raise HTTP exceptions
@@ -451,11 +889,15 @@ async def get_all_repositories(
         )
 
 @app.get("/hiddengem", response_model=PaginatedResponse)
+@response_cache.cached
 async def get_hidden_gems(
+    request: Request,
     page: int = 1,
     limit: int = 20,
     sort_by: str = "stars",
-    sort_order: str = "desc"
+    sort_order: str = "desc",
+    cursor: Optional[str] = None,
+    count: str = "exact"
 ):
     """
     Get hidden gem repositories - underrated repositories that deserve more attention.
@@ -465,6 +907,8 @@ async def get_hidden_gems(
     - limit: Number of items per page (max 100)
     - sort_by: Sort by field (stars, forks, updated_at, created_at, name)
     - sort_order: Sort order (asc or desc)
+    - cursor: Opaque cursor from a previous page's pagination.next_cursor (replaces page)
+    - count: Total count mode (exact, estimate, none)
     
     Returns paginated list of underrated repositories from Weaviate.
     """
@@ -481,38 +925,12 @@ async def get_hidden_gems(
         
         logger.info(f"Fetching hidden gems: page={page}, limit={limit}, sort_by={sort_by}, sort_order={sort_order}")
         
-        # Calculate offset
-        offset = (page - 1) * limit
-        
-        # Get collection and import Filter
-        collection = weaviate_service.client.collections.get("Repos")
-        from weaviate.classes.query import Filter, Sort
-        
         # Create filter for underrated repositories
+        from weaviate.classes.query import Filter
         underrated_filter = Filter.by_property("is_underrated").equal(True)
         
-        # First, get total count of underrated repos
-        total_count_response = collection.aggregate.over_all(
-            filters=underrated_filter,
-            total_count=True
-        )
-        total_count = total_count_response.total_count
-        
-        # Calculate pagination info
-        total_pages = math.ceil(total_count / limit) if total_count > 0 else 1
-        has_next = page < total_pages
-        has_prev = page > 1
-        
-        # Build sort configuration
-        sort_ascending = sort_order == "asc"
-        sort_config = Sort.by_property(sort_by, ascending=sort_ascending)
-        
-        # Query underrated repositories with pagination and sorting
-        response = collection.query.fetch_objects(
-            filters=underrated_filter,
-            limit=limit,
-            offset=offset,
-            sort=sort_config,
+        repositories, pagination_info, freshness = await _fetch_listing_page(
+            "hiddengem", underrated_filter, {"is_underrated": True}, page, limit, sort_by, sort_order, cursor, count,
             return_properties=[
                 "name", "full_name", "description", "url", "homepage",
                 "language", "languages", "topics", "stars", "forks",
@@ -520,62 +938,18 @@ async def get_hidden_gems(
                 "created_at", "updated_at", "is_underrated"
             ]
         )
-        
-        # Format results
-        repositories = []
-        for obj in response.objects:
-            props = obj.properties
-            
-            # Format topics and languages as lists
-            topics = []
-            if props.get('topics'):
-                topics = [topic.strip() for topic in props['topics'].split(',') if topic.strip()]
-            
-            languages = []
-            if props.get('languages'):
-                languages = [lang.strip() for lang in props['languages'].split(',') if lang.strip()]
-            
-            repo = Repository(
-                name=props.get('name') or '',
-                full_name=props.get('full_name') or '',
-                description=props.get('description') or '',
-                url=props.get('url') or '',
-                homepage=props.get('homepage') or '',
-                language=props.get('language') or '',
-                languages=languages,
-                topics=topics,
-                stars=props.get('stars') or 0,
-                forks=props.get('forks') or 0,
-                open_issues=props.get('open_issues') or 0,
-                license=props.get('license') or '',
-                has_issues=props.get('has_issues') or False,
-                has_wiki=props.get('has_wiki') or False,
-                created_at=props.get('created_at') or '',
-                updated_at=props.get('updated_at') or ''
-            )
-            repositories.append(repo)
-        
-        # Build pagination info
-        pagination_info = {
-            "current_page": page,
-            "per_page": limit,
-            "total_items": total_count,
-            "total_pages": total_pages,
-            "has_next": has_next,
-            "has_previous": has_prev,
-            "next_page": page + 1 if has_next else None,
-            "previous_page": page - 1 if has_prev else None,
-            "sort_by": sort_by,
-            "sort_order": sort_order
-        }
+        total_pages = pagination_info["total_pages"]
         
         logger.info(f"Successfully retrieved {len(repositories)} hidden gems (page {page} of {total_pages})")
         
-        return PaginatedResponse(
-            success=True,
-            data=repositories,
-            pagination=pagination_info
-        )
+        return RecordResponse({
+            "success": True,
+            "data": repositories,
+            "pagination": pagination_info,
+            "filters_applied": None,
+            "freshness": freshness,
+            "error": None
+        })
         
     except HTTPException:
         # Re-raise HTTP exceptions
@@ -589,18 +963,10 @@ async def get_hidden_gems(
             error=f"Failed to fetch hidden gems: {str(e)}"
         )
 
-@app.on_event("shutdown")
-async def shutdown_event():
-    """Clean up resources on shutdown"""
-    try:
-        weaviate_service.close()
-        logger.info("Application shutdown completed")
-    except Exception as e:
-        logger.error(f"Error during shutdown: {str(e)}")
-
 # Additional utility endpoints
 @app.get("/example-queries")
-async def get_example_queries():
+@response_cache.cached
+async def get_example_queries(request: Request):
     """Get example queries that work well with the system"""
     return {
         "examples": [
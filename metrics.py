@@ -0,0 +1,265 @@
+import bisect
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+
+# Seconds; spans a cached listing (sub-millisecond) to a slow Gemini plan
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelValues = Tuple[str, ...]
+
+# (name, type, help, [(label dict, value)]) produced at scrape time
+Sample = Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    """
+    A metric family with fixed label names.
+
+    Children are created once per label combination under a lock; updating
+    a child afterwards takes no lock. Updates come from the event loop
+    thread, so the GIL is enough to keep them consistent, and a rare lost
+    increment from a worker thread is acceptable for monitoring.
+    """
+
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._children: Dict[LabelValues, Any] = {}
+        self._lock = threading.Lock()
+
+    def _new_child(self) -> Any:
+        raise NotImplementedError
+
+    def labels(self, *values: str) -> Any:
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+
+class Counter(_Metric):
+    """Monotonic counter"""
+
+    kind = "counter"
+
+    def _new_child(self) -> _CounterChild:
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+    def render(self) -> List[str]:
+        return [f"{self.name}{_labels(self.label_names, values)} {child.value}" for values, child in self._children.items()]
+
+
+class _GaugeChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+
+class Gauge(Counter):
+    """Value that goes up and down, e.g. requests in flight"""
+
+    kind = "gauge"
+
+    def _new_child(self) -> _GaugeChild:
+        return _GaugeChild()
+
+    def dec(self, amount: float = 1.0):
+        self.labels().dec(amount)
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # last slot is +Inf
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram in seconds"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def render(self) -> List[str]:
+        lines = []
+        for values, child in self._children.items():
+            counts = list(child.counts)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, values, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, values)} {child.sum}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, values)} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Metric families plus collectors that read existing stats() at scrape time"""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], Iterable[Sample]]] = []
+
+    def add(self, metric: _Metric) -> Any:
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector: Callable[[], Iterable[Sample]]):
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            for name, kind, help_text, samples in collector():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_labels(list(labels), list(labels.values()))} {value}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.add(Counter(
+    "findmyrepo_http_requests_total", "HTTP requests by route template, method and status", ("route", "method", "status")
+))
+HTTP_LATENCY = REGISTRY.add(Histogram(
+    "findmyrepo_http_request_duration_seconds", "HTTP request latency by route template", ("route", "method")
+))
+HTTP_IN_FLIGHT = REGISTRY.add(Gauge("findmyrepo_http_requests_in_flight", "HTTP requests being served"))
+STAGE_LATENCY = REGISTRY.add(Histogram(
+    "findmyrepo_stage_duration_seconds",
+    "Latency of request stages: gemini, embedding, weaviate, count, fetch, serialization, ...", ("stage",)
+))
+SEARCHES = REGISTRY.add(Counter(
+    "findmyrepo_searches_total", "Executed searches by plan source and degraded flag", ("plan_source", "degraded")
+))
+GEMINI_IN_FLIGHT = REGISTRY.add(Gauge("findmyrepo_gemini_requests_in_flight", "Gemini requests awaiting a response"))
+GEMINI_TOKENS = REGISTRY.add(Counter(
+    "findmyrepo_gemini_tokens_total", "Gemini tokens used, by model and kind (prompt, completion)", ("model", "kind")
+))
+
+
+def observe_stage(stage: str, seconds: float):
+    """Record one stage duration if metrics are enabled"""
+    if METRICS_ENABLED:
+        STAGE_LATENCY.labels(stage).observe(seconds)
+
+
+def stats_collector(name: str, help_text: str, sources: Callable[[], Dict[str, Optional[Dict[str, Any]]]], field: str,
+                    kind: str = "gauge") -> Callable[[], Iterable[Sample]]:
+    """Expose one numeric field of several components' stats() dicts as a labelled metric"""
+
+    def collect() -> Iterable[Sample]:
+        samples = []
+        for component, stats in sources().items():
+            if stats is not None and isinstance(stats.get(field), (int, float)):
+                samples.append(({"component": component}, float(stats[field])))
+        return [(name, kind, help_text, samples)]
+
+    return collect
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware counting requests and their latency per route template.
+
+    Routes are labelled by their path template (/allrepos, not the query
+    string), and unmatched paths share one label, so cardinality stays fixed.
+    """
+
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = [500]
+
+        async def send_with_status(message: Dict[str, Any]):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            method = scope["method"]
+            HTTP_LATENCY.labels(path, method).observe(time.perf_counter() - start)
+            HTTP_REQUESTS.labels(path, method, str(status[0])).inc()
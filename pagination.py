@@ -0,0 +1,96 @@
+import base64
+import hashlib
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from weaviate.classes.query import Filter, Sort
+from weaviate.collections.classes.filters import _Filters
+
+# Sort fields with a keyset cursor; others fall back to an opaque offset cursor
+KEYSET_SORT_FIELDS = ("stars", "forks")
+
+
+class CursorError(ValueError):
+    """The cursor is malformed or was issued for a different listing"""
+
+
+def filter_signature(listing: str, filters_applied: Optional[Dict[str, Any]]) -> str:
+    """Short canonical hash of a listing and its filters, so a cursor can't be replayed against another listing"""
+    canonical = json.dumps([listing, filters_applied or {}], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()[:16]
+
+
+def encode_cursor(data: Dict[str, Any]) -> str:
+    """Opaque, URL-safe cursor text"""
+    raw = json.dumps(data, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_by: str, sort_order: str, signature: str) -> Dict[str, Any]:
+    """Decode a cursor and check it belongs to this sort order and filter set"""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        raise CursorError("Malformed cursor")
+    if not isinstance(data, dict):
+        raise CursorError("Malformed cursor")
+    if data.get("s") != sort_by or data.get("o") != sort_order or data.get("f") != signature:
+        raise CursorError("Cursor does not match the requested sort or filters")
+    return data
+
+
+def page_query(
+    sort_by: str,
+    sort_order: str,
+    cursor: Optional[Dict[str, Any]],
+    offset: int,
+) -> Tuple[Optional[_Filters], int, Any]:
+    """
+    Translate a decoded cursor into (range filter, offset, sort).
+
+    Keyset cursors sort on (sort_by, uuid) and carry the last sort value plus
+    the number of rows already returned with that value. The next page is
+    "sort_by <= value" (or ">=" ascending) skipping only those tied rows, so
+    the offset is bounded by the length of a tie run instead of the page depth.
+    """
+    ascending = sort_order == "asc"
+    sort = Sort.by_property(sort_by, ascending=ascending)
+    if sort_by in KEYSET_SORT_FIELDS:
+        sort = sort.by_id(ascending=True)
+    if cursor is None:
+        return None, offset, sort
+    if "n" in cursor:
+        return None, int(cursor["n"]), sort
+    prop = Filter.by_property(sort_by)
+    range_filter = prop.greater_or_equal(cursor["v"]) if ascending else prop.less_or_equal(cursor["v"])
+    return range_filter, int(cursor["k"]), sort
+
+
+def next_cursor(
+    sort_by: str,
+    sort_order: str,
+    signature: str,
+    objects: List[Any],
+    limit: int,
+    cursor: Optional[Dict[str, Any]],
+    offset: int,
+) -> Optional[str]:
+    """Cursor for the page after this one, or None when this page was the last"""
+    if len(objects) < limit:
+        return None
+    base = {"s": sort_by, "o": sort_order, "f": signature}
+    if sort_by not in KEYSET_SORT_FIELDS:
+        start = int(cursor["n"]) if cursor is not None else offset
+        return encode_cursor({**base, "n": start + len(objects)})
+
+    last = objects[-1]
+    value = last.properties.get(sort_by)
+    tied = 0
+    for obj in reversed(objects):
+        if obj.properties.get(sort_by) != value:
+            break
+        tied += 1
+    if tied == len(objects) and cursor is not None and "v" in cursor and cursor["v"] == value:
+        # The whole page sits inside one tie run that started on an earlier page
+        tied += int(cursor["k"])
+    return encode_cursor({**base, "v": value, "u": str(last.uuid), "k": tied})
@@ -0,0 +1,285 @@
+import logging
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# The working directory may not be writable (the Docker image runs as a non-root user in a root-owned /app)
+DEFAULT_PATH = os.path.join(tempfile.gettempdir(), 'findmyrepo_plan_cache.sqlite3')
+
+_TOKEN_RE = re.compile(r"[a-z0-9+#./-]+")
+_NUMBER_RE = re.compile(r"\d+(?:\.\d+)?k?")
+_COMPARISON_RE = re.compile(
+    r"\b(at least|at most|more|over|above|greater|higher|min|minimum|after|since|newer"
+    r"|less|fewer|under|below|lower|smaller|max|maximum|before|older)\b"
+)
+_LOWER_BOUND_WORDS = {"at least", "more", "over", "above", "greater", "higher", "min", "minimum", "after", "since", "newer"}
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase a query and collapse punctuation/whitespace so trivial variants share a key"""
+    return " ".join(_TOKEN_RE.findall(query.lower())).strip("./-")
+
+
+def _numbers(normalized_query: str) -> Tuple[str, ...]:
+    """Numeric literals in a query; paraphrases must agree on these to share a plan"""
+    return tuple(sorted(_NUMBER_RE.findall(normalized_query)))
+
+
+def _comparisons(normalized_query: str) -> Tuple[str, ...]:
+    """
+    Direction of each comparison in a query ("min" for more/over/at least/...,
+    "max" for fewer/under/at most/...); "more than 1000 stars" and "fewer than
+    1000 stars" share their numbers but must not share a plan.
+    """
+    return tuple(sorted(
+        "min" if word in _LOWER_BOUND_WORDS else "max" for word in _COMPARISON_RE.findall(normalized_query)
+    ))
+
+
+class PlanCache:
+    """
+    Two-tier cache for generated search plans.
+
+    The exact tier is keyed on the normalized query text. The semantic tier
+    compares the query embedding against cached entries and reuses a plan when
+    the cosine similarity reaches the configured threshold and both queries
+    have the same numbers and comparison directions. Entries live in an
+    in-memory LRU with a TTL, backed by a SQLite file (PLAN_CACHE_PATH, in the
+    temp directory by default) that every uvicorn worker shares and that
+    survives restarts. If the file can't be opened the cache is memory-only.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        ttl_seconds: Optional[float] = None,
+        max_entries: Optional[int] = None,
+        max_persisted: Optional[int] = None,
+        similarity_threshold: Optional[float] = None,
+    ):
+        self.path = path if path is not None else os.getenv('PLAN_CACHE_PATH', DEFAULT_PATH)
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else float(os.getenv('PLAN_CACHE_TTL_SECONDS', '86400'))
+        self.max_entries = max_entries if max_entries is not None else int(os.getenv('PLAN_CACHE_MAX_ENTRIES', '2048'))
+        self.max_persisted = max_persisted if max_persisted is not None else int(os.getenv('PLAN_CACHE_MAX_PERSISTED', '50000'))
+        self.similarity_threshold = (
+            similarity_threshold if similarity_threshold is not None
+            else float(os.getenv('PLAN_CACHE_SIMILARITY', '0.92'))
+        )
+
+        # normalized query -> (plan, unit vector or None, stored_at)
+        self._entries: "OrderedDict[str, Tuple[str, Optional[np.ndarray], float]]" = OrderedDict()
+        self._matrix: Optional[np.ndarray] = None
+        self._matrix_keys: List[str] = []
+        self._lock = threading.Lock()
+        self._last_synced_id = 0
+
+        self._counters = {
+            'exact_memory_hits': 0,
+            'exact_sqlite_hits': 0,
+            'semantic_hits': 0,
+            'misses': 0,
+            'writes': 0,
+            'evictions': 0,
+        }
+        self._last_miss_similarity: Optional[float] = None
+
+        self._conn: Optional[sqlite3.Connection] = None
+        if self.path:
+            try:
+                self._conn = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False, isolation_level=None)
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute("PRAGMA synchronous=NORMAL")
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS plans ("
+                    " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                    " query TEXT NOT NULL UNIQUE,"
+                    " plan TEXT NOT NULL,"
+                    " embedding BLOB,"
+                    " created_at REAL NOT NULL)"
+                )
+                self._sync_from_sqlite()
+            except sqlite3.Error as e:
+                # A cache must never keep the app from starting; plans stay in memory only
+                logger.warning(f"Plan cache cannot use {self.path} ({str(e)}); caching in memory only")
+                self._disable_sqlite()
+
+    # ---- memory tier -------------------------------------------------------
+
+    def _remember(self, key: str, plan: str, vector: Optional[np.ndarray], stored_at: float):
+        if key in self._entries:
+            self._entries.move_to_end(key)
+        self._entries[key] = (plan, vector, stored_at)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._counters['evictions'] += 1
+        self._matrix = None
+
+    def _expired(self, stored_at: float, now: float) -> bool:
+        return self.ttl_seconds > 0 and now - stored_at > self.ttl_seconds
+
+    def _semantic_index(self) -> Tuple[Optional[np.ndarray], List[str]]:
+        if self._matrix is None:
+            keys = [k for k, (_, vec, _) in self._entries.items() if vec is not None]
+            self._matrix_keys = keys
+            self._matrix = np.stack([self._entries[k][1] for k in keys]) if keys else None
+        return self._matrix, self._matrix_keys
+
+    # ---- sqlite tier -------------------------------------------------------
+
+    def _disable_sqlite(self):
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except sqlite3.Error:
+                pass
+            self._conn = None
+
+    def _sync_from_sqlite(self):
+        """Pull rows written by other workers since the last sync into the memory tier"""
+        if self._conn is None:
+            return
+        cutoff = time.time() - self.ttl_seconds if self.ttl_seconds > 0 else 0
+        rows = self._conn.execute(
+            "SELECT id, query, plan, embedding, created_at FROM plans"
+            " WHERE id > ? AND created_at >= ? ORDER BY id DESC LIMIT ?",
+            (self._last_synced_id, cutoff, self.max_entries),
+        ).fetchall()
+        if rows:
+            self._last_synced_id = max(self._last_synced_id, rows[0][0])
+        for _, key, plan, blob, created_at in reversed(rows):
+            vector = np.frombuffer(blob, dtype=np.float32) if blob else None
+            self._remember(key, plan, vector, created_at)
+
+    def _lookup_sqlite(self, key: str, now: float) -> Optional[Tuple[str, Optional[np.ndarray], float]]:
+        if self._conn is None:
+            return None
+        row = self._conn.execute(
+            "SELECT plan, embedding, created_at FROM plans WHERE query = ?", (key,)
+        ).fetchone()
+        if row is None or self._expired(row[2], now):
+            return None
+        vector = np.frombuffer(row[1], dtype=np.float32) if row[1] else None
+        return row[0], vector, row[2]
+
+    # ---- public API --------------------------------------------------------
+
+    def lookup_exact(self, query: str) -> Optional[str]:
+        """Exact-tier lookup on the normalized query; misses are not counted"""
+        key = normalize_query(query)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and not self._expired(entry[2], now):
+                self._entries.move_to_end(key)
+                self._counters['exact_memory_hits'] += 1
+                return entry[0]
+
+            entry = self._lookup_sqlite(key, now)
+            if entry is not None:
+                self._remember(key, *entry)
+                self._counters['exact_sqlite_hits'] += 1
+                return entry[0]
+        return None
+
+    def lookup_semantic(self, query: str, query_vector: Optional[np.ndarray]) -> Optional[str]:
+        """Semantic-tier lookup; counts a miss when nothing is close enough"""
+        key = normalize_query(query)
+        now = time.time()
+        with self._lock:
+            if query_vector is not None:
+                self._sync_from_sqlite()
+                plan = self._semantic_lookup(key, query_vector, now)
+                if plan is not None:
+                    self._counters['semantic_hits'] += 1
+                    return plan
+            self._counters['misses'] += 1
+            return None
+
+    def get(self, query: str, query_vector: Optional[np.ndarray] = None) -> Optional[str]:
+        """Return a cached plan for the query, trying the exact tier and then the semantic tier"""
+        plan = self.lookup_exact(query)
+        if plan is None:
+            plan = self.lookup_semantic(query, query_vector)
+        return plan
+
+    def _semantic_lookup(self, key: str, query_vector: np.ndarray, now: float) -> Optional[str]:
+        matrix, keys = self._semantic_index()
+        if matrix is None:
+            return None
+        vector = np.asarray(query_vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            return None
+        similarities = matrix @ (vector / norm)
+        numbers, comparisons = _numbers(key), _comparisons(key)
+        for idx in np.argsort(-similarities)[:5]:
+            similarity = float(similarities[idx])
+            if similarity < self.similarity_threshold:
+                self._last_miss_similarity = similarity
+                return None
+            candidate = keys[idx]
+            plan, _, stored_at = self._entries[candidate]
+            if self._expired(stored_at, now) or _numbers(candidate) != numbers or _comparisons(candidate) != comparisons:
+                continue
+            self._entries.move_to_end(candidate)
+            return plan
+        return None
+
+    def put(self, query: str, query_vector: Optional[np.ndarray], plan: str):
+        """Store a plan in both tiers"""
+        key = normalize_query(query)
+        now = time.time()
+        vector = None
+        if query_vector is not None:
+            vector = np.asarray(query_vector, dtype=np.float32)
+            norm = np.linalg.norm(vector)
+            vector = vector / norm if norm else None
+        with self._lock:
+            self._remember(key, plan, vector, now)
+            self._counters['writes'] += 1
+            if self._conn is not None:
+                try:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO plans (query, plan, embedding, created_at) VALUES (?, ?, ?, ?)",
+                        (key, plan, vector.tobytes() if vector is not None else None, now),
+                    )
+                    self._conn.execute(
+                        "DELETE FROM plans WHERE id <= (SELECT MAX(id) FROM plans) - ?", (self.max_persisted,)
+                    )
+                except sqlite3.Error as e:
+                    # e.g. a busy or full disk; the plan is still cached in memory
+                    logger.warning(f"Plan cache write to {self.path} failed: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and sizing, for tuning the similarity threshold"""
+        with self._lock:
+            counters = dict(self._counters)
+            entries = len(self._entries)
+        hits = counters['exact_memory_hits'] + counters['exact_sqlite_hits'] + counters['semantic_hits']
+        lookups = hits + counters['misses']
+        return {
+            **counters,
+            'hit_ratio': round(hits / lookups, 4) if lookups else 0.0,
+            'entries': entries,
+            'similarity_threshold': self.similarity_threshold,
+            'last_miss_similarity': self._last_miss_similarity,
+            'persistent': self._conn is not None,
+        }
+
+    def close(self):
+        """Close the SQLite connection"""
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
@@ -0,0 +1,265 @@
+import os
+import re
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from plan_cache import normalize_query
+from query_plan import QueryPlan
+
+load_dotenv()
+
+# Language lexicon: query spelling -> value stored in the "languages" property
+LANGUAGES: Dict[str, str] = {
+    "python": "python", "py": "python",
+    "javascript": "javascript", "js": "javascript", "node": "javascript", "nodejs": "javascript", "node.js": "javascript",
+    "typescript": "typescript", "ts": "typescript",
+    "go": "go", "golang": "go",
+    "rust": "rust",
+    "java": "java",
+    "kotlin": "kotlin",
+    "swift": "swift",
+    "c": "c",
+    "c++": "c++", "cpp": "c++",
+    "c#": "c#", "csharp": "c#",
+    "ruby": "ruby",
+    "php": "php",
+    "scala": "scala",
+    "haskell": "haskell",
+    "elixir": "elixir",
+    "dart": "dart",
+    "lua": "lua",
+    "julia": "julia",
+    "zig": "zig",
+    "html": "html",
+    "css": "css",
+    "shell": "shell", "bash": "shell",
+}
+
+# Topic synonym tables, matching the "Common topic patterns" in the Gemini prompt
+TOPIC_SYNONYMS: Dict[str, List[str]] = {
+    "ci-cd": ["ci-cd", "ci", "cd", "continuous-integration", "continuous-deployment", "continuous-delivery"],
+    "pipelines": ["pipeline", "pipelines", "workflow", "automation"],
+    "docker": ["docker", "container", "containerization"],
+    "kubernetes": ["kubernetes", "k8s", "orchestration"],
+    "machine-learning": ["machine-learning", "ml", "ai", "deep-learning"],
+    "data-science": ["data-science", "data-analysis", "data-visualization", "analytics"],
+    "devops": ["devops", "infrastructure", "automation", "deployment"],
+    "web": ["web", "webapp"],
+    "framework": ["framework"],
+    "api": ["api", "rest", "graphql"],
+    "cli": ["cli", "command-line", "terminal"],
+    "database": ["database", "db", "sql"],
+    "game": ["game", "gamedev", "game-engine"],
+    "security": ["security"],
+    "testing": ["testing", "test"],
+}
+
+TOPIC_PHRASES: Dict[str, str] = {
+    "ci/cd": "ci-cd", "ci-cd": "ci-cd", "cicd": "ci-cd", "continuous integration": "ci-cd",
+    "continuous deployment": "ci-cd", "continuous delivery": "ci-cd",
+    "pipeline": "pipelines", "pipelines": "pipelines", "workflow": "pipelines", "workflows": "pipelines",
+    "automation": "pipelines",
+    "docker": "docker", "container": "docker", "containers": "docker", "containerization": "docker",
+    "kubernetes": "kubernetes", "k8s": "kubernetes", "orchestration": "kubernetes",
+    "machine learning": "machine-learning", "machine-learning": "machine-learning", "ml": "machine-learning",
+    "ai": "machine-learning", "deep learning": "machine-learning", "artificial intelligence": "machine-learning",
+    "data science": "data-science", "data analysis": "data-science", "data visualization": "data-science",
+    "analytics": "data-science",
+    "devops": "devops", "infrastructure": "devops",
+    "web": "web", "webapp": "web", "web app": "web", "web apps": "web",
+    "framework": "framework", "frameworks": "framework",
+    "api": "api", "apis": "api", "rest api": "api", "graphql": "api",
+    "cli": "cli", "clis": "cli", "command line": "cli", "command-line": "cli", "terminal": "cli",
+    "database": "database", "databases": "database",
+    "game": "game", "games": "game", "game engine": "game", "game engines": "game", "gamedev": "game",
+    "security": "security",
+    "testing": "testing",
+}
+
+# Developer roles from the prompt: default languages plus topics
+ROLES: Dict[str, Tuple[List[str], List[str]]] = {
+    "frontend": (["javascript", "typescript", "html", "css"],
+                 ["frontend", "web", "ui", "react", "vue", "angular", "svelte"]),
+    "backend": (["python", "java", "go", "rust", "nodejs"],
+                ["backend", "api", "server", "database", "microservices"]),
+}
+
+ROLE_PHRASES: Dict[str, str] = {
+    "frontend": "frontend", "front-end": "frontend", "front end": "frontend",
+    "backend": "backend", "back-end": "backend", "back end": "backend",
+}
+
+# Boolean flags: phrase -> (property, value)
+FLAG_PHRASES: Dict[str, Tuple[str, bool]] = {
+    "good first issues": ("has_good_first_issues", True),
+    "good first issue": ("has_good_first_issues", True),
+    "beginner friendly": ("has_good_first_issues", True),
+    "beginner-friendly": ("has_good_first_issues", True),
+    "for beginners": ("has_good_first_issues", True),
+    "hacktoberfest": ("is_hacktoberfest", True),
+    "gsoc": ("is_gsoc", True),
+    "google summer of code": ("is_gsoc", True),
+    "underrated": ("is_underrated", True),
+    "hidden gems": ("is_underrated", True),
+    "hidden gem": ("is_underrated", True),
+    "good documentation": ("has_wiki", True),
+    "well documented": ("has_wiki", True),
+    "wiki": ("has_wiki", True),
+}
+
+OPEN_SOURCE_PHRASES = ("open source only", "only open source", "open source repos only", "legitimate", "legit")
+
+FILLER = frozenset("""
+    show me find search get list give some any good great cool awesome useful best top
+    repos repo repositories repository projects project libraries library libs lib tools tool
+    packages package software written in with for and or of the a an that which are is on about
+    using based i im m s re ve ll am developer developers dev devs engineer interested looking want need
+    suggest recommend please open source only related to stuff things having has more
+""".split())
+
+_NUMBER = r"(\d+(?:\.\d+)?)(k|m)?\+?"
+_THRESHOLD_RES = [
+    (re.compile(rf"(?:more than|greater than|over|above) {_NUMBER} (stars?|forks?)"), "greater_than"),
+    (re.compile(rf"(?:at least|minimum|min) {_NUMBER} (stars?|forks?)"), "greater_or_equal"),
+    (re.compile(rf"(?:less than|fewer than|under|below) {_NUMBER} (stars?|forks?)"), "less_than"),
+    (re.compile(rf"(?:at most|maximum|max) {_NUMBER} (stars?|forks?)"), "less_or_equal"),
+    (re.compile(rf"{_NUMBER} (stars?|forks?)"), "greater_or_equal"),
+]
+
+OPEN_SOURCE_FILTERS = [
+    {"property": "stars", "op": "greater_or_equal", "value": 10},
+    {"property": "forks", "op": "greater_or_equal", "value": 3},
+    {"property": "has_issues", "op": "equal", "value": True},
+]
+
+
+def _phrase_re(phrase: str) -> "re.Pattern":
+    return re.compile(rf"(?<![\w+#.-]){re.escape(phrase)}(?![\w+#-])")
+
+
+def _by_length(table: Dict[str, Any]) -> List[Tuple["re.Pattern", Any]]:
+    return [(_phrase_re(phrase), value) for phrase, value in sorted(table.items(), key=lambda kv: -len(kv[0]))]
+
+
+class RuleBasedParser:
+    """
+    Deterministic parser for simple searches ("python repos with more than
+    1000 stars", "rust cli tools") that produces the same filters as the
+    Gemini prompt's examples. Queries it cannot fully account for are
+    declined so the caller falls back to Gemini.
+    """
+
+    def __init__(self, min_confidence: Optional[float] = None):
+        self.min_confidence = (
+            min_confidence if min_confidence is not None
+            else float(os.getenv('QUERY_PARSER_MIN_CONFIDENCE', '1.0'))
+        )
+        self._flags = _by_length(FLAG_PHRASES)
+        self._open_source = [_phrase_re(p) for p in OPEN_SOURCE_PHRASES]
+        self._roles = _by_length(ROLE_PHRASES)
+        self._topics = _by_length(TOPIC_PHRASES)
+        self._languages = _by_length(LANGUAGES)
+        self._lock = threading.Lock()
+        self.parsed = 0
+        self.declined = 0
+
+    def _consume(self, text: str, pattern: "re.Pattern") -> Tuple[str, bool]:
+        text, count = pattern.subn(" ", text)
+        return text, count > 0
+
+    def parse_with_confidence(self, query: str) -> Tuple[Optional[QueryPlan], float]:
+        """Parse a query into a plan, returning the plan (or None) and the fraction of words understood"""
+        text = f" {normalize_query(query)} "
+        content_words = [w for w in text.split() if w not in FILLER]
+        conditions: List[Dict[str, Any]] = []
+
+        open_source = False
+        for pattern in self._open_source:
+            text, found = self._consume(text, pattern)
+            open_source = open_source or found
+
+        thresholds = []
+        for pattern, op in _THRESHOLD_RES:
+            for match in pattern.finditer(text):
+                number, suffix, field = match.groups()
+                value = float(number) * {"k": 1000, "m": 1000000}.get(suffix, 1)
+                prop = "stars" if field.startswith("star") else "forks"
+                thresholds.append({"property": prop, "op": op, "value": int(value)})
+            text = pattern.sub(" ", text)
+
+        for pattern, (prop, value) in self._flags:
+            text, found = self._consume(text, pattern)
+            if found and not any(c["property"] == prop for c in conditions):
+                conditions.append({"property": prop, "op": "equal", "value": value})
+
+        roles = []
+        for pattern, role in self._roles:
+            text, found = self._consume(text, pattern)
+            if found and role not in roles:
+                roles.append(role)
+
+        topic_groups = []
+        for pattern, group in self._topics:
+            text, found = self._consume(text, pattern)
+            if found and group not in topic_groups:
+                topic_groups.append(group)
+
+        languages = []
+        for pattern, language in self._languages:
+            text, found = self._consume(text, pattern)
+            if found and language not in languages:
+                languages.append(language)
+
+        popular = _phrase_re("popular")
+        text, wants_popular = self._consume(text, popular)
+
+        leftover = [w for w in text.split() if w not in FILLER]
+        confidence = 1.0 - (len(leftover) / len(content_words)) if content_words else 0.0
+
+        topics: List[str] = []
+        for role in roles:
+            role_languages, role_topics = ROLES[role]
+            if not languages:
+                languages = list(role_languages)
+            topics.extend(role_topics)
+        for group in topic_groups:
+            topics.extend(TOPIC_SYNONYMS[group])
+        topics = list(dict.fromkeys(topics))
+
+        if languages:
+            conditions.insert(0, {"property": "languages", "op": "contains_any", "value": languages})
+        if topics:
+            conditions.insert(1 if languages else 0, {"property": "topics", "op": "contains_any", "value": topics})
+        conditions.extend(thresholds)
+        if wants_popular and not any(c["property"] == "stars" for c in thresholds):
+            conditions.append({"property": "stars", "op": "greater_or_equal", "value": 500})
+        if open_source:
+            conditions.extend(c for c in OPEN_SOURCE_FILTERS if c not in conditions)
+
+        if not conditions or confidence < self.min_confidence:
+            return None, confidence
+
+        filters = conditions[0] if len(conditions) == 1 else {"and": conditions}
+        return QueryPlan.model_validate({"mode": "near_vector", "limit": 20, "filters": filters}), confidence
+
+    def parse(self, query: str) -> Optional[QueryPlan]:
+        """Return a plan when the query is parsed with high confidence, else None"""
+        plan, _ = self.parse_with_confidence(query)
+        with self._lock:
+            if plan is None:
+                self.declined += 1
+            else:
+                self.parsed += 1
+        return plan
+
+    def stats(self) -> Dict[str, Any]:
+        """Parsed/declined counters"""
+        total = self.parsed + self.declined
+        return {
+            'parsed': self.parsed,
+            'declined': self.declined,
+            'parse_ratio': round(self.parsed / total, 4) if total else 0.0,
+            'min_confidence': self.min_confidence,
+        }
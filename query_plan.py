@@ -0,0 +1,197 @@
+import hashlib
+import json
+from typing import Any, Dict, List, Literal, Optional, Union
+
+from pydantic import BaseModel, ConfigDict, Field, model_validator
+
+# Schema of the "Repos" collection: property name -> Weaviate data type
+REPO_PROPERTIES: Dict[str, str] = {
+    "repo_id": "INT",
+    "name": "TEXT",
+    "full_name": "TEXT",
+    "owner": "TEXT",
+    "url": "TEXT",
+    "homepage": "TEXT",
+    "description": "TEXT",
+    "readme": "TEXT",
+    "language": "TEXT",
+    "languages": "TEXT",
+    "topics": "TEXT",
+    "stars": "INT",
+    "forks": "INT",
+    "open_issues": "INT",
+    "created_at": "TEXT",
+    "updated_at": "TEXT",
+    "license": "TEXT",
+    "has_issues": "BOOL",
+    "has_wiki": "BOOL",
+    "default_branch": "TEXT",
+    "is_gsoc": "BOOL",
+    "is_hacktoberfest": "BOOL",
+    "is_underrated": "BOOL",
+    "has_good_first_issues": "BOOL",
+    "sources": "TEXT",
+    "combined_text": "TEXT",
+}
+
+# Properties the API's Repository model serializes; search never needs readme or combined_text back
+RESPONSE_PROPERTIES: List[str] = [
+    "name", "full_name", "description", "url", "homepage", "language", "languages", "topics",
+    "stars", "forks", "open_issues", "license", "has_issues", "has_wiki", "created_at", "updated_at",
+]
+
+DEFAULT_RETURN_PROPERTIES: List[str] = list(RESPONSE_PROPERTIES)
+
+# Stored as comma-separated TEXT in older collections and as TEXT_ARRAY after `reindex.py migrate`
+LIST_PROPERTIES = ("languages", "topics")
+
+# Filter operators allowed per data type
+OPERATORS_BY_TYPE: Dict[str, tuple] = {
+    "INT": ("equal", "not_equal", "greater_than", "greater_or_equal", "less_than", "less_or_equal"),
+    "BOOL": ("equal", "not_equal"),
+    "TEXT": ("equal", "not_equal", "like", "contains_any", "contains_all"),
+}
+
+LIST_OPERATORS = ("contains_any", "contains_all")
+
+# Properties whose values are stored lowercase
+LOWERCASE_PROPERTIES = ("language", "languages", "topics")
+
+SearchMode = Literal["near_vector", "hybrid", "fetch_objects"]
+
+FilterValue = Union[bool, int, str, List[str]]
+
+
+class FilterNode(BaseModel):
+    """
+    A node of the filter tree: either a group ({"and": [...]} / {"or": [...]})
+    or a condition ({"property": ..., "op": ..., "value": ...}).
+    """
+    model_config = ConfigDict(populate_by_name=True, extra="forbid")
+
+    and_: Optional[List["FilterNode"]] = Field(None, alias="and", min_length=1)
+    or_: Optional[List["FilterNode"]] = Field(None, alias="or", min_length=1)
+    property: Optional[str] = None
+    op: Optional[str] = None
+    value: Optional[FilterValue] = None
+
+    @model_validator(mode="after")
+    def _check_shape(self) -> "FilterNode":
+        is_group = self.and_ is not None or self.or_ is not None
+        is_condition = self.property is not None
+        if is_group == is_condition or (self.and_ is not None and self.or_ is not None):
+            raise ValueError("filter node must be exactly one of 'and', 'or' or a property condition")
+        if is_group:
+            return self
+
+        data_type = REPO_PROPERTIES.get(self.property)
+        if data_type is None:
+            raise ValueError(f"unknown property '{self.property}'")
+        if self.op not in OPERATORS_BY_TYPE[data_type]:
+            raise ValueError(f"operator '{self.op}' is not supported on {data_type} property '{self.property}'")
+
+        value = self.value
+        if self.op in LIST_OPERATORS:
+            if isinstance(value, str):
+                value = [value]
+            if not isinstance(value, list) or not value:
+                raise ValueError(f"'{self.op}' on '{self.property}' needs a non-empty list of strings")
+        elif data_type == "INT":
+            if isinstance(value, bool) or not isinstance(value, int):
+                raise ValueError(f"'{self.property}' needs an integer value")
+        elif data_type == "BOOL":
+            if not isinstance(value, bool):
+                raise ValueError(f"'{self.property}' needs a boolean value")
+        elif not isinstance(value, str):
+            raise ValueError(f"'{self.property}' needs a string value")
+
+        if self.property in LOWERCASE_PROPERTIES:
+            value = [v.lower() for v in value] if isinstance(value, list) else value.lower()
+        self.value = value
+        return self
+
+    def condition_count(self) -> int:
+        """Number of leaf conditions under this node"""
+        children = self.and_ or self.or_
+        if children is None:
+            return 1
+        return sum(child.condition_count() for child in children)
+
+    def depth(self) -> int:
+        """Nesting depth of this node"""
+        children = self.and_ or self.or_
+        if children is None:
+            return 1
+        return 1 + max(child.depth() for child in children)
+
+
+class QueryPlan(BaseModel):
+    """Validated search plan produced by Gemini and executed natively by WeaviateService"""
+    model_config = ConfigDict(extra="forbid")
+
+    mode: SearchMode = "near_vector"
+    filters: Optional[FilterNode] = None
+    alpha: float = Field(0.7, ge=0.0, le=1.0)
+    limit: int = Field(20, ge=1, le=100)
+    return_properties: List[str] = Field(default_factory=lambda: list(DEFAULT_RETURN_PROPERTIES))
+
+    @model_validator(mode="after")
+    def _check_properties(self) -> "QueryPlan":
+        unknown = [p for p in self.return_properties if p not in REPO_PROPERTIES]
+        if unknown:
+            raise ValueError(f"unknown return properties: {unknown}")
+        if self.mode == "fetch_objects" and self.filters is None:
+            raise ValueError("fetch_objects plans need filters")
+        return self
+
+    @classmethod
+    def fallback(cls, limit: int = 20) -> "QueryPlan":
+        """Plain hybrid search on the raw query, used when no LLM plan is available"""
+        return cls(mode="hybrid", alpha=0.7, limit=limit)
+
+    def pushdown(self, limit: int) -> "QueryPlan":
+        """Copy of the plan fetching exactly ``limit`` objects and only the response properties"""
+        return self.model_copy(update={
+            "limit": max(1, min(limit, 100)),
+            "return_properties": list(RESPONSE_PROPERTIES),
+        })
+
+    @classmethod
+    def from_json(cls, text: str) -> "QueryPlan":
+        """Parse and validate a plan from JSON text"""
+        return cls.model_validate_json(text)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Plan as plain JSON-compatible data, using the 'and'/'or' keys"""
+        return self.model_dump(by_alias=True, exclude_none=True)
+
+    def to_json(self) -> str:
+        """Canonical JSON encoding; equal plans always produce equal text"""
+        return json.dumps(self.to_dict(), sort_keys=True, separators=(",", ":"))
+
+    def cache_key(self) -> str:
+        """Stable hash of the canonical encoding"""
+        return hashlib.sha256(self.to_json().encode()).hexdigest()
+
+    def __hash__(self) -> int:
+        return hash(self.cache_key())
+
+    def cost(self) -> Dict[str, Any]:
+        """Cheap structural cost estimate of executing the plan"""
+        return {
+            "mode": self.mode,
+            "limit": self.limit,
+            "conditions": self.filters.condition_count() if self.filters else 0,
+            "filter_depth": self.filters.depth() if self.filters else 0,
+            "properties": len(self.return_properties),
+        }
+
+
+def as_list(value: Any) -> List[str]:
+    """Values of a LIST_PROPERTIES property, whether stored as TEXT_ARRAY or comma-separated TEXT"""
+    if not value:
+        return []
+    if isinstance(value, list):
+        # TEXT_ARRAY values were split and stripped at import time
+        return value
+    return [item.strip() for item in value.split(',') if item.strip()]
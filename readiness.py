@@ -0,0 +1,163 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, Union
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+class ReadinessProbe:
+    """
+    Cached per-dependency readiness for the /ready endpoint.
+
+    Each registered check is an async callable that raises when the
+    dependency is unavailable. Checks run at startup and then every
+    READINESS_INTERVAL_SECONDS in the background, so /ready answers from the
+    cached status without touching any dependency.
+
+    Only critical dependencies gate readiness. A non-critical one (a
+    dependency the app has a fallback for) that is down is reported and
+    marks the instance degraded, but doesn't take it out of rotation.
+    """
+
+    def __init__(self, interval_seconds: Optional[float] = None, timeout_seconds: Optional[float] = None):
+        self.interval_seconds = (
+            interval_seconds if interval_seconds is not None
+            else float(os.getenv('READINESS_INTERVAL_SECONDS', '15'))
+        )
+        self.timeout_seconds = (
+            timeout_seconds if timeout_seconds is not None
+            else float(os.getenv('READINESS_TIMEOUT_SECONDS', '5'))
+        )
+        self._checks: Dict[str, Callable[[], Awaitable[Any]]] = {}
+        self._critical: Dict[str, Union[bool, Callable[[], bool]]] = {}
+        self.status: Dict[str, Dict[str, Any]] = {}
+        self.warmup_ms: Dict[str, float] = {}
+        self.startup_seconds: Optional[float] = None
+        self.first_request_seconds: Optional[float] = None
+        # Built at import, which is as close to process start as the app gets; a prefork worker resets it
+        self.process_started = time.time()
+        self._task: Optional[asyncio.Task] = None
+
+    def register(self, name: str, check: Callable[[], Awaitable[Any]], critical: Union[bool, Callable[[], bool]] = True):
+        """Add a dependency check; critical may be a callable when it depends on state, e.g. a warm fallback"""
+        self._checks[name] = check
+        self._critical[name] = critical
+        self.status[name] = {"ready": False, "checked_at": None, "latency_ms": None, "error": "not checked yet"}
+
+    def record_warmup(self, name: str, seconds: float):
+        """Remember how long a warm-up step took"""
+        self.warmup_ms[name] = round(seconds * 1000, 2)
+
+    def mark_process_start(self):
+        """Measure startup and time-to-first-request from now, e.g. in a freshly forked worker"""
+        self.process_started = time.time()
+
+    def mark_started(self):
+        """Record startup completion, measured from process start"""
+        self.startup_seconds = time.time() - self.process_started
+        logger.info(f"Startup completed {self.startup_seconds:.2f}s after process start (warm-up: {self.warmup_ms})")
+
+    def mark_request_served(self):
+        """Record time-to-first-request on the first completed request"""
+        if self.first_request_seconds is None:
+            self.first_request_seconds = time.time() - self.process_started
+            logger.info(f"First request served {self.first_request_seconds:.2f}s after process start")
+
+    async def _run_check(self, name: str, check: Callable[[], Awaitable[Any]]):
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(check(), self.timeout_seconds)
+            ready, error = True, None
+        except Exception as e:
+            ready, error = False, str(e) or type(e).__name__
+        previous = self.status.get(name, {})
+        self.status[name] = {
+            "ready": ready,
+            "checked_at": time.time(),
+            "latency_ms": round((time.perf_counter() - start) * 1000, 2),
+            "error": error,
+        }
+        if previous.get("checked_at") is not None and previous.get("ready") != ready:
+            if ready:
+                logger.info(f"Dependency {name} is ready again")
+            else:
+                logger.warning(f"Dependency {name} is unavailable: {error}")
+
+    async def check_all(self):
+        """Run every check concurrently and update the cached status"""
+        await asyncio.gather(*(self._run_check(name, check) for name, check in self._checks.items()))
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            await self.check_all()
+
+    def start(self):
+        """Start background re-checking"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        """Stop background re-checking"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def is_critical(self, name: str) -> bool:
+        critical = self._critical.get(name, True)
+        return critical() if callable(critical) else critical
+
+    @property
+    def ready(self) -> bool:
+        return self.startup_seconds is not None and all(
+            s["ready"] for name, s in self.status.items() if self.is_critical(name)
+        )
+
+    @property
+    def degraded(self) -> bool:
+        return any(not s["ready"] for s in self.status.values())
+
+    def report(self) -> Dict[str, Any]:
+        """Readiness summary for /ready"""
+        return {
+            "ready": self.ready,
+            "degraded": self.degraded,
+            "dependencies": {name: {**s, "critical": self.is_critical(name)} for name, s in self.status.items()},
+            "warmup_ms": self.warmup_ms,
+            "startup_seconds": round(self.startup_seconds, 3) if self.startup_seconds is not None else None,
+            "first_request_seconds": (
+                round(self.first_request_seconds, 3) if self.first_request_seconds is not None else None
+            ),
+        }
+
+
+class FirstRequestMiddleware:
+    """
+    ASGI middleware that reports time-to-first-request to the probe.
+
+    Probe paths (/health, /ready) don't count: the first request that matters
+    is the first real one the instance answers. After that it is a plain
+    pass-through.
+    """
+
+    def __init__(self, app: Any, probe: ReadinessProbe, exclude_paths: Tuple[str, ...] = ("/health", "/ready")):
+        self.app = app
+        self.probe = probe
+        self.exclude_paths = exclude_paths
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any):
+        await self.app(scope, receive, send)
+        if (
+            self.probe.first_request_seconds is None
+            and scope["type"] == "http" and scope["path"] not in self.exclude_paths
+        ):
+            self.probe.mark_request_served()
@@ -0,0 +1,306 @@
+"""
+Bulk ingestion and migration for the Repos collection.
+
+import: streams repository records from a JSONL file (one object per line with
+the REPO_PROPERTIES fields), encodes combined_text in large batches across a
+process pool with the same model the API queries with, and upserts through
+Weaviate's dynamic batching. Object UUIDs are derived from repo_id, so
+re-importing a record replaces it and re-running a file is an incremental
+update; records without a repo_id are skipped. Progress is checkpointed
+every --checkpoint-every records; --resume skips what the checkpoint says is
+already imported.
+
+    python reindex.py import repos.jsonl --workers 4 --batch-size 256 --resume
+
+migrate: copies an existing collection into a new one whose topics and
+languages are TEXT_ARRAY instead of comma-separated TEXT, keeping vectors.
+Objects are re-keyed to the UUID import derives from repo_id, so importing
+into the migrated collection later upserts instead of duplicating; objects
+without a repo_id keep their UUID. Weaviate cannot change a property's type
+in place; point the API at the new collection with WEAVIATE_COLLECTION once
+the copy is done.
+
+    python reindex.py migrate --source Repos --target Repos_v2
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from query_plan import LIST_PROPERTIES, REPO_PROPERTIES, as_list
+
+load_dotenv()
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+logger = logging.getLogger("reindex")
+
+# Encoder for pool workers, loaded once per process by _init_worker
+_model = None
+
+
+def _init_worker(threads: int):
+    global _model
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    from embedding import load_embedding_model
+    _model = load_embedding_model()
+
+
+def _encode_chunk(texts: List[str]) -> List[List[float]]:
+    return _model.encode(texts, batch_size=len(texts), show_progress_bar=False).tolist()
+
+
+def connect():
+    """Sync Weaviate client; the async client the API uses has no batch import"""
+    import weaviate
+    from weaviate.classes.init import Auth
+
+    from weaviate_service import WEAVIATE_CLUSTER_URL
+
+    return weaviate.connect_to_weaviate_cloud(
+        cluster_url=WEAVIATE_CLUSTER_URL,
+        auth_credentials=Auth.api_key(os.getenv('WEAVIATE_API_KEY')),
+    )
+
+
+def embed_text(record: Dict[str, Any]) -> str:
+    """Text the vector is computed from; falls back to the descriptive fields when combined_text is missing"""
+    if record.get("combined_text"):
+        return record["combined_text"]
+    parts = [record.get("name") or "", record.get("description") or ""]
+    parts.append(", ".join(as_list(record.get("topics"))))
+    parts.append(", ".join(as_list(record.get("languages"))))
+    return " ".join(part for part in parts if part)
+
+
+def list_property_types(collection) -> Dict[str, str]:
+    """Map languages/topics to "text[]" or "text" as the target collection stores them"""
+    types = {prop.name: prop.data_type.value for prop in collection.config.get().properties}
+    return {name: types.get(name, "text") for name in LIST_PROPERTIES}
+
+
+def to_properties(record: Dict[str, Any], list_types: Dict[str, str]) -> Dict[str, Any]:
+    """Keep the known properties and shape list fields for the target schema"""
+    props = {name: record[name] for name in REPO_PROPERTIES if record.get(name) is not None}
+    for name in LIST_PROPERTIES:
+        values = as_list(record.get(name))
+        props[name] = values if list_types.get(name) == "text[]" else ",".join(values)
+    return props
+
+
+def read_records(path: str, start_line: int) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    with open(path) as f:
+        for line_number, line in enumerate(f, 1):
+            if line_number <= start_line or not line.strip():
+                continue
+            yield line_number, json.loads(line)
+
+
+def chunks(records: Iterator[Tuple[int, Dict[str, Any]]], size: int) -> Iterator[List[Tuple[int, Dict[str, Any]]]]:
+    chunk = []
+    for item in records:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def load_checkpoint(path: str, input_path: str) -> Dict[str, Any]:
+    if not os.path.exists(path):
+        return {"input": input_path, "line": 0, "imported": 0, "failed": 0}
+    with open(path) as f:
+        checkpoint = json.load(f)
+    if checkpoint.get("input") != os.path.abspath(input_path):
+        raise SystemExit(f"Checkpoint {path} belongs to {checkpoint.get('input')}, not {input_path}")
+    return checkpoint
+
+
+def save_checkpoint(path: str, checkpoint: Dict[str, Any]):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp, path)
+
+
+def import_records(args):
+    from weaviate.util import generate_uuid5
+
+    checkpoint = (
+        load_checkpoint(args.checkpoint, args.input) if args.resume
+        else {"line": 0, "imported": 0, "failed": 0}
+    )
+    checkpoint["input"] = os.path.abspath(args.input)
+    if checkpoint["line"]:
+        logger.info(f"Resuming after line {checkpoint['line']} ({checkpoint['imported']} already imported)")
+
+    workers = max(1, args.workers)
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    skipped = 0
+
+    def keyed(records: Iterator[Tuple[int, Dict[str, Any]]]) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        # The object UUID comes from repo_id; a record without one can't be upserted
+        nonlocal skipped
+        for line_number, record in records:
+            if record.get("repo_id") in (None, ""):
+                skipped += 1
+                continue
+            yield line_number, record
+
+    client = connect()
+    try:
+        collection = client.collections.get(args.collection)
+        list_types = list_property_types(collection)
+        logger.info(f"Importing into {args.collection} (topics/languages stored as {list_types['topics']})")
+
+        started = time.perf_counter()
+        imported = since_checkpoint = 0
+        # Spawned, not forked: a forked worker would inherit the gRPC client's threads and sockets
+        spawn = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(workers, mp_context=spawn, initializer=_init_worker, initargs=(threads,)) as pool, \
+                collection.batch.dynamic() as batch:
+            pending: List[Tuple[List[Tuple[int, Dict[str, Any]]], Any]] = []
+
+            def drain(until: int):
+                nonlocal imported, since_checkpoint
+                while len(pending) > until:
+                    chunk, future = pending.pop(0)
+                    for (line_number, record), vector in zip(chunk, future.result()):
+                        batch.add_object(
+                            properties=to_properties(record, list_types),
+                            uuid=generate_uuid5(record["repo_id"]),
+                            vector=vector,
+                        )
+                    imported += len(chunk)
+                    since_checkpoint += len(chunk)
+                    checkpoint["line"] = chunk[-1][0]
+                    if since_checkpoint >= args.checkpoint_every:
+                        # Everything up to this line is in Weaviate before the checkpoint says so
+                        batch.flush()
+                        checkpoint["imported"] += since_checkpoint
+                        checkpoint["failed"] = len(collection.batch.failed_objects)
+                        save_checkpoint(args.checkpoint, checkpoint)
+                        since_checkpoint = 0
+                        elapsed = time.perf_counter() - started
+                        logger.info(f"{checkpoint['imported']} imported, {imported / elapsed:.0f} docs/sec")
+
+            # Keep two chunks per worker in flight so encoding overlaps the batch upload
+            for chunk in chunks(keyed(read_records(args.input, checkpoint["line"])), args.batch_size):
+                pending.append((chunk, pool.submit(_encode_chunk, [embed_text(record) for _, record in chunk])))
+                drain(workers * 2)
+            drain(0)
+
+        failed = collection.batch.failed_objects
+        checkpoint["imported"] += since_checkpoint
+        checkpoint["failed"] = len(failed)
+        save_checkpoint(args.checkpoint, checkpoint)
+        elapsed = time.perf_counter() - started
+        logger.info(
+            f"Imported {imported} records in {elapsed:.1f}s ({imported / elapsed if elapsed else 0:.0f} docs/sec), "
+            f"{len(failed)} failed"
+        )
+        for failure in failed[:10]:
+            logger.error(f"Failed object: {failure.message}")
+        if skipped:
+            logger.warning(f"Skipped {skipped} records without a repo_id")
+    finally:
+        client.close()
+
+
+def migrate(args):
+    from weaviate.classes.config import Configure, DataType, Property, VectorDistances
+    from weaviate.util import generate_uuid5
+
+    client = connect()
+    try:
+        source = client.collections.get(args.source)
+        if client.collections.exists(args.target):
+            raise SystemExit(f"Collection {args.target} already exists")
+
+        properties = []
+        for prop in source.config.get().properties:
+            data_type = DataType.TEXT_ARRAY if prop.name in LIST_PROPERTIES else prop.data_type
+            properties.append(Property(
+                name=prop.name,
+                data_type=data_type,
+                description=prop.description,
+                tokenization=prop.tokenization,
+                index_filterable=prop.index_filterable,
+                index_searchable=prop.index_searchable,
+                index_range_filters=prop.index_range_filters,
+            ))
+        target = client.collections.create(
+            args.target,
+            properties=properties,
+            vectorizer_config=Configure.Vectorizer.none(),
+            vector_index_config=Configure.VectorIndex.hnsw(distance_metric=VectorDistances.COSINE),
+        )
+        logger.info(f"Created {args.target} with topics/languages as TEXT_ARRAY")
+
+        started = time.perf_counter()
+        copied = unkeyed = 0
+        with target.batch.dynamic() as batch:
+            for obj in source.iterator(include_vector=True, cache_size=args.batch_size):
+                props = dict(obj.properties)
+                for name in LIST_PROPERTIES:
+                    props[name] = as_list(props.get(name))
+                # Same key as import, whatever UUID the source object was loaded with
+                if props.get("repo_id") is not None:
+                    uuid = generate_uuid5(props["repo_id"])
+                else:
+                    uuid = obj.uuid
+                    unkeyed += 1
+                batch.add_object(properties=props, uuid=uuid, vector=obj.vector.get("default"))
+                copied += 1
+                if copied % 10000 == 0:
+                    logger.info(f"{copied} copied, {copied / (time.perf_counter() - started):.0f} docs/sec")
+
+        failed = target.batch.failed_objects
+        elapsed = time.perf_counter() - started
+        logger.info(f"Copied {copied} objects in {elapsed:.1f}s, {len(failed)} failed")
+        if unkeyed:
+            logger.warning(f"{unkeyed} objects had no repo_id and kept their UUID; import cannot upsert them")
+        logger.info(f"Set WEAVIATE_COLLECTION={args.target} to serve from the migrated collection")
+    finally:
+        client.close()
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    load = sub.add_parser("import", help="encode and upsert repositories from JSONL")
+    load.add_argument("input", help="JSONL file, one repository record per line")
+    load.add_argument("--collection", default=os.getenv('WEAVIATE_COLLECTION', 'Repos'))
+    load.add_argument("--batch-size", type=int, default=256, help="records encoded per pool task")
+    load.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2), help="encoder processes")
+    load.add_argument("--checkpoint", default=None, help="checkpoint file (default: <input>.checkpoint.json)")
+    load.add_argument("--checkpoint-every", type=int, default=5000)
+    load.add_argument("--resume", action="store_true", help="continue after the last checkpointed line")
+
+    move = sub.add_parser("migrate", help="copy a collection with topics/languages as TEXT_ARRAY")
+    move.add_argument("--source", default=os.getenv('WEAVIATE_COLLECTION', 'Repos'))
+    move.add_argument("--target", required=True)
+    move.add_argument("--batch-size", type=int, default=1000)
+
+    args = parser.parse_args(argv)
+    if args.command == "import":
+        args.checkpoint = args.checkpoint or f"{args.input}.checkpoint.json"
+        import_records(args)
+    else:
+        migrate(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
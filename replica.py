@@ -0,0 +1,358 @@
+import asyncio
+import fnmatch
+import logging
+import os
+import re
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+from query_plan import FilterNode
+from vector_index import LocalVectorIndex
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+INT_COLUMNS = ("stars", "forks", "open_issues")
+BOOL_COLUMNS = ("has_issues", "has_wiki", "is_underrated", "is_gsoc", "is_hacktoberfest", "has_good_first_issues")
+TEXT_COLUMNS = (
+    "name", "full_name", "description", "url", "homepage", "language", "languages",
+    "topics", "license", "created_at", "updated_at",
+)
+# Text columns with a token bitmap index, tokenized like Weaviate's default "word" tokenization
+TOKEN_COLUMNS = ("language", "languages", "topics", "license")
+SORT_COLUMNS = ("stars", "forks", "updated_at", "created_at", "name")
+RETURN_PROPERTIES = list(TEXT_COLUMNS + INT_COLUMNS + BOOL_COLUMNS)
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def _tokens(value: Any) -> List[str]:
+    if isinstance(value, (list, tuple)):
+        value = " ".join(str(v) for v in value)
+    return _WORD.findall(str(value or "").lower())
+
+
+def _object_column(values: List[Any]) -> np.ndarray:
+    # Built element-wise so TEXT_ARRAY values stay one list per row instead of becoming a 2-d array
+    column = np.empty(len(values), dtype=object)
+    column[:] = values
+    return column
+
+
+class ReplicaObject:
+    """A replica row shaped like a Weaviate result object (uuid + properties)"""
+
+    __slots__ = ("uuid", "properties")
+
+    def __init__(self, uuid: str, properties: Dict[str, Any]):
+        self.uuid = uuid
+        self.properties = properties
+
+
+class _Snapshot:
+    """Immutable column store built from one full scan of the collection"""
+
+    def __init__(self, rows: List[Tuple[str, Dict[str, Any]]], synced_at: float):
+        self.synced_at = synced_at
+        self.vector_fingerprint: Optional[str] = None
+        self.n = len(rows)
+        self.uuids = np.array([uuid for uuid, _ in rows], dtype=object)
+        self.text = {col: _object_column([props.get(col) or "" for _, props in rows]) for col in TEXT_COLUMNS}
+        self.ints = {
+            col: np.array([props.get(col) or 0 for _, props in rows], dtype=np.int64) for col in INT_COLUMNS
+        }
+        self.flags = {
+            col: np.array([bool(props.get(col)) for _, props in rows], dtype=bool) for col in BOOL_COLUMNS
+        }
+        self.bools = {col: np.packbits(flags) for col, flags in self.flags.items()}
+        self.all_rows = np.packbits(np.ones(self.n, dtype=bool))
+        self.no_rows = np.packbits(np.zeros(self.n, dtype=bool))
+
+        self.token_index: Dict[str, Dict[str, np.ndarray]] = {}
+        for col in TOKEN_COLUMNS:
+            postings: Dict[str, List[int]] = {}
+            for i, value in enumerate(self.text[col]):
+                for token in set(_tokens(value)):
+                    postings.setdefault(token, []).append(i)
+            index = {}
+            for token, ids in postings.items():
+                mask = np.zeros(self.n, dtype=bool)
+                mask[ids] = True
+                index[token] = np.packbits(mask)
+            self.token_index[col] = index
+
+        self.lower = {col: [str(v).lower() for v in self.text[col]] for col in TEXT_COLUMNS}
+
+        # Presorted permutations per (field, order), ties broken by uuid ascending like the Weaviate sort
+        uuid_rank = np.argsort(np.argsort(self.uuids.astype(str), kind="stable"), kind="stable")
+        self.sort_values: Dict[str, np.ndarray] = {}
+        self.permutations: Dict[Tuple[str, str], np.ndarray] = {}
+        for col in SORT_COLUMNS:
+            if col in self.ints:
+                values = self.ints[col]
+                rank = values
+            else:
+                values = self.text[col].astype(str)
+                _, rank = np.unique(values, return_inverse=True)
+            self.sort_values[col] = values
+            self.permutations[(col, "asc")] = np.lexsort((uuid_rank, rank)).astype(np.int32)
+            self.permutations[(col, "desc")] = np.lexsort((uuid_rank, -rank.astype(np.int64))).astype(np.int32)
+
+    def nbytes(self) -> int:
+        total = sum(a.nbytes for a in self.ints.values()) + sum(a.nbytes for a in self.flags.values())
+        total += sum(a.nbytes for a in self.bools.values())
+        total += sum(a.nbytes for a in self.permutations.values())
+        total += sum(m.nbytes for index in self.token_index.values() for m in index.values())
+        return total
+
+    def _token_mask(self, col: str, value: Any, match_all: bool) -> np.ndarray:
+        tokens = _tokens(value)
+        if not tokens:
+            return self.no_rows
+        masks = [self.token_index[col].get(token, self.no_rows) for token in tokens]
+        return np.bitwise_and.reduce(masks) if match_all else np.bitwise_or.reduce(masks)
+
+    def _contains_mask(self, col: str, text: str) -> np.ndarray:
+        needle = text.lower()
+        return np.packbits(np.fromiter((needle in v for v in self.lower[col]), dtype=bool, count=self.n))
+
+    def mask(self, filters: Dict[str, Any]) -> np.ndarray:
+        """Bitmap of rows matching a listing filter dict (the endpoints' filters_applied)"""
+        mask = self.all_rows
+        for key, value in filters.items():
+            if key in ("language", "license"):
+                part = self._token_mask(key, value, match_all=True)
+            elif key in ("languages", "topics"):
+                part = self._token_mask(key, value, match_all=False)
+            elif key in BOOL_COLUMNS:
+                part = self.bools[key] if value else ~self.bools[key]
+            elif key in ("min_stars", "max_stars", "min_forks", "max_forks"):
+                column = self.ints[key.split("_", 1)[1]]
+                part = np.packbits(column >= value if key.startswith("min") else column <= value)
+            elif key in ("name_contains", "description_contains"):
+                part = self._contains_mask(key.split("_", 1)[0], value)
+            else:
+                raise ValueError(f"Replica cannot evaluate filter {key}")
+            mask = mask & part
+        return np.unpackbits(mask, count=self.n).view(bool)
+
+    def _compare(self, node: FilterNode) -> np.ndarray:
+        prop, op, value = node.property, node.op, node.value
+        if prop in self.ints:
+            column = self.ints[prop]
+            return {
+                "equal": np.equal, "not_equal": np.not_equal,
+                "greater_than": np.greater, "greater_or_equal": np.greater_equal,
+                "less_than": np.less, "less_or_equal": np.less_equal,
+            }[op](column, value)
+        if prop in self.flags:
+            return self.flags[prop] == value if op == "equal" else self.flags[prop] != value
+        if prop not in self.text:
+            raise ValueError(f"Replica has no column for '{prop}'")
+        if op in ("contains_any", "contains_all") and prop in self.token_index:
+            packed = self._token_mask(prop, value, match_all=op == "contains_all")
+            return np.unpackbits(packed, count=self.n).view(bool)
+        if op in ("equal", "not_equal") and prop in self.token_index:
+            packed = self._token_mask(prop, value, match_all=True)
+            matched = np.unpackbits(packed, count=self.n).view(bool)
+            return matched if op == "equal" else ~matched
+        if op == "like":
+            pattern = str(value).lower()
+            return np.fromiter((fnmatch.fnmatchcase(v, pattern) for v in self.lower[prop]), dtype=bool, count=self.n)
+        if op in ("equal", "not_equal"):
+            target = str(value).lower()
+            matched = np.fromiter((v == target for v in self.lower[prop]), dtype=bool, count=self.n)
+            return matched if op == "equal" else ~matched
+        raise ValueError(f"Replica cannot evaluate {op} on '{prop}'")
+
+    def node_mask(self, node: FilterNode) -> np.ndarray:
+        """Boolean row mask for a query plan filter tree"""
+        if node.and_ is not None:
+            return np.logical_and.reduce([self.node_mask(child) for child in node.and_])
+        if node.or_ is not None:
+            return np.logical_or.reduce([self.node_mask(child) for child in node.or_])
+        return self._compare(node)
+
+    def row(self, i: int) -> ReplicaObject:
+        props: Dict[str, Any] = {col: self.text[col][i] for col in TEXT_COLUMNS}
+        props.update({col: int(self.ints[col][i]) for col in INT_COLUMNS})
+        props.update({col: bool(self.flags[col][i]) for col in BOOL_COLUMNS})
+        return ReplicaObject(str(self.uuids[i]), props)
+
+
+class RepoReplica:
+    """
+    Optional local copy of the Repos metadata for /allrepos and /hiddengem.
+
+    A full scan of the collection every REPLICA_SYNC_INTERVAL_SECONDS builds an
+    immutable column store: NumPy columns, packed bitmaps for the boolean,
+    language, languages, topics and license filters, and a presorted
+    permutation per sortable field and order. A listing page is then a few
+    bitmap ANDs and one pass over a permutation, with no Weaviate round-trip,
+    so browsing keeps working while Weaviate is unavailable. The previous
+    snapshot keeps serving until a new one is built.
+
+    With a LocalVectorIndex attached, each sync also pulls the object vectors
+    and rebuilds the index with the same row order, so plan filters become
+    pre-filter masks for near_vector searches.
+    """
+
+    def __init__(self, sync_interval_seconds: Optional[float] = None, vector_index: Optional[LocalVectorIndex] = None):
+        self.sync_interval_seconds = (
+            sync_interval_seconds if sync_interval_seconds is not None
+            else float(os.getenv('REPLICA_SYNC_INTERVAL_SECONDS', '300'))
+        )
+        self.vector_index = vector_index
+        self._snapshot: Optional[_Snapshot] = None
+        self._task: Optional[asyncio.Task] = None
+        self.syncs = 0
+        self.sync_failures = 0
+        self.index_failures = 0
+        self.last_sync_seconds: Optional[float] = None
+        self.queries = 0
+        self.vector_searches = 0
+
+    @property
+    def ready(self) -> bool:
+        return self._snapshot is not None
+
+    async def sync(self, collection: Any):
+        """Scan the collection and swap in a freshly built snapshot"""
+        start = time.perf_counter()
+        synced_at = time.time()
+        rows = []
+        vectors = []
+        with_vectors = self.vector_index is not None
+        async for obj in collection.iterator(
+            include_vector=with_vectors, return_properties=RETURN_PROPERTIES, cache_size=1000
+        ):
+            rows.append((str(obj.uuid), obj.properties))
+            if with_vectors:
+                vector = obj.vector.get("default") if isinstance(obj.vector, dict) else obj.vector
+                vectors.append(vector)
+        snapshot = await asyncio.to_thread(_Snapshot, rows, synced_at)
+        if with_vectors and rows:
+            dim = len(next(v for v in vectors if v is not None))
+            matrix = np.array([v if v is not None else np.zeros(dim) for v in vectors], dtype=np.float32)
+            try:
+                await asyncio.to_thread(self.vector_index.build, matrix)
+                snapshot.vector_fingerprint = self.vector_index.fingerprint
+            except Exception as e:
+                # Listings still get the new metadata; vector_ready stays False until an index build succeeds
+                self.index_failures += 1
+                logger.error(f"Vector index build failed: {str(e)}")
+        self._snapshot = snapshot
+        self.syncs += 1
+        self.last_sync_seconds = time.perf_counter() - start
+        logger.info(f"Replica synced {len(rows)} repositories in {self.last_sync_seconds:.2f}s")
+
+    async def _loop(self, get_collection: Callable[[], Any]):
+        while True:
+            try:
+                await self.sync(get_collection())
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.sync_failures += 1
+                logger.error(f"Replica sync failed: {str(e)}")
+            await asyncio.sleep(self.sync_interval_seconds)
+
+    def start(self, get_collection: Callable[[], Any]):
+        """Sync now and then periodically in the background"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop(get_collection))
+
+    async def stop(self):
+        """Stop background syncing"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def query(
+        self,
+        filters: Dict[str, Any],
+        sort_by: str,
+        sort_order: str,
+        offset: int,
+        limit: int,
+        cursor: Optional[Dict[str, Any]] = None,
+    ) -> Tuple[List[ReplicaObject], int]:
+        """One page of a listing plus the total number of matching rows"""
+        snapshot = self._snapshot
+        if snapshot is None:
+            raise RuntimeError("Replica has not synced yet")
+        self.queries += 1
+        permutation = snapshot.permutations[(sort_by, sort_order)]
+        selected = permutation[snapshot.mask(filters)[permutation]]
+        total = len(selected)
+
+        if cursor is not None and "n" in cursor:
+            offset = int(cursor["n"])
+        elif cursor is not None:
+            values = snapshot.sort_values[sort_by][selected]
+            after = values >= cursor["v"] if sort_order == "asc" else values <= cursor["v"]
+            selected = selected[after]
+            offset = int(cursor["k"])
+
+        return [snapshot.row(int(i)) for i in selected[offset:offset + limit]], total
+
+    @property
+    def vector_ready(self) -> bool:
+        snapshot = self._snapshot
+        return (
+            snapshot is not None and self.vector_index is not None
+            and snapshot.vector_fingerprint is not None
+            and snapshot.vector_fingerprint == self.vector_index.fingerprint
+        )
+
+    def near_vector(
+        self,
+        vector: np.ndarray,
+        filters: Optional[FilterNode],
+        limit: int,
+    ) -> List[Tuple[ReplicaObject, float]]:
+        """Nearest repositories to a query vector among the rows matching a plan filter"""
+        snapshot = self._snapshot
+        if not self.vector_ready:
+            raise RuntimeError("Local vector index is not in sync with the replica")
+        mask = snapshot.node_mask(filters) if filters is not None else None
+        self.vector_searches += 1
+        indices, distances = self.vector_index.search(vector, limit, mask)
+        return [(snapshot.row(int(i)), float(d)) for i, d in zip(indices, distances)]
+
+    def freshness(self) -> Optional[Dict[str, Any]]:
+        """When the data being served was read from Weaviate"""
+        snapshot = self._snapshot
+        if snapshot is None:
+            return None
+        return {
+            "source": "replica",
+            "synced_at": datetime.fromtimestamp(snapshot.synced_at, tz=timezone.utc).isoformat(),
+            "age_seconds": round(time.time() - snapshot.synced_at, 1),
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        """Sync counters and memory footprint"""
+        snapshot = self._snapshot
+        return {
+            'ready': snapshot is not None,
+            'rows': snapshot.n if snapshot is not None else 0,
+            'index_bytes': snapshot.nbytes() if snapshot is not None else 0,
+            'syncs': self.syncs,
+            'sync_failures': self.sync_failures,
+            'index_failures': self.index_failures,
+            'last_sync_seconds': round(self.last_sync_seconds, 3) if self.last_sync_seconds is not None else None,
+            'queries': self.queries,
+            'vector_searches': self.vector_searches,
+            'vector_index': self.vector_index.stats() if self.vector_index is not None else None,
+            'freshness': self.freshness(),
+        }
@@ -0,0 +1,194 @@
+import asyncio
+import functools
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+from fastapi import Request, Response
+from pydantic import BaseModel
+
+from results import RecordResponse
+from tracing import record_cache
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+
+class CachedResponse:
+    """Pre-serialized response body with its strong ETag"""
+
+    __slots__ = ("body", "etag", "stored_at")
+
+    def __init__(self, body: bytes):
+        self.body = body
+        self.etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+        self.stored_at = time.time()
+
+
+class ResponseCache:
+    """
+    In-memory cache of serialized GET responses for the listing endpoints.
+
+    Entries are keyed on the route path plus its parsed query parameters, so
+    equivalent query strings (ordering, defaults, "01" vs "1") share an entry.
+    Fresh entries are served as-is; entries up to RESPONSE_CACHE_STALE_SECONDS
+    past their TTL are served immediately while the endpoint re-runs in the
+    background. Clients revalidate with If-None-Match and get a 304. Total body
+    size is capped at RESPONSE_CACHE_MAX_BYTES with LRU eviction (0 disables).
+    """
+
+    def __init__(
+        self,
+        max_bytes: Optional[int] = None,
+        ttl_seconds: Optional[float] = None,
+        stale_seconds: Optional[float] = None,
+    ):
+        self.max_bytes = max_bytes if max_bytes is not None else int(os.getenv('RESPONSE_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+        self.ttl_seconds = (
+            ttl_seconds if ttl_seconds is not None
+            else float(os.getenv('RESPONSE_CACHE_TTL_SECONDS', '60'))
+        )
+        self.stale_seconds = (
+            stale_seconds if stale_seconds is not None
+            else float(os.getenv('RESPONSE_CACHE_STALE_SECONDS', '600'))
+        )
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._refreshing: Dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(path: str, params: Dict[str, Any]) -> str:
+        """Canonical cache key for a route and its parsed parameters"""
+        return f"{path}?{json.dumps(params, sort_keys=True, separators=(',', ':'), default=str)}"
+
+    def lookup(self, key: str) -> Tuple[Optional[CachedResponse], str]:
+        """Return (entry, "fresh" | "stale"), or (None, "miss") when absent or too old to serve"""
+        with self._lock:
+            entry = self._entries.get(key)
+            age = time.time() - entry.stored_at if entry is not None else None
+            if entry is None or age >= self.ttl_seconds + self.stale_seconds:
+                self.misses += 1
+                return None, "miss"
+            self._entries.move_to_end(key)
+            if age < self.ttl_seconds:
+                self.hits += 1
+                return entry, "fresh"
+            self.stale_hits += 1
+            return entry, "stale"
+
+    def store(self, key: str, body: bytes) -> CachedResponse:
+        """Cache a serialized body and return its entry; bodies larger than the cap are not kept"""
+        entry = CachedResponse(body)
+        size = len(body) + len(key)
+        if size > self.max_bytes:
+            return entry
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous.body) + len(key)
+            self._entries[key] = entry
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                old_key, old = self._entries.popitem(last=False)
+                self._bytes -= len(old.body) + len(old_key)
+                self.evictions += 1
+        return entry
+
+    def invalidate(self):
+        """Drop every entry, e.g. after the Repos collection is re-ingested"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    @staticmethod
+    def _serialize(result: Any) -> Optional[bytes]:
+        # Failed listings (success=False) are returned but never cached
+        if isinstance(result, RecordResponse):
+            return bytes(result.body) if result.success else None
+        if isinstance(result, BaseModel):
+            return result.model_dump_json().encode() if getattr(result, "success", True) else None
+        if isinstance(result, dict):
+            return json.dumps(result, separators=(",", ":")).encode() if result.get("success", True) else None
+        return None
+
+    def _refresh(self, key: str, build: Callable[[], Awaitable[Any]]):
+        if key in self._refreshing:
+            return
+
+        async def refresh():
+            try:
+                body = self._serialize(await build())
+                if body is not None:
+                    self.store(key, body)
+            except Exception as e:
+                logger.warning(f"Background refresh of {key} failed: {str(e)}")
+            finally:
+                self._refreshing.pop(key, None)
+
+        self._refreshing[key] = asyncio.create_task(refresh())
+
+    def _respond(self, request: Request, entry: CachedResponse, state: str) -> Response:
+        headers = {
+            "ETag": entry.etag,
+            "Cache-Control": f"public, max-age={int(self.ttl_seconds)}, stale-while-revalidate={int(self.stale_seconds)}",
+            "X-Cache": state.upper(),
+        }
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match:
+            tags = {tag.strip() for tag in if_none_match.split(",")}
+            if "*" in tags or entry.etag in tags:
+                self.not_modified += 1
+                return Response(status_code=304, headers=headers)
+        return Response(content=entry.body, media_type="application/json", headers=headers)
+
+    def cached(self, endpoint: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+        """Decorate a GET endpoint that takes ``request: Request`` so its responses are cached"""
+
+        @functools.wraps(endpoint)
+        async def wrapper(*args, **kwargs):
+            request: Request = kwargs["request"]
+            if self.max_bytes <= 0:
+                return await endpoint(*args, **kwargs)
+            key = self.make_key(request.url.path, {k: v for k, v in kwargs.items() if k != "request"})
+            entry, state = self.lookup(key)
+            record_cache("response", state)
+            if entry is None:
+                result = await endpoint(*args, **kwargs)
+                body = self._serialize(result)
+                if body is None:
+                    return result
+                entry = self.store(key, body)
+            elif state == "stale":
+                self._refresh(key, functools.partial(endpoint, *args, **kwargs))
+            return self._respond(request, entry, state)
+
+        return wrapper
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss/304 counters and memory footprint"""
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses,
+            'hit_ratio': round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0.0,
+            'not_modified': self.not_modified,
+            'evictions': self.evictions,
+            'entries': len(self._entries),
+            'bytes': self._bytes,
+            'max_bytes': self.max_bytes,
+            'refreshing': len(self._refreshing),
+        }
@@ -0,0 +1,125 @@
+import json
+import time
+from typing import Any, Dict, Optional
+
+from fastapi import Response
+
+from metrics import observe_stage
+from tracing import add_span
+from query_plan import as_list
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class RepositoryRecord:
+    """
+    One repository in an API response.
+
+    Built straight from stored Weaviate/replica properties and encoded
+    straight to JSON, instead of going dict -> Repository model -> response
+    model validation -> JSON. Serializes to the same fields, in the same
+    order, as the Repository model in main.py.
+    """
+
+    __slots__ = (
+        "name", "full_name", "description", "url", "homepage", "language", "languages", "topics",
+        "stars", "forks", "open_issues", "license", "has_issues", "has_wiki", "created_at", "updated_at",
+        "distance", "score",
+    )
+
+    def __init__(
+        self,
+        props: Dict[str, Any],
+        distance: Optional[float] = None,
+        score: Optional[float] = None,
+    ):
+        get = props.get
+        self.name = get('name') or ''
+        self.full_name = get('full_name') or ''
+        self.description = get('description') or ''
+        self.url = get('url') or ''
+        self.homepage = get('homepage') or ''
+        self.language = get('language') or ''
+        self.languages = as_list(get('languages'))
+        self.topics = as_list(get('topics'))
+        self.stars = get('stars') or 0
+        self.forks = get('forks') or 0
+        self.open_issues = get('open_issues') or 0
+        self.license = get('license') or ''
+        self.has_issues = get('has_issues') or False
+        self.has_wiki = get('has_wiki') or False
+        self.created_at = get('created_at') or ''
+        self.updated_at = get('updated_at') or ''
+        # Local index distances are numpy floats, which the encoders don't take
+        self.distance = None if distance is None else round(float(distance), 4)
+        self.score = None if score is None else round(float(score), 4)
+
+    @classmethod
+    def from_search(cls, props: Dict[str, Any], metadata: Any = None, distance: Optional[float] = None) -> "RepositoryRecord":
+        """Record for a search hit, carrying its distance (near_vector) or score (hybrid)"""
+        score = None
+        if distance is None and metadata is not None:
+            distance = getattr(metadata, 'distance', None)
+            if distance is None:
+                score = getattr(metadata, 'score', None)
+        record = cls(props, distance=distance, score=score)
+        # /search has always returned a stored null homepage or license as null; listings send ""
+        if props.get('homepage', '') is None:
+            record.homepage = None
+        if props.get('license', '') is None:
+            record.license = None
+        return record
+
+    def __getitem__(self, key: str) -> Any:
+        return getattr(self, key)
+
+    def to_dict(self) -> Dict[str, Any]:
+        # Spelled out rather than looped over __slots__: this runs once per result on every response
+        return {
+            'name': self.name, 'full_name': self.full_name, 'description': self.description, 'url': self.url,
+            'homepage': self.homepage, 'language': self.language, 'languages': self.languages, 'topics': self.topics,
+            'stars': self.stars, 'forks': self.forks, 'open_issues': self.open_issues, 'license': self.license,
+            'has_issues': self.has_issues, 'has_wiki': self.has_wiki,
+            'created_at': self.created_at, 'updated_at': self.updated_at,
+            'distance': self.distance, 'score': self.score,
+        }
+
+
+def _default(obj: Any) -> Any:
+    if type(obj) is RepositoryRecord:
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """Encode a response payload (which may hold RepositoryRecords) to compact JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+class RecordResponse(Response):
+    """
+    JSON response rendered with dumps().
+
+    Returning it from an endpoint skips FastAPI's response_model validation;
+    the response_model still documents the shape. ``success`` is kept so the
+    response cache can skip failed listings.
+    """
+
+    media_type = "application/json"
+
+    def __init__(self, content: Dict[str, Any], **kwargs):
+        self.success = content.get("success", True)
+        super().__init__(content, **kwargs)
+
+    def render(self, content: Any) -> bytes:
+        start = time.perf_counter()
+        body = dumps(content)
+        end = time.perf_counter()
+        observe_stage("serialization", end - start)
+        add_span("serialization", start, end)
+        return body
@@ -0,0 +1,370 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+
+import numpy as np
+from dotenv import load_dotenv
+
+from circuit_breaker import CircuitOpenError
+from gemini_service import GeminiService
+from metrics import METRICS_ENABLED, SEARCHES, observe_stage
+from plan_cache import PlanCache, normalize_query
+from query_parser import RuleBasedParser
+from query_plan import QueryPlan
+from tracing import add_span, record_cache
+from weaviate_service import WeaviateService
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Receives (event name, payload) as the pipeline progresses; see SearchPipeline.run
+EventCallback = Callable[[str, Dict[str, Any]], None]
+
+
+class SearchStageError(Exception):
+    """A /search pipeline stage failed with no fallback available"""
+
+    def __init__(self, stage: str, error: Exception):
+        super().__init__(str(error))
+        self.stage = stage
+        self.error = error
+
+
+class StageTimings:
+    """Start/end offsets of each pipeline stage, relative to the start of the request"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans: Dict[str, Tuple[float, float]] = {}
+
+    async def measure(self, stage: str, awaitable: Awaitable[T]) -> T:
+        """Await a stage and record when it started and finished"""
+        start = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            self.spans[stage] = (start, time.perf_counter())
+
+    def duration(self, stage: str) -> float:
+        """Seconds a finished stage took, 0 if it didn't run"""
+        start, end = self.spans.get(stage, (0.0, 0.0))
+        return end - start
+
+    def report(self) -> Dict[str, Any]:
+        """Per-stage offsets and durations in milliseconds; stages that overlap share wall-clock time"""
+        stages = {}
+        for stage, (start, end) in sorted(self.spans.items(), key=lambda item: item[1][0]):
+            stages[stage] = {
+                "start_ms": round((start - self.started) * 1000, 2),
+                "end_ms": round((end - self.started) * 1000, 2),
+                "duration_ms": round((end - start) * 1000, 2),
+            }
+        return {
+            "total_ms": round((time.perf_counter() - self.started) * 1000, 2),
+            "stages": stages,
+        }
+
+
+class SearchPipeline:
+    """
+    Runs the /search stages with independent work started concurrently.
+
+    Queries the rule-based parser understands skip Gemini entirely (the fast
+    path). Otherwise the query embedding, which only depends on the query
+    text, is computed while Gemini generates the plan. With SPECULATIVE_SEARCH enabled a plain
+    hybrid search also starts as soon as the vector is ready and is served if
+    plan generation fails.
+
+    Every plan is executed with its limit set to the client's limit plus
+    SEARCH_OVERFETCH and with only the properties the response serializes.
+
+    Each request has a SEARCH_BUDGET_MS latency budget. Plan generation may
+    use up to SEARCH_PLAN_BUDGET_FRACTION of it; when Gemini fails or runs
+    past that, the request is served degraded by a plain hybrid search on the
+    raw query (SEARCH_DEGRADED_FALLBACK). The Weaviate query gets whatever is
+    left, but never less than SEARCH_MIN_STAGE_MS. Time a batch query spends
+    waiting for one of the batch's Gemini slots is not charged to its budget.
+    """
+
+    def __init__(
+        self,
+        gemini_service: GeminiService,
+        weaviate_service: WeaviateService,
+        plan_cache: PlanCache,
+        parser: Optional[RuleBasedParser] = None,
+        speculative: Optional[bool] = None,
+        overfetch: Optional[int] = None,
+    ):
+        self.gemini_service = gemini_service
+        self.weaviate_service = weaviate_service
+        self.plan_cache = plan_cache
+        self.parser = parser
+        if self.parser is None and os.getenv('QUERY_PARSER_ENABLED', 'true').lower() in ('1', 'true', 'yes'):
+            self.parser = RuleBasedParser()
+        self.plan_sources: Dict[str, int] = {"cache": 0, "rules": 0, "gemini": 0, "fallback": 0}
+        self.speculative = (
+            speculative if speculative is not None
+            else os.getenv('SPECULATIVE_SEARCH', 'false').lower() in ('1', 'true', 'yes')
+        )
+        self.overfetch = overfetch if overfetch is not None else int(os.getenv('SEARCH_OVERFETCH', '0'))
+        self.batch_concurrency = int(os.getenv('SEARCH_BATCH_CONCURRENCY', '16'))
+        self.batch_gemini_concurrency = int(os.getenv('SEARCH_BATCH_GEMINI_CONCURRENCY', '4'))
+        self.budget = float(os.getenv('SEARCH_BUDGET_MS', '6000')) / 1000
+        self.plan_budget_fraction = float(os.getenv('SEARCH_PLAN_BUDGET_FRACTION', '0.6'))
+        self.min_stage = float(os.getenv('SEARCH_MIN_STAGE_MS', '300')) / 1000
+        self.degraded_fallback = os.getenv('SEARCH_DEGRADED_FALLBACK', 'true').lower() in ('1', 'true', 'yes')
+        self.degraded_reasons: Dict[str, int] = {"plan_timeout": 0, "plan_error": 0, "gemini_circuit_open": 0}
+
+    @staticmethod
+    def _parse_cached(cached_plan: Optional[str]) -> Optional[QueryPlan]:
+        if cached_plan is None:
+            return None
+        try:
+            return QueryPlan.from_json(cached_plan)
+        except ValueError:
+            logger.warning("Discarding cached plan that no longer validates")
+            return None
+
+    async def _parse(self, query: str) -> Optional[QueryPlan]:
+        return self.parser.parse(query)
+    
+    async def _generate(
+        self,
+        query: str,
+        gemini_limiter: Optional[asyncio.Semaphore],
+        plan_deadline: float,
+        timings: StageTimings,
+    ) -> QueryPlan:
+        """Generate a plan by plan_deadline, which is pushed back by any time spent queued on gemini_limiter"""
+        if gemini_limiter is not None:
+            queued = time.perf_counter()
+            await timings.measure("gemini_queue", gemini_limiter.acquire())
+            plan_deadline += time.perf_counter() - queued
+        try:
+            return await timings.measure("gemini", asyncio.wait_for(
+                self.gemini_service.generate_query_plan(query), max(0.0, plan_deadline - time.perf_counter())
+            ))
+        finally:
+            if gemini_limiter is not None:
+                gemini_limiter.release()
+    
+    @staticmethod
+    async def _given(vector: np.ndarray) -> np.ndarray:
+        return vector
+    
+    async def _search_within(self, search: Awaitable[Dict[str, Any]], deadline: float, query: str, plan: QueryPlan) -> Dict[str, Any]:
+        """Await a Weaviate search, reporting it as failed if it outlives the request budget"""
+        try:
+            return await asyncio.wait_for(search, max(self.min_stage, deadline - time.perf_counter()))
+        except asyncio.TimeoutError:
+            return {
+                'success': False,
+                'query': query,
+                'error': "Search exceeded the request latency budget",
+                'results_count': 0,
+                'results': [],
+                'plan': plan.to_dict()
+            }
+
+    def stats(self) -> Dict[str, Any]:
+        """Where plans came from, including the fraction of traffic served by the fast path"""
+        total = sum(self.plan_sources.values())
+        return {
+            "plan_sources": dict(self.plan_sources),
+            "degraded": dict(self.degraded_reasons),
+            "budget_ms": self.budget * 1000,
+            "fast_path_ratio": round(self.plan_sources["rules"] / total, 4) if total else 0.0,
+            "parser": self.parser.stats() if self.parser is not None else None,
+        }
+
+    async def run(
+        self,
+        query: str,
+        limit: int,
+        on_event: Optional[EventCallback] = None,
+        query_vector: Optional[np.ndarray] = None,
+        gemini_limiter: Optional[asyncio.Semaphore] = None,
+    ) -> Dict[str, Any]:
+        """
+        Plan and execute a search, returning the WeaviateService result dict plus timings.
+
+        on_event, if given, is called with ("plan", {plan_source, plan}) once the plan is known
+        and ("query", {mode}) when it is sent to Weaviate, for streaming progress to the client.
+        query_vector skips the embedding stage when the caller already encoded the query, and
+        gemini_limiter bounds how many plan generations run at once across callers sharing it.
+        """
+        timings = StageTimings()
+        deadline = timings.started + self.budget
+        plan_deadline = timings.started + self.budget * self.plan_budget_fraction
+        emit = on_event or (lambda event, payload: None)
+        fetch_limit = limit + self.overfetch
+        pending = []
+        try:
+            plan = self._parse_cached(
+                await timings.measure("plan_cache", asyncio.to_thread(self.plan_cache.lookup_exact, query))
+            )
+            source = "cache" if plan is not None else None
+            record_cache("plan", "hit" if plan is not None else "miss")
+
+            if plan is None and self.parser is not None:
+                plan = await timings.measure("rules", self._parse(query))
+                if plan is not None:
+                    source = "rules"
+
+            embed_task = asyncio.create_task(timings.measure(
+                "embedding",
+                self.weaviate_service.encode_query(query) if query_vector is None else self._given(query_vector)
+            ))
+            pending.append(embed_task)
+            plan_task = None
+            if plan is None:
+                plan_task = asyncio.create_task(self._generate(query, gemini_limiter, plan_deadline, timings))
+                pending.append(plan_task)
+
+            try:
+                query_vector = await asyncio.wait_for(embed_task, max(0.0, deadline - time.perf_counter()))
+            except Exception as e:
+                raise SearchStageError("embedding", e)
+
+            if plan is None:
+                plan = self._parse_cached(await timings.measure(
+                    "semantic_cache",
+                    asyncio.to_thread(self.plan_cache.lookup_semantic, query, query_vector)
+                ))
+                if plan is not None:
+                    source = "cache"
+                    record_cache("plan", "semantic_hit")
+                    plan_task.cancel()
+
+            speculative_task = None
+            if plan is None and self.speculative:
+                speculative_task = asyncio.create_task(timings.measure(
+                    "speculative_search",
+                    self.weaviate_service.search(query, QueryPlan.fallback().pushdown(fetch_limit), query_vector)
+                ))
+                pending.append(speculative_task)
+
+            degraded_reason = None
+            if plan is None:
+                try:
+                    plan = await plan_task
+                    source = "gemini"
+                    logger.info(f"Generated plan: {plan.to_json()[:200]}...")
+                except Exception as e:
+                    timed_out = isinstance(e, asyncio.TimeoutError)
+                    if speculative_task is None and not self.degraded_fallback:
+                        raise SearchStageError("gemini", e)
+                    degraded_reason = (
+                        "plan_timeout" if timed_out
+                        else "gemini_circuit_open" if isinstance(e, CircuitOpenError)
+                        else "plan_error"
+                    )
+                    self.degraded_reasons[degraded_reason] += 1
+                    logger.warning(
+                        f"Plan generation {'exceeded its budget' if timed_out else f'failed ({str(e)})'}; "
+                        "serving a plain hybrid search"
+                    )
+                    source = "fallback"
+                    fallback = QueryPlan.fallback()
+                    emit("plan", {"plan_source": source, "plan": fallback.to_dict()})
+                    if speculative_task is None:
+                        emit("query", {"mode": fallback.mode})
+                        speculative_task = asyncio.create_task(timings.measure(
+                            "fallback_search",
+                            self.weaviate_service.search(query, fallback.pushdown(fetch_limit), query_vector)
+                        ))
+                        pending.append(speculative_task)
+                    search_results = await self._search_within(
+                        speculative_task, deadline + timings.duration("gemini_queue"), query, fallback
+                    )
+
+            degraded = degraded_reason is not None
+            if not degraded:
+                if speculative_task is not None:
+                    speculative_task.cancel()
+                emit("plan", {"plan_source": source, "plan": plan.to_dict()})
+                emit("query", {"mode": plan.mode})
+                search_results = await self._search_within(timings.measure(
+                    "weaviate", self.weaviate_service.search(query, plan.pushdown(fetch_limit), query_vector)
+                ), deadline + timings.duration("gemini_queue"), query, plan)
+                if search_results.get('success') and source == "gemini":
+                    # Only cache plans that executed successfully
+                    await asyncio.to_thread(self.plan_cache.put, query, query_vector, plan.to_json())
+
+            self.plan_sources[source] += 1
+            search_results['plan_source'] = source
+            search_results['degraded'] = degraded
+            search_results['degraded_reason'] = degraded_reason
+            search_results['timings'] = timings.report()
+            for stage, (start, end) in timings.spans.items():
+                observe_stage(stage, end - start)
+                add_span(stage, start, end)
+            if METRICS_ENABLED:
+                SEARCHES.labels(source, "true" if degraded else "false").inc()
+            return search_results
+        finally:
+            for task in pending:
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled():
+                    task.exception()  # mark abandoned failures as retrieved
+
+    async def run_many(self, queries: List[str], limit: int) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """
+        Run a batch of searches, returning one result dict per input query (in input order) and batch stats.
+
+        Queries that normalize to the same text run once and share a result. All query vectors are
+        encoded in one model call up front; then up to SEARCH_BATCH_CONCURRENCY searches run at once,
+        of which at most SEARCH_BATCH_GEMINI_CONCURRENCY may be generating a plan with Gemini. Waiting
+        for one of those slots doesn't count against a query's budget; stats report how many unique
+        queries were still served degraded and the longest such wait.
+        """
+        started = time.perf_counter()
+        keys = [normalize_query(query) or query for query in queries]
+        unique = dict(zip(reversed(keys), reversed(queries)))  # first spelling of each key wins
+        unique_keys = list(dict.fromkeys(keys))
+
+        vectors: List[Optional[np.ndarray]] = [None] * len(unique_keys)
+        embed_start = time.perf_counter()
+        try:
+            vectors = list(await self.weaviate_service.encode_many([unique[key] for key in unique_keys]))
+        except Exception as e:
+            # Each search falls back to encoding its own query
+            logger.warning(f"Batch encoding failed: {str(e)}")
+        embed_end = time.perf_counter()
+        add_span("batch_embedding", embed_start, embed_end)
+        embedding_ms = (embed_end - embed_start) * 1000
+
+        gemini_limiter = asyncio.Semaphore(self.batch_gemini_concurrency)
+        search_limiter = asyncio.Semaphore(self.batch_concurrency)
+
+        async def search(key: str, vector: Optional[np.ndarray]) -> Dict[str, Any]:
+            async with search_limiter:
+                try:
+                    return await self.run(unique[key], limit, query_vector=vector, gemini_limiter=gemini_limiter)
+                except Exception as e:
+                    # One failed query doesn't fail the batch
+                    error = f"{e.stage} stage failed: {str(e)}" if isinstance(e, SearchStageError) else str(e)
+                    return {'success': False, 'query': unique[key], 'error': error, 'results_count': 0, 'results': []}
+
+        results = dict(zip(unique_keys, await asyncio.gather(
+            *(search(key, vector) for key, vector in zip(unique_keys, vectors))
+        )))
+        unique_results = list(results.values())
+        stats = {
+            "queries": len(queries),
+            "unique_queries": len(unique_keys),
+            "degraded": sum(1 for result in unique_results if result.get('degraded')),
+            "max_gemini_queue_ms": max((
+                result['timings']['stages']['gemini_queue']['duration_ms']
+                for result in unique_results if 'gemini_queue' in result.get('timings', {}).get('stages', {})
+            ), default=0.0),
+            "embedding_ms": round(embedding_ms, 2),
+            "total_ms": round((time.perf_counter() - started) * 1000, 2),
+        }
+        return [results[key] for key in keys], stats
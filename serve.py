@@ -0,0 +1,177 @@
+"""
+Preforking multi-worker launcher.
+
+The parent process loads the embedding model once and then forks WORKERS
+children that share the listening socket. The model weights stay in pages
+shared copy-on-write between all workers; each worker builds its own
+services (Weaviate connection, Gemini client, caches) in the FastAPI lifespan
+handler after the fork, so no network connection crosses a fork.
+
+    WORKERS=4 PORT=8080 python serve.py
+
+Expected per-worker memory budget (torch backend, all-MiniLM-L6-v2); verify
+on the target instance with benchmarks/multiworker.py, which reports PSS/USS
+for every worker:
+
+- shared once per machine: ~90 MB of fp32 model weights plus the torch and
+  tokenizer libraries, split across workers in PSS
+- private per worker: ~150-200 MB for the interpreter, FastAPI, the
+  Weaviate/gRPC and Gemini clients, torch thread pools, plus up to
+  ~10 MB of caches (EMBEDDING_CACHE_SIZE x 1.5 KB, PLAN_CACHE_MAX_ENTRIES plans)
+
+So budget roughly 250 MB + 200 MB x WORKERS, less with EMBEDDING_BACKEND=onnx-int8.
+Set WORKERS to the number of cores the instance actually has.
+
+A worker that dies is re-forked. One that fails to start, or dies within
+WORKER_MIN_UPTIME_SECONDS, is re-forked after an exponential backoff
+(WORKER_RESTART_BACKOFF_SECONDS, doubling up to WORKER_RESTART_BACKOFF_MAX_SECONDS);
+after WORKER_MAX_FAILED_STARTS such failures in a row the launcher stops all
+workers and exits non-zero so the platform sees the failure instead of a
+fork/crash loop.
+"""
+import gc
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Dict, Tuple
+
+import uvicorn
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("serve")
+
+# Worker exit codes; uvicorn uses 3 for a failed startup too
+WORKER_CRASHED = 1
+WORKER_STARTUP_FAILURE = 3
+
+
+def _bind(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_worker(sock: socket.socket, threads: int) -> bool:
+    """Serve until shut down; returns whether startup (the lifespan handler) succeeded"""
+    # Split the cores between workers instead of every worker using them all
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    from main import readiness
+    # The parent imported the app long before this fork; time this worker's startup from here
+    readiness.mark_process_start()
+    config = uvicorn.Config("main:app", log_level=os.getenv('LOG_LEVEL', 'info'))
+    server = uvicorn.Server(config)
+    server.run(sockets=[sock])
+    return server.started
+
+
+def _spawn(sock: socket.socket, threads: int) -> int:
+    pid = os.fork()
+    if pid == 0:
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        code = WORKER_CRASHED
+        try:
+            code = 0 if _run_worker(sock, threads) else WORKER_STARTUP_FAILURE
+        except BaseException:
+            logger.exception("Worker crashed")
+        finally:
+            os._exit(code)
+    return pid
+
+
+def main():
+    host = os.getenv('HOST', '0.0.0.0')
+    port = int(os.getenv('PORT', '8080'))
+    workers = int(os.getenv('WORKERS', str(os.cpu_count() or 1)))
+    threads = int(os.getenv('EMBEDDING_THREADS_PER_WORKER', str(max(1, (os.cpu_count() or 1) // workers))))
+
+    # Tokenizer and torch thread pools must not be started before fork
+    os.environ.setdefault('TOKENIZERS_PARALLELISM', 'false')
+
+    start = time.perf_counter()
+    from embedding import preload_embedding_model
+    preload_embedding_model()
+    import main as _app_module  # noqa: F401  (import the app once so workers inherit it)
+    logger.info(f"Preloaded embedding model in {time.perf_counter() - start:.2f}s")
+
+    # Move everything allocated so far out of the GC's reach so collections
+    # in the workers don't write to (and un-share) those pages
+    gc.collect()
+    gc.freeze()
+
+    min_uptime = float(os.getenv('WORKER_MIN_UPTIME_SECONDS', '30'))
+    backoff = float(os.getenv('WORKER_RESTART_BACKOFF_SECONDS', '1'))
+    backoff_max = float(os.getenv('WORKER_RESTART_BACKOFF_MAX_SECONDS', '60'))
+    max_failed_starts = int(os.getenv('WORKER_MAX_FAILED_STARTS', '5'))
+
+    sock = _bind(host, port)
+    children: Dict[int, Tuple[int, float]] = {}  # pid -> (worker index, forked at)
+    failed_starts: Dict[int, int] = {}  # worker index -> consecutive failed starts
+    for i in range(workers):
+        children[_spawn(sock, threads)] = (i, time.monotonic())
+    logger.info(f"Serving on {host}:{port} with {workers} workers ({threads} encode threads each)")
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    exit_code = 0
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        child = children.pop(pid, None)
+        if child is None or stopping:
+            continue
+        index, forked_at = child
+        code = os.waitstatus_to_exitcode(status)
+        if code == WORKER_STARTUP_FAILURE or time.monotonic() - forked_at < min_uptime:
+            failed_starts[index] = failed_starts.get(index, 0) + 1
+        else:
+            failed_starts[index] = 0
+        if failed_starts[index] >= max_failed_starts:
+            logger.error(f"Worker {index} failed to start {failed_starts[index]} times in a row; shutting down")
+            exit_code = 1
+            stop(signal.SIGTERM, None)
+            continue
+        delay = min(backoff_max, backoff * 2 ** (failed_starts[index] - 1)) if failed_starts[index] else 0.0
+        logger.warning(f"Worker {index} (pid {pid}) exited with code {code}; restarting in {delay:.1f}s")
+        # Sleep in short steps so a shutdown signal isn't held up by the backoff
+        deadline = time.monotonic() + delay
+        while not stopping and time.monotonic() < deadline:
+            time.sleep(max(0.0, min(0.5, deadline - time.monotonic())))
+        if not stopping:
+            children[_spawn(sock, threads)] = (index, time.monotonic())
+
+    sock.close()
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
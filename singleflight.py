@@ -0,0 +1,68 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls into one in-flight computation.
+
+    The first caller for a key starts the work as its own task; callers that
+    arrive with the same key while it runs await that task and get the same
+    result (or exception). The key is forgotten as soon as the work finishes,
+    so nothing is cached beyond the flight itself. A caller that is cancelled
+    (e.g. its client disconnected) only stops waiting; the work is cancelled
+    when no caller is left waiting on it.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._flights: Dict[Hashable, asyncio.Task] = {}
+        self._waiters: Dict[Hashable, int] = {}
+        self.calls = 0
+        self.executions = 0
+        self.max_waiters = 0
+
+    async def do(self, key: Hashable, work: Callable[[], Awaitable[T]]) -> T:
+        """Return work()'s result, sharing one execution with concurrent callers of the same key"""
+        self.calls += 1
+        task = self._flights.get(key)
+        if task is None:
+            self.executions += 1
+            task = asyncio.ensure_future(work())
+            self._flights[key] = task
+            self._waiters[key] = 0
+            task.add_done_callback(lambda _: self._land(key, task))
+        self._waiters[key] += 1
+        self.max_waiters = max(self.max_waiters, self._waiters[key])
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self._flights.get(key) is task and self._waiters[key] == 1 and not task.done():
+                task.cancel()
+            raise
+        finally:
+            if self._flights.get(key) is task:
+                self._waiters[key] -= 1
+
+    def _land(self, key: Hashable, task: asyncio.Task):
+        if self._flights.get(key) is task:
+            del self._flights[key]
+            del self._waiters[key]
+        if not task.cancelled() and task.exception() is not None:
+            logger.debug(f"{self.name} flight failed for all waiters: {task.exception()}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Calls, executions and the fraction of calls that shared another caller's execution"""
+        return {
+            'calls': self.calls,
+            'executions': self.executions,
+            'coalesced': self.calls - self.executions,
+            'coalescing_ratio': round((self.calls - self.executions) / self.calls, 4) if self.calls else 0.0,
+            'in_flight': len(self._flights),
+            'max_waiters': self.max_waiters,
+        }
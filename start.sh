@@ -3,8 +3,14 @@ set -e
 
 # Railway provides PORT env (default 8080), fallback to 8080 if not set
 PORT=${PORT:-8080}
+WORKERS=${WORKERS:-1}
 
-echo "Starting FastAPI server on port $PORT"
+echo "Starting FastAPI server on port $PORT with $WORKERS worker(s)"
 
-# Use a single worker for lightweight apps (scale via Railway dynos instead of threads)
+if [ "$WORKERS" -gt 1 ]; then
+    # Preforking launcher: the embedding model is loaded once and shared copy-on-write by all workers
+    exec env PORT="$PORT" WORKERS="$WORKERS" python serve.py
+fi
+
+# Single worker for lightweight deployments
 exec uvicorn main:app --host 0.0.0.0 --port "$PORT" --workers 1
@@ -0,0 +1,309 @@
+import heapq
+import itertools
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Dict, List, Optional, TypeVar
+
+from dotenv import load_dotenv
+
+from metrics import observe_stage
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+TRACING_ENABLED = os.getenv('TRACING_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+
+
+class Trace:
+    """
+    Spans and annotations for one HTTP request.
+
+    Spans are (name, start, end) in perf_counter seconds. Code below the
+    endpoint reaches the request's trace through current_trace(), so nothing
+    has to be passed down explicitly. Once the request finishes the trace is
+    frozen: late spans, e.g. from a background cache refresh started by the
+    request, are dropped.
+    """
+
+    __slots__ = ("id", "method", "route", "path", "query_string", "started_at", "start", "end",
+                 "status", "spans", "attributes", "caches", "max_spans", "finished")
+
+    def __init__(self, method: str, path: str, query_string: str = "", max_spans: int = 200):
+        self.id = uuid.uuid4().hex[:16]
+        self.method = method
+        self.route = path
+        self.path = path
+        self.query_string = query_string
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.status: Optional[int] = None
+        self.spans: List[tuple] = []
+        self.attributes: Dict[str, Any] = {}
+        self.caches: Dict[str, str] = {}
+        self.max_spans = max_spans
+        self.finished = False
+
+    @property
+    def duration(self) -> float:
+        return (self.end if self.end is not None else time.perf_counter()) - self.start
+
+    def add_span(self, name: str, start: float, end: float):
+        if not self.finished and len(self.spans) < self.max_spans:
+            self.spans.append((name, start, end))
+
+    def server_timing(self) -> str:
+        """Server-Timing header value: each stage once (repeated stages summed) plus the total so far"""
+        durations: Dict[str, float] = {}
+        for name, start, end in self.spans:
+            durations[name] = durations.get(name, 0.0) + (end - start)
+        metrics = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in durations.items()]
+        metrics.append(f"total;dur={self.duration * 1000:.1f}")
+        return ", ".join(metrics)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "route": self.route,
+            "path": self.path,
+            "query_string": self.query_string,
+            "status": self.status,
+            "started_at": datetime.fromtimestamp(self.started_at, timezone.utc).isoformat(),
+            "duration_ms": round(self.duration * 1000, 2),
+            "spans": [{
+                "name": name,
+                "start_ms": round((start - self.start) * 1000, 2),
+                "end_ms": round((end - self.start) * 1000, 2),
+                "duration_ms": round((end - start) * 1000, 2),
+            } for name, start, end in sorted(self.spans, key=lambda span: span[1])],
+            "attributes": self.attributes,
+            "caches": self.caches,
+        }
+
+
+_current: ContextVar[Optional[Trace]] = ContextVar("trace", default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    """The trace of the request being served, if it is traced"""
+    return _current.get()
+
+
+def add_span(name: str, start: float, end: float):
+    """Record a span (perf_counter seconds) on the current request's trace"""
+    trace = _current.get()
+    if trace is not None:
+        trace.add_span(name, start, end)
+
+
+def annotate(**attributes: Any):
+    """Attach attributes (plan, result count, ...) to the current request's trace"""
+    trace = _current.get()
+    if trace is not None and not trace.finished:
+        trace.attributes.update(attributes)
+
+
+def record_cache(cache: str, outcome: str):
+    """Note a cache lookup's outcome ("hit", "miss", "stale", ...) on the current request's trace"""
+    trace = _current.get()
+    if trace is not None and not trace.finished:
+        trace.caches[cache] = outcome
+
+
+async def traced(stage: str, awaitable: Awaitable[T]) -> T:
+    """Await a stage, recording it as a span and in the stage latency histogram"""
+    start = time.perf_counter()
+    try:
+        return await awaitable
+    finally:
+        end = time.perf_counter()
+        observe_stage(stage, end - start)
+        add_span(stage, start, end)
+
+
+class TraceStore:
+    """
+    Finished traces kept in memory for latency investigations.
+
+    The last TRACE_BUFFER_SIZE traces are kept in a ring buffer, and the
+    TRACE_SLOWEST slowest traces seen since startup in a min-heap, so a slow
+    outlier survives long after it has scrolled out of the recent buffer.
+    With TRACE_EXPORT_PATH set, every finished trace is also appended to that
+    file as one JSON line. The file is opened by start(), in the serving
+    process (after a prefork worker is forked), and written by a background
+    thread so requests never wait on disk; traces arriving while
+    TRACE_EXPORT_QUEUE of them are waiting are dropped rather than buffered.
+    """
+
+    def __init__(
+        self,
+        size: Optional[int] = None,
+        slowest: Optional[int] = None,
+        export_path: Optional[str] = None,
+    ):
+        self.size = size if size is not None else int(os.getenv('TRACE_BUFFER_SIZE', '500'))
+        self.slowest_size = slowest if slowest is not None else int(os.getenv('TRACE_SLOWEST', '50'))
+        self.export_path = export_path if export_path is not None else os.getenv('TRACE_EXPORT_PATH', '')
+        self.export_queue_size = int(os.getenv('TRACE_EXPORT_QUEUE', '1000'))
+        self._recent: deque = deque(maxlen=self.size)
+        self._slowest: List[tuple] = []  # (duration, seq, trace), smallest first
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._export_queue: Optional[queue.Queue] = None
+        self._writer: Optional[threading.Thread] = None
+        self.recorded = 0
+        self.exported = 0
+        self.export_errors = 0
+        self.export_dropped = 0
+
+    def start(self):
+        """Open the export file and start its writer thread in this process"""
+        if not self.export_path or self._writer is not None:
+            return
+        try:
+            # Line-buffered: each trace is one write, and a crash loses at most the current line
+            export = open(self.export_path, "a", buffering=1, encoding="utf-8")
+        except OSError as e:
+            logger.error(f"Trace export disabled, cannot open {self.export_path}: {str(e)}")
+            return
+        self._export_queue = queue.Queue(maxsize=self.export_queue_size)
+        self._writer = threading.Thread(target=self._write, args=(export,), name="trace-export", daemon=True)
+        self._writer.start()
+
+    def _write(self, export: Any):
+        while True:
+            trace = self._export_queue.get()
+            if trace is None:
+                break
+            try:
+                export.write(json.dumps(trace.to_dict(), default=str) + "\n")
+                self.exported += 1
+            except (OSError, ValueError) as e:
+                self.export_errors += 1
+                logger.warning(f"Trace export failed: {str(e)}")
+        export.close()
+
+    def add(self, trace: Trace):
+        """Keep a finished trace and export it"""
+        entry = (trace.duration, next(self._seq), trace)
+        with self._lock:
+            self.recorded += 1
+            self._recent.append(trace)
+            if len(self._slowest) < self.slowest_size:
+                heapq.heappush(self._slowest, entry)
+            elif self.slowest_size > 0 and entry[0] > self._slowest[0][0]:
+                heapq.heapreplace(self._slowest, entry)
+        if self._export_queue is not None:
+            try:
+                self._export_queue.put_nowait(trace)
+            except queue.Full:
+                self.export_dropped += 1
+
+    def recent(self, limit: int = 50, route: Optional[str] = None, min_ms: float = 0.0) -> List[Dict[str, Any]]:
+        """Newest first, optionally only one route or traces at least min_ms long"""
+        with self._lock:
+            traces = list(self._recent)
+        matched = []
+        for trace in reversed(traces):
+            if (route is None or trace.route == route) and trace.duration * 1000 >= min_ms:
+                matched.append(trace.to_dict())
+                if len(matched) >= limit:
+                    break
+        return matched
+
+    def slowest(self, limit: int = 50, route: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Slowest first"""
+        with self._lock:
+            entries = sorted(self._slowest, reverse=True)
+        return [trace.to_dict() for _, _, trace in entries if route is None or trace.route == route][:limit]
+
+    def get(self, trace_id: str) -> Optional[Dict[str, Any]]:
+        """A retained trace by the id sent in its response's X-Trace-Id header"""
+        with self._lock:
+            candidates = list(self._recent) + [trace for _, _, trace in self._slowest]
+        for trace in candidates:
+            if trace.id == trace_id:
+                return trace.to_dict()
+        return None
+
+    def close(self):
+        """Write out the queued traces and close the export file"""
+        if self._writer is not None:
+            self._export_queue.put(None)
+            self._writer.join(timeout=5)
+            self._writer = None
+            self._export_queue = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Retention sizes and export counters"""
+        return {
+            'recorded': self.recorded,
+            'recent': len(self._recent),
+            'buffer_size': self.size,
+            'slowest_kept': len(self._slowest),
+            'slowest_size': self.slowest_size,
+            'export_path': self.export_path or None,
+            'exported': self.exported,
+            'export_errors': self.export_errors,
+            'export_dropped': self.export_dropped,
+            'export_queued': self._export_queue.qsize() if self._export_queue is not None else 0,
+        }
+
+
+class TracingMiddleware:
+    """
+    ASGI middleware that traces each request.
+
+    The response carries the trace id in X-Trace-Id and the stage breakdown
+    in a Server-Timing header. The header is built when the response starts,
+    so for streamed responses it only covers the work done before the first
+    byte; the full trace is stored once the response body is complete.
+    Paths in TRACE_EXCLUDE_PATHS (health probes, scrapes) are not traced.
+    """
+
+    def __init__(self, app: Any, store: TraceStore, exclude_paths: Optional[List[str]] = None):
+        self.app = app
+        self.store = store
+        if exclude_paths is None:
+            exclude_paths = os.getenv('TRACE_EXCLUDE_PATHS', '/health,/ready,/metrics,/debug/traces').split(',')
+        self.exclude_paths = tuple(path.strip() for path in exclude_paths if path.strip())
+        self.max_spans = int(os.getenv('TRACE_MAX_SPANS', '200'))
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any):
+        if scope["type"] != "http" or scope["path"].startswith(self.exclude_paths):
+            await self.app(scope, receive, send)
+            return
+        trace = Trace(scope["method"], scope["path"], scope.get("query_string", b"").decode("latin-1"), self.max_spans)
+        token = _current.set(trace)
+
+        async def send_with_timing(message: Dict[str, Any]):
+            if message["type"] == "http.response.start":
+                trace.status = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"server-timing", trace.server_timing().encode("latin-1")),
+                    (b"x-trace-id", trace.id.encode("latin-1")),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            trace.end = time.perf_counter()
+            trace.finished = True
+            if trace.status is None:
+                trace.status = 500
+            trace.route = getattr(scope.get("route"), "path", None) or trace.path
+            self.store.add(trace)
@@ -0,0 +1,178 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+VECTOR_INDEX_BACKENDS = ("auto", "brute", "hnsw")
+
+# Same reason as plan_cache.DEFAULT_PATH: the working directory may not be writable
+DEFAULT_PATH = os.path.join(tempfile.gettempdir(), 'findmyrepo_vector_index')
+
+
+class LocalVectorIndex:
+    """
+    Local nearest-neighbour index over the Repos vectors.
+
+    Vectors are L2-normalized and written to VECTOR_INDEX_PATH.vectors.npy,
+    then memory-mapped, so prefork workers share one copy through the page
+    cache. Distances are cosine distances, the same metric Weaviate reports.
+
+    The "brute" backend is an exact matrix-vector product and is fast enough
+    up to a few hundred thousand vectors. The "hnsw" backend (optional
+    hnswlib dependency, requirements-ann.txt) adds a graph index persisted next
+    to the vectors and reused while the vectors are unchanged; "auto" picks it
+    above VECTOR_INDEX_HNSW_THRESHOLD vectors. Filtered searches take a
+    boolean row mask: selective masks (up to VECTOR_INDEX_BRUTE_MAX matching
+    rows) are scanned exactly, larger ones go through the graph with the mask
+    as a pre-filter.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        backend: Optional[str] = None,
+        hnsw_threshold: Optional[int] = None,
+        brute_max: Optional[int] = None,
+    ):
+        self.path = path if path is not None else os.getenv('VECTOR_INDEX_PATH', DEFAULT_PATH)
+        self.backend = backend if backend is not None else os.getenv('VECTOR_INDEX_BACKEND', 'auto')
+        if self.backend not in VECTOR_INDEX_BACKENDS:
+            raise ValueError(f"Unknown VECTOR_INDEX_BACKEND '{self.backend}', expected one of {VECTOR_INDEX_BACKENDS}")
+        self.hnsw_threshold = (
+            hnsw_threshold if hnsw_threshold is not None
+            else int(os.getenv('VECTOR_INDEX_HNSW_THRESHOLD', '200000'))
+        )
+        self.brute_max = brute_max if brute_max is not None else int(os.getenv('VECTOR_INDEX_BRUTE_MAX', '20000'))
+        self.hnsw_m = int(os.getenv('VECTOR_INDEX_HNSW_M', '16'))
+        self.hnsw_ef_construction = int(os.getenv('VECTOR_INDEX_HNSW_EF_CONSTRUCTION', '200'))
+        self.hnsw_ef_search = int(os.getenv('VECTOR_INDEX_HNSW_EF_SEARCH', '128'))
+        self._vectors: Optional[np.ndarray] = None
+        self._hnsw: Any = None
+        self._lock = threading.Lock()
+        self.fingerprint: Optional[str] = None
+        self.searches = 0
+        self.graph_searches = 0
+
+    @property
+    def ready(self) -> bool:
+        return self._vectors is not None
+
+    def __len__(self) -> int:
+        return 0 if self._vectors is None else len(self._vectors)
+
+    def _file(self, suffix: str) -> str:
+        return f"{self.path}.{suffix}"
+
+    def _use_hnsw(self, n: int) -> bool:
+        if self.backend == "brute" or (self.backend == "auto" and n < self.hnsw_threshold):
+            return False
+        try:
+            import hnswlib  # noqa: F401
+        except ImportError:
+            logger.warning("hnswlib is not installed (requirements-ann.txt); using brute-force vector search")
+            return False
+        return True
+
+    def build(self, vectors: np.ndarray):
+        """Replace the index contents; row i must correspond to row i of the caller's metadata"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1, norms)
+        fingerprint = hashlib.sha256(vectors.tobytes()).hexdigest()[:32]
+
+        if self.path:
+            # Write-then-rename so concurrent workers never map a half-written file
+            tmp = self._file(f"vectors.{os.getpid()}.tmp.npy")
+            np.save(tmp, vectors)
+            os.replace(tmp, self._file("vectors.npy"))
+            vectors = np.load(self._file("vectors.npy"), mmap_mode="r")
+
+        graph = self._load_or_build_graph(vectors, fingerprint) if self._use_hnsw(len(vectors)) else None
+        with self._lock:
+            self._vectors = vectors
+            self._hnsw = graph
+            self.fingerprint = fingerprint
+        logger.info(f"Vector index holds {len(vectors)} vectors ({'hnsw' if graph is not None else 'brute'})")
+
+    def _load_or_build_graph(self, vectors: np.ndarray, fingerprint: str):
+        import hnswlib
+
+        graph = hnswlib.Index(space="cosine", dim=vectors.shape[1])
+        meta_file, graph_file = self._file("hnsw.json"), self._file("hnsw.bin")
+        if self.path and os.path.exists(graph_file) and os.path.exists(meta_file):
+            with open(meta_file) as f:
+                meta = json.load(f)
+            if meta.get("fingerprint") == fingerprint and meta.get("m") == self.hnsw_m:
+                graph.load_index(graph_file, max_elements=len(vectors))
+                graph.set_ef(self.hnsw_ef_search)
+                logger.info("Reusing persisted HNSW graph")
+                return graph
+
+        graph.init_index(max_elements=len(vectors), ef_construction=self.hnsw_ef_construction, M=self.hnsw_m)
+        graph.add_items(vectors, np.arange(len(vectors)))
+        graph.set_ef(self.hnsw_ef_search)
+        if self.path:
+            tmp = self._file(f"hnsw.{os.getpid()}.tmp")
+            graph.save_index(tmp)
+            os.replace(tmp, graph_file)
+            with open(meta_file, "w") as f:
+                json.dump({"fingerprint": fingerprint, "m": self.hnsw_m, "count": len(vectors)}, f)
+        return graph
+
+    def search(self, query: np.ndarray, k: int, mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (row indices, cosine distances) of the k nearest rows, restricted to mask if given"""
+        with self._lock:
+            vectors, graph = self._vectors, self._hnsw
+        if vectors is None:
+            raise RuntimeError("Vector index is empty")
+        self.searches += 1
+        query = np.asarray(query, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+
+        candidates = np.flatnonzero(mask) if mask is not None else None
+        if candidates is not None and len(candidates) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        k = min(k, len(vectors) if candidates is None else len(candidates))
+
+        if graph is not None and (candidates is None or len(candidates) > self.brute_max):
+            try:
+                row_filter = (lambda label: bool(mask[label])) if mask is not None else None
+                labels, distances = graph.knn_query(query, k=k, filter=row_filter)
+                self.graph_searches += 1
+                return labels[0].astype(np.int64), distances[0]
+            except RuntimeError:
+                # hnswlib can't always fill k results under a filter; the exact scan can
+                pass
+
+        if candidates is None:
+            scores = vectors @ query
+            rows = None
+        else:
+            scores = vectors[candidates] @ query
+            rows = candidates
+        top = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        indices = top if rows is None else rows[top]
+        return indices.astype(np.int64), (1.0 - scores[top]).astype(np.float32)
+
+    def stats(self) -> Dict[str, Any]:
+        """Size and search counters"""
+        vectors = self._vectors
+        return {
+            'vectors': 0 if vectors is None else len(vectors),
+            'dimensions': None if vectors is None else vectors.shape[1],
+            'backend': 'hnsw' if self._hnsw is not None else 'brute',
+            'memory_mapped': isinstance(vectors, np.memmap),
+            'searches': self.searches,
+            'graph_searches': self.graph_searches,
+        }
@@ -1,95 +1,254 @@
-from sentence_transformers import SentenceTransformer
+import numpy as np
 import weaviate
 from weaviate.classes.init import Auth
+from weaviate.classes.query import Filter, MetadataQuery
+from weaviate.collections.classes.filters import _Filters
 from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
 import os
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, TYPE_CHECKING
+import logging
+
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from embedding import EmbeddingBatcher, EmbeddingCache, load_embedding_model
+from plan_cache import normalize_query
+from query_plan import FilterNode, QueryPlan
+from results import RepositoryRecord
+from tracing import record_cache
+
+if TYPE_CHECKING:
+    from replica import RepoReplica
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+VECTOR_INDEX_MODES = ("off", "fallback", "local")
+
+WEAVIATE_CLUSTER_URL = os.getenv('WEAVIATE_URL', "rsrcqrmr9opgyhsz2katg.c0.asia-southeast1.gcp.weaviate.cloud")
+WEAVIATE_COLLECTION = os.getenv('WEAVIATE_COLLECTION', 'Repos')
+
 class WeaviateService:
     def __init__(self):
-        self.model = SentenceTransformer('all-MiniLM-L6-v2')
-        self.client = weaviate.connect_to_weaviate_cloud(
-            cluster_url="rsrcqrmr9opgyhsz2katg.c0.asia-southeast1.gcp.weaviate.cloud",
+        self.model = load_embedding_model()
+        self.client = weaviate.use_async_with_weaviate_cloud(
+            cluster_url=WEAVIATE_CLUSTER_URL,
             auth_credentials=Auth.api_key(os.getenv('WEAVIATE_API_KEY')),
         )
+        # Encoding is CPU-bound, so it runs off the event loop on a small bounded pool
+        self.encode_executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv('EMBEDDING_WORKERS', '2')),
+            thread_name_prefix="encode"
+        )
+        self.embedding_cache = EmbeddingCache()
+        self.embedding_batcher = EmbeddingBatcher(self._encode_batch, self.encode_executor)
+        self.collection_name = WEAVIATE_COLLECTION
+        # Local near_vector search: "fallback" when Weaviate errors or is slower than the timeout, "local" always
+        self.vector_index_mode = os.getenv('VECTOR_INDEX_MODE', 'off')
+        if self.vector_index_mode not in VECTOR_INDEX_MODES:
+            raise ValueError(f"Unknown VECTOR_INDEX_MODE '{self.vector_index_mode}', expected one of {VECTOR_INDEX_MODES}")
+        self.vector_index_timeout = float(os.getenv('VECTOR_INDEX_FALLBACK_TIMEOUT_SECONDS', '2'))
+        self.local_index: Optional["RepoReplica"] = None
+        self.local_searches = 0
+        self.local_fallbacks = 0
+        # Shared by searches and listings; while open, near_vector/hybrid plans go to the local index if present
+        self.breaker = CircuitBreaker("weaviate")
+        self.breaker_reroutes = 0
     
-    def execute_search_code(self, generated_code: str, query_text: str) -> List[Dict[str, Any]]:
-        """Execute the generated Weaviate code and return formatted results"""
-        
-        # Set up the execution environment
-        exec_globals = {
-            'client': self.client,
-            'model': self.model,
-            'query_text': query_text,
-            'results': None
-        }
-        
-        # Execute the generated code
-        print(generated_code)
-        exec(generated_code, exec_globals)
+    def attach_local_index(self, replica: "RepoReplica"):
+        """Use a replica with a vector index for near_vector plans according to VECTOR_INDEX_MODE"""
+        self.local_index = replica
+    
+    def collection(self):
+        """Handle for the configured repository collection (WEAVIATE_COLLECTION)"""
+        return self.client.collections.get(self.collection_name)
+    
+    async def connect(self):
+        """Open the async Weaviate client connection"""
+        await self.client.connect()
+    
+    async def ping(self):
+        """Raise unless the Weaviate cluster is reachable and ready, reconnecting if needed"""
+        if not self.client.is_connected():
+            await self.client.connect()
+        if not await self.client.is_ready():
+            raise RuntimeError("Weaviate cluster is not ready")
+    
+    async def warm_up(self):
+        """Run one encode so model weights and kernels are loaded before traffic arrives"""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.encode_executor, self._encode_batch, ["warm up"])
+    
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        return np.asarray(self.model.encode(texts, batch_size=len(texts)), dtype=np.float32)
+    
+    async def encode_query(self, query_text: str) -> np.ndarray:
+        """Embed a search query for vector and hybrid search, reusing cached vectors"""
+        key = normalize_query(query_text) or query_text
+        vector = self.embedding_cache.get(key)
+        if vector is not None:
+            logger.info("Query embedding cache hit")
+            record_cache("embedding", "hit")
+            return vector
+        record_cache("embedding", "miss")
+        vector = await self.embedding_batcher.encode(key)
+        return self.embedding_cache.put(key, vector)
+    
+    async def encode_many(self, query_texts: List[str]) -> List[np.ndarray]:
+        """Embed many queries with one model call for all cache misses, in input order"""
+        keys = [normalize_query(text) or text for text in query_texts]
+        vectors = {key: self.embedding_cache.get(key) for key in dict.fromkeys(keys)}
+        missing = [key for key, vector in vectors.items() if vector is None]
+        if missing:
+            loop = asyncio.get_running_loop()
+            encoded = await loop.run_in_executor(self.encode_executor, self._encode_batch, missing)
+            for key, vector in zip(missing, encoded):
+                vectors[key] = self.embedding_cache.put(key, vector)
+        return [vectors[key] for key in keys]
+    
+    def build_filter(self, node: FilterNode) -> _Filters:
+        """Translate a plan filter tree into a Weaviate Filter"""
+        if node.and_ is not None:
+            return Filter.all_of([self.build_filter(child) for child in node.and_])
+        if node.or_ is not None:
+            return Filter.any_of([self.build_filter(child) for child in node.or_])
+        return getattr(Filter.by_property(node.property), node.op)(node.value)
+    
+    async def _execute_remote(
+        self,
+        plan: QueryPlan,
+        query_text: str,
+        query_vector: Optional[np.ndarray] = None
+    ) -> List[RepositoryRecord]:
+        """Execute a validated query plan on Weaviate and return formatted results"""
+        collection = self.collection()
+        filters = self.build_filter(plan.filters) if plan.filters is not None else None
         
-        # Get the results
-        results = exec_globals.get('results')
+        if plan.mode == "fetch_objects":
+            results = await collection.query.fetch_objects(
+                filters=filters,
+                limit=plan.limit,
+                return_properties=plan.return_properties
+            )
+        else:
+            if query_vector is None:
+                query_vector = await self.encode_query(query_text)
+            query_vector = query_vector.tolist()
+            if plan.mode == "hybrid":
+                results = await collection.query.hybrid(
+                    query=query_text,
+                    vector=query_vector,
+                    alpha=plan.alpha,
+                    filters=filters,
+                    limit=plan.limit,
+                    return_properties=plan.return_properties,
+                    return_metadata=MetadataQuery(score=True)
+                )
+            else:
+                results = await collection.query.near_vector(
+                    near_vector=query_vector,
+                    filters=filters,
+                    limit=plan.limit,
+                    return_properties=plan.return_properties,
+                    return_metadata=MetadataQuery(distance=True)
+                )
         
         if not results or not hasattr(results, 'objects'):
             return []
         
-        # Format results for API response
-        formatted_results = []
-        for obj in results.objects:
-            props = obj.properties
-            # Format topics as list instead of comma-separated string
-            topics = []
-            if props.get('topics'):
-                topics = [topic.strip() for topic in props['topics'].split(',') if topic.strip()]
-            
-            # Format languages as list if it exists
-            languages = []
-            if props.get('languages'):
-                languages = [lang.strip() for lang in props['languages'].split(',') if lang.strip()]
-            
-            result_item = {
-                'name': props.get('name', ''),
-                'full_name': props.get('full_name', ''),
-                'description': props.get('description', ''),
-                'url': props.get('url', ''),
-                'homepage': props.get('homepage', ''),
-                'language': props.get('language', ''),
-                'languages': languages,
-                'topics': topics,
-                'stars': props.get('stars', 0),
-                'forks': props.get('forks', 0),
-                'open_issues': props.get('open_issues', 0),
-                'license': props.get('license', ''),
-                'has_issues': props.get('has_issues', False),
-                'has_wiki': props.get('has_wiki', False),
-                'created_at': props.get('created_at', ''),
-                'updated_at': props.get('updated_at', '')
-            }
-            
-            # Add search metadata if available
-            if hasattr(obj.metadata, 'distance') and obj.metadata.distance is not None:
-                result_item['distance'] = round(obj.metadata.distance, 4)
-            elif hasattr(obj.metadata, 'score') and obj.metadata.score is not None:
-                result_item['score'] = round(obj.metadata.score, 4)
-            
-            formatted_results.append(result_item)
+        return [RepositoryRecord.from_search(obj.properties, obj.metadata) for obj in results.objects]
+    
+    async def _execute_local(self, plan: QueryPlan, query_vector: np.ndarray) -> List[RepositoryRecord]:
+        """Execute a near_vector plan on the local vector index"""
+        hits = await asyncio.to_thread(self.local_index.near_vector, query_vector, plan.filters, plan.limit)
+        self.local_searches += 1
+        return [RepositoryRecord.from_search(obj.properties, distance=distance) for obj, distance in hits]
+    
+    async def _remote(self, plan: QueryPlan, query_text: str, query_vector: Optional[np.ndarray]) -> List[RepositoryRecord]:
+        return await self.breaker.call(lambda: self._execute_remote(plan, query_text, query_vector))
+    
+    async def _serve_local_while_open(
+        self,
+        plan: QueryPlan,
+        query_text: str,
+        query_vector: Optional[np.ndarray],
+        error: CircuitOpenError
+    ) -> List[RepositoryRecord]:
+        """Answer a vector plan locally (hybrid as near_vector) while the Weaviate breaker is open"""
+        local_ready = self.local_index is not None and self.local_index.vector_ready
+        if not local_ready or plan.mode == "fetch_objects":
+            raise error
+        if query_vector is None:
+            query_vector = await self.encode_query(query_text)
+        try:
+            results = await self._execute_local(plan, query_vector)
+        except ValueError:
+            raise error
+        self.breaker_reroutes += 1
+        return results
+    
+    async def execute_plan(
+        self,
+        plan: QueryPlan,
+        query_text: str,
+        query_vector: Optional[np.ndarray] = None
+    ) -> List[RepositoryRecord]:
+        """Execute a validated query plan and return formatted results"""
+        local_available = (
+            plan.mode == "near_vector" and self.vector_index_mode != "off"
+            and self.local_index is not None and self.local_index.vector_ready
+        )
+        if not local_available:
+            try:
+                return await self._remote(plan, query_text, query_vector)
+            except CircuitOpenError as e:
+                return await self._serve_local_while_open(plan, query_text, query_vector, e)
+        
+        if query_vector is None:
+            query_vector = await self.encode_query(query_text)
+        if self.vector_index_mode == "local":
+            try:
+                return await self._execute_local(plan, query_vector)
+            except ValueError as e:
+                # A filter the replica can't evaluate (e.g. on readme) still works remotely
+                logger.info(f"Serving near_vector plan from Weaviate: {str(e)}")
+                return await self._remote(plan, query_text, query_vector)
         
-        return formatted_results
+        try:
+            return await asyncio.wait_for(
+                self._remote(plan, query_text, query_vector), self.vector_index_timeout
+            )
+        except Exception as e:
+            logger.warning(f"Weaviate near_vector failed ({str(e) or type(e).__name__}); serving from the local index")
+            try:
+                results = await self._execute_local(plan, query_vector)
+            except ValueError:
+                raise e
+            self.local_fallbacks += 1
+            return results
+    
+    def vector_search_stats(self) -> Dict[str, Any]:
+        """How often near_vector plans were served locally"""
+        return {
+            'mode': self.vector_index_mode,
+            'local_ready': self.local_index is not None and self.local_index.vector_ready,
+            'local_searches': self.local_searches,
+            'local_fallbacks': self.local_fallbacks,
+            'breaker_reroutes': self.breaker_reroutes,
+        }
     
-    def search(self, query: str, generated_code: str) -> Dict[str, Any]:
+    async def search(self, query: str, plan: QueryPlan, query_vector: Optional[np.ndarray] = None) -> Dict[str, Any]:
         """Main search method that coordinates the search process"""
         try:
-            results = self.execute_search_code(generated_code, query)
+            results = await self.execute_plan(plan, query, query_vector)
             
             return {
                 'success': True,
                 'query': query,
                 'results_count': len(results),
                 'results': results,
-                'generated_code': generated_code  # Include for debugging
+                'plan': plan.to_dict()  # Include for debugging
             }
             
         except Exception as e:
@@ -99,10 +258,11 @@ class WeaviateService:
                 'error': str(e),
                 'results_count': 0,
                 'results': [],
-                'generated_code': generated_code
+                'plan': plan.to_dict()
             }
     
-    def close(self):
-        """Close the Weaviate client connection"""
+    async def close(self):
+        """Close the Weaviate client connection and the encoding pool"""
         if self.client:
-            self.client.close()
\ No newline at end of file
+            await self.client.close()
+        self.encode_executor.shutdown(wait=False)
\ No newline at end of file